@@ -0,0 +1,275 @@
+"""
+簿価計算ロジックのベンチマーク
+
+実際の列構成を持つ合成台帳を生成し、CSV読み込み・各計算ステップ・CSV出力の処理時間と
+ピークメモリを行数ごとに計測する。各行数は新しいプロセスで計測する（ピークメモリを行数ごとに取るため）。
+
+使い方:
+  python benchmark_book_value.py --rows 10000 100000 --save result.json
+  python benchmark_book_value.py --rows 10000 100000 --baseline result.json --threshold 0.2
+    → 基準より threshold（割合）以上遅くなった項目、または memory-threshold（省略時は threshold）以上
+      ピークメモリが増えた行数があれば終了コード 1
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import python_book_value_logic as logic
+
+try:
+    import resource
+except ImportError:  # Windows ではピークメモリを計測しない
+    resource = None
+
+DEFAULT_ROWS = [10_000, 100_000]
+DEFAULT_PERIOD = ('2024-03-01', '2025-02-28')
+DEFAULT_THRESHOLD = 0.2
+# これより短い項目は誤差が大きいため回帰判定に使わない
+MIN_COMPARED_SECONDS = 0.05
+MEMORY_METRIC = 'peak_rss_mb'
+
+# --- 合成台帳の生成 ---
+# (サプライヤー名, 構成比)
+SYNTHETIC_SUPPLIERS = [
+    ('株式会社家具サプライ', 0.40),
+    ('オフィス家具販売株式会社', 0.25),
+    ('株式会社ABCレベシェア', 0.06),
+    ('XYZリース・レベシェア', 0.04),
+    ('法人小物管理用', 0.05),
+    ('株式会社カンム 契約No.20220001', 0.03),
+    ('株式会社カンム 契約No.20220004', 0.03),
+    ('株式会社カンム 契約No.20220008', 0.02),
+    ('三井住友トラスト・パナソニックファイナンス株式会社(リースバック品)_契約開始2207', 0.04),
+    ('三井住友トラスト・パナソニックファイナンス株式会社(リースバック品)_契約開始2310', 0.04),
+    ('三井住友トラスト・パナソニックファイナンス株式会社(リースバック品)_契約開始2207_契約開始2403', 0.02),
+    (None, 0.02),
+]
+# (破損紛失分類, 構成比)
+SYNTHETIC_DISPOSAL_CLASSES = [
+    ('売却（顧客）', 0.35), ('売却（法人案件）', 0.10), ('売却（EC）', 0.15),
+    ('庫内紛失／棚卸差異', 0.10), ('貸倒', 0.05), ('貸倒/所有権放棄', 0.05), ('破損', 0.20),
+]
+USEFUL_LIFE_YEARS = [3, 4, 5, 6, 8]
+
+def _choice(rng, weighted, rows):
+    values = np.empty(len(weighted), dtype=object)
+    values[:] = [value for value, _ in weighted]
+    weights = np.array([weight for _, weight in weighted])
+    return rng.choice(values, rows, p=weights / weights.sum())
+
+def _date_strings(days):
+    """1970-01-01 からの日数（NaN は欠損）を 'YYYY-MM-DD' 文字列（欠損は None）にする"""
+    dates = pd.to_datetime(pd.Series(days), unit='D')
+    return dates.dt.strftime('%Y-%m-%d').astype(object).where(dates.notna(), None).to_numpy()
+
+def generate_register(rows, seed=0):
+    """実データと同じ列構成の合成固定資産台帳を生成する
+
+    入庫検品日 → 初回出荷日 → 除売却日／貸手リース開始日 の順に日付が並び、
+    レベシェア・法人小物管理用・カンム／SMTPF のリース契約・減損・sample 品を含む。
+    """
+    rng = np.random.default_rng(seed)
+    epoch_day = lambda text: (pd.Timestamp(text) - pd.Timestamp('1970-01-01')).days
+
+    inspected = rng.integers(epoch_day('2020-01-01'), epoch_day('2026-01-01'), rows).astype(float)
+    inspected[rng.random(rows) < 0.03] = np.nan
+    shipped = inspected + rng.integers(1, 400, rows)
+    shipped[rng.random(rows) < 0.25] = np.nan
+    disposed = np.fmax(shipped, inspected) + rng.integers(30, 1500, rows)
+    disposed[rng.random(rows) < 0.65] = np.nan
+    impaired = inspected + rng.integers(180, 1200, rows)
+    impaired[rng.random(rows) < 0.85] = np.nan
+    lessor_lease = shipped + rng.integers(0, 600, rows)
+    lessor_lease[(rng.random(rows) < 0.90) | ~np.isnan(disposed)] = np.nan
+
+    has_disposal = ~np.isnan(disposed)
+    disposal_class = np.where(has_disposal, _choice(rng, SYNTHETIC_DISPOSAL_CLASSES, rows), None)
+    sale_names = np.where(
+        has_disposal & np.isin(disposal_class, ['売却（顧客）', '売却（法人案件）', '売却（EC）']),
+        '【買取】案件' + pd.Series(rng.integers(24000000, 26000000, rows)).astype(str).to_numpy(), None)
+    lessor_lease_names = np.where(
+        ~np.isnan(lessor_lease), '貸手リース案件' + pd.Series(rng.integers(1, 500, rows)).astype(str).to_numpy(), None)
+
+    years = rng.choice(USEFUL_LIFE_YEARS, rows)
+    cost = rng.integers(5_000, 300_000, rows)
+    cost[rng.random(rows) < 0.02] = 0
+
+    return pd.DataFrame({
+        logic.STOCK_ID_COL: np.arange(1, rows + 1),
+        'パーツid': rng.integers(1, 5_000, rows),
+        'パーツ名': 'パーツ' + pd.Series(rng.integers(1, 5_000, rows)).astype(str).to_numpy(),
+        '耐用年数': years,
+        logic.SUPPLIER_COLUMN_NAME: _choice(rng, SYNTHETIC_SUPPLIERS, rows),
+        logic.COST_COLUMN_NAME: cost,
+        logic.INSPECTED_AT_COL: _date_strings(inspected),
+        logic.DISPLAY_NAME_FIRST_SHIPPED_AT: _date_strings(shipped),
+        logic.IMPAIRMENT_DATE_COL: _date_strings(impaired),
+        logic.IMPOSSIBLED_AT_COL: _date_strings(disposed),
+        logic.CLASSIFICATION_OF_IMPOSSIBILITY_COL: disposal_class,
+        '売却案件名': sale_names,
+        logic.LEASE_FIRST_SHIPPED_AT_COL: _date_strings(lessor_lease),
+        '貸手リース案件名': lessor_lease_names,
+        logic.MONTHLY_DEPRECIATION_COL: cost // (years * 12),
+        logic.SAMPLE_COLUMN_NAME: np.where(rng.random(rows) < 0.02, 'TRUE', 'FALSE'),
+    })
+
+# --- 計測 ---
+def peak_rss_mb():
+    """このプロセスのピーク常駐メモリ（MB）。計測できない環境では None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+def run_case(csv_path, period, engine, compact=True):
+    """1つの台帳について 読み込み → 計算 → 出力 の時間を計測する（新しいプロセスで実行する）
+
+    compact=False では作業用DataFrameの省メモリ化を行わない（ピークメモリの比較用）。
+    """
+    logic.COMPACT_WORKING_FRAME = compact
+    start_time = time.perf_counter()
+    df_original = logic.load_and_initial_process(csv_path)
+    ingest_seconds = time.perf_counter() - start_time
+
+    # メモリ増減は追跡しない（tracemalloc で処理時間が変わるため。ピークメモリは ru_maxrss で取る）
+    # 日付の書式設定は CLI と同じく出力時（write_output）に行う
+    collector = logic.MemorySink()
+    start_time = time.perf_counter()
+    df_processed = logic.process_dataframe_with_progress(
+        df_original, period[0], period[1], engine=engine, instrumentation=logic.StageInstrumentation(collector),
+        format_dates=False)
+    process_seconds = time.perf_counter() - start_time
+    stages = {event['stage']: event['wall_seconds'] for event in collector.events}
+    stage_cpu_seconds = {event['stage']: event['cpu_seconds'] for event in collector.events}
+
+    output_path = os.path.join(os.path.dirname(csv_path), 'benchmark_output.csv')
+    start_time = time.perf_counter()
+    logic.write_output(df_processed, output_path)
+    output_seconds = time.perf_counter() - start_time
+    os.remove(output_path)
+
+    total_seconds = ingest_seconds + process_seconds + output_seconds
+    return {
+        'rows': len(df_original),
+        'output_rows': len(df_processed),
+        'ingest_seconds': ingest_seconds,
+        'process_seconds': process_seconds,
+        'output_seconds': output_seconds,
+        'total_seconds': total_seconds,
+        'rows_per_second': len(df_original) / total_seconds if total_seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages,
+        'stage_cpu_seconds': stage_cpu_seconds,
+    }
+
+def run_benchmark(row_counts, period=DEFAULT_PERIOD, engine=logic.DEFAULT_ENGINE, seed=0, report=print, compact=True):
+    """行数ごとに合成台帳をCSVに書き出し、別プロセスで run_case を実行した結果を返す"""
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'period': list(period),
+        'engine': engine,
+        'compact': compact,
+        'cases': {},
+    }
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in row_counts:
+            csv_path = os.path.join(work_dir, f'register_{rows}.csv')
+            generate_register(rows, seed).to_csv(csv_path, index=False, encoding='utf-8')
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                case = executor.submit(run_case, csv_path, period, engine, compact).result()
+            os.remove(csv_path)
+            results['cases'][str(rows)] = case
+            peak = f"{case['peak_rss_mb']:.0f}MB" if case['peak_rss_mb'] is not None else "-"
+            report(f"{rows:>10,}行: 読み込み {case['ingest_seconds']:.2f}秒 / 計算 {case['process_seconds']:.2f}秒 / "
+                   f"出力 {case['output_seconds']:.2f}秒 / {case['rows_per_second']:,.0f}行/秒 / ピークメモリ {peak}")
+    return results
+
+# --- 基準との比較 ---
+def _compared_metrics(case):
+    metrics = {name: case[name] for name in ('ingest_seconds', 'process_seconds', 'output_seconds', 'total_seconds')}
+    metrics.update({f"stage: {message}": seconds for message, seconds in case['stages'].items()})
+    return metrics
+
+def find_regressions(results, baseline, threshold=DEFAULT_THRESHOLD, memory_threshold=None):
+    """基準（baseline）より threshold 以上遅くなった・memory_threshold 以上ピークメモリが増えた
+    (行数, 項目, 基準値, 今回値) の一覧（ピークメモリは両方で計測できた場合のみ比較、項目名は MEMORY_METRIC）"""
+    memory_threshold = threshold if memory_threshold is None else memory_threshold
+    regressions = []
+    for rows, case in results['cases'].items():
+        baseline_case = baseline.get('cases', {}).get(rows)
+        if baseline_case is None:
+            continue
+        baseline_memory, current_memory = baseline_case.get(MEMORY_METRIC), case.get(MEMORY_METRIC)
+        if baseline_memory and current_memory is not None and current_memory > baseline_memory * (1 + memory_threshold):
+            regressions.append((rows, MEMORY_METRIC, baseline_memory, current_memory))
+        current_metrics = _compared_metrics(case)
+        for name, baseline_seconds in _compared_metrics(baseline_case).items():
+            current_seconds = current_metrics.get(name)
+            if current_seconds is None or baseline_seconds < MIN_COMPARED_SECONDS:
+                continue
+            if current_seconds > baseline_seconds * (1 + threshold):
+                regressions.append((rows, name, baseline_seconds, current_seconds))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="簿価計算ロジックのベンチマーク（合成台帳で行数ごとに計測）")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="計測する行数（複数指定可、例: 10000 100000 1000000 5000000）")
+    parser.add_argument('--period', default=':'.join(DEFAULT_PERIOD), metavar='期首日:期末日', help="計算期間")
+    parser.add_argument('--engine', choices=[logic.ENGINE_VECTORIZED, logic.ENGINE_ROWWISE], default=logic.DEFAULT_ENGINE)
+    parser.add_argument('--seed', type=int, default=0, help="合成台帳の乱数シード")
+    parser.add_argument('--no-compact', action='store_true', help="作業用DataFrameを省メモリ化せずに計測する（ピークメモリの比較用）")
+    parser.add_argument('--save', metavar='JSON', help="計測結果の保存先")
+    parser.add_argument('--baseline', metavar='JSON', help="比較する基準の計測結果（--save で保存したもの）")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="回帰とみなす遅延の割合（0.2 = 20%%）")
+    parser.add_argument('--memory-threshold', type=float, help="回帰とみなすピークメモリの増加の割合（省略時は --threshold）")
+    args = parser.parse_args(argv)
+
+    try:
+        period = logic.parse_period(args.period)
+    except ValueError as e:
+        parser.error(str(e))
+    results = run_benchmark(args.rows, (str(period[0].date()), str(period[1].date())), args.engine, args.seed, compact=not args.no_compact)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"計測結果を保存しました: {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold, args.memory_threshold)
+        for rows, name, baseline_value, current_value in regressions:
+            if name == MEMORY_METRIC:
+                values = f"ピークメモリ {baseline_value:.0f}MB → {current_value:.0f}MB"
+            else:
+                values = f"{name}: {baseline_value:.3f}秒 → {current_value:.3f}秒"
+            print(f"回帰: {int(rows):,}行 {values} (+{(current_value / baseline_value - 1) * 100:.0f}%)")
+        if regressions:
+            return 1
+        memory_threshold = args.threshold if args.memory_threshold is None else args.memory_threshold
+        print(f"基準からの回帰はありません（しきい値 {args.threshold * 100:.0f}% / ピークメモリ {memory_threshold * 100:.0f}%）")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
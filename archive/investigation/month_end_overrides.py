@@ -0,0 +1,253 @@
+"""
+月末の上書きデータを台帳に反映して簿価を再計算する（BigQuery を使わない臨時計算）
+
+2025年12月分（docs/01_project-management/memo_20260114_monthly_stock_valuation_temp.md）では
+売却・取得原価の上書きCSVを sandbox のテーブルにアップロードし、臨時クエリを全件実行し直していた。
+ここでは同じ上書きを手元の台帳CSVに反映し、python_book_value_logic の計算エンジンで再計算する。
+
+上書きCSV:
+  売却（sold_YYYYMMDD.csv）      : 在庫id, 除売却日, 売却案件名
+      → 除売却日・売却案件名を上書きし、破損紛失分類を「売却（法人案件）」にする
+  取得原価（stock_cost_YYYYMMDD.csv）: id, status, arrival_at, cost, overhead_cost, discount, acquisition_costs
+      → 取得原価 = cost + overhead_cost - discount、月次償却額を取得原価と耐用年数から再計算する
+  'NULL' / 空欄は欠損、日付の 9999-12-31 は「未設定」として欠損に読み替える。
+  売却CSVで除売却日が欠損（NULL / 9999-12-31 / 日付でない）の行は売却として扱えないため反映せず、在庫idを表示する。
+
+使い方:
+  python month_end_overrides.py --input register.csv --sold sold_20260114.csv --cost stock_cost_20260114.csv \
+      --period 2025-12-01:2025-12-31 --output 202512.csv
+  # 前回の出力があれば、上書きで値が変わった在庫だけを再計算して差し込む
+  python month_end_overrides.py --input register.csv --cost stock_cost_20260114.csv \
+      --previous-output 202512.csv --output 202512_fixed.csv
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import python_book_value_logic as logic
+
+NULL_STRINGS = ['NULL', 'null', '']
+DATE_SENTINEL = '9999-12-31'
+SOLD_TO_BUSINESS = '売却（法人案件）'
+SALE_PROPOSITION_COL = '売却案件名'
+USEFUL_LIFE_COL = '耐用年数'
+
+# 上書きCSVの列: (CSVの列名, 型)。型は 'int' / 'date' / 'str'
+SOLD_OVERRIDE_COLUMNS = {
+    '在庫id': 'int',
+    '除売却日': 'date',
+    '売却案件名': 'str',
+}
+COST_OVERRIDE_COLUMNS = {
+    'id': 'int',
+    'status': 'str',
+    'arrival_at': 'date',
+    'cost': 'int',
+    'overhead_cost': 'int',
+    'discount': 'int',
+    'acquisition_costs': 'int',
+}
+
+
+def read_override_csv(file_path, column_types):
+    """上書きCSVを型付きで読み込む（'NULL' は欠損、日付の 9999-12-31 は欠損、整数列は Int64）"""
+    df = pd.read_csv(file_path, encoding='utf-8-sig', dtype=str, na_values=NULL_STRINGS, keep_default_na=False)
+    df.columns = [col.strip() for col in df.columns]
+    missing = [col for col in column_types if col not in df.columns]
+    if missing:
+        raise ValueError(f"{file_path} に必要な列がありません: {', '.join(missing)}")
+    for col, kind in column_types.items():
+        values = df[col].str.strip()
+        if kind == 'int':
+            parsed = pd.to_numeric(values, errors='coerce')
+            invalid = values.notna() & parsed.isna()
+            if invalid.any():
+                raise ValueError(f"{file_path} の {col} に数値でない値があります: {values[invalid].iloc[0]}")
+            df[col] = parsed.astype('Int64')
+        elif kind == 'date':
+            df[col] = pd.to_datetime(values.mask(values == DATE_SENTINEL), format='%Y-%m-%d', errors='coerce')
+        else:
+            df[col] = values
+    return df
+
+
+def _date_text(series):
+    # 台帳CSVと同じ表記（YYYY-MM-DD）に戻す。計算エンジンは前処理で日付に変換する
+    return series.dt.strftime('%Y-%m-%d').where(series.notna(), np.nan)
+
+
+def monthly_depreciation(cost, useful_life_years):
+    """月次償却額（BigQuery の TRUNC(cost / (耐用年数 * 12) + 0.999, 0) と同じ、耐用年数が0・欠損なら0）"""
+    months = pd.to_numeric(useful_life_years, errors='coerce').to_numpy(dtype='float64') * 12
+    cost = cost.to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        amount = np.trunc(cost / months + 0.999)
+    return np.where(months > 0, amount, 0).astype('int64')
+
+
+def sold_override_changes(df_sold):
+    """売却の上書きを変更データ（在庫id + 変更する列）にする
+
+    除売却日が欠損の行（同じ在庫idの最後の行で判定）は反映しない。台帳の除売却日を残したまま
+    破損紛失分類だけを「売却（法人案件）」にしないようにするため。
+    """
+    df_sold = df_sold.dropna(subset=['在庫id']).drop_duplicates('在庫id', keep='last')
+    missing_date = df_sold['除売却日'].isna()
+    if missing_date.any():
+        ids = df_sold.loc[missing_date, '在庫id'].astype('int64')
+        shown = ', '.join(str(stock_id) for stock_id in ids.head(10))
+        print(f"除売却日が無い（NULL / {DATE_SENTINEL} / 日付でない）売却行 {len(ids):,}件は反映しません: 在庫id {shown}{' ...' if len(ids) > 10 else ''}")
+        df_sold = df_sold[~missing_date]
+    return pd.DataFrame({
+        logic.STOCK_ID_COL: df_sold['在庫id'].astype('int64').to_numpy(),
+        logic.IMPOSSIBLED_AT_COL: _date_text(df_sold['除売却日']).to_numpy(),
+        logic.CLASSIFICATION_OF_IMPOSSIBILITY_COL: SOLD_TO_BUSINESS,
+        SALE_PROPOSITION_COL: df_sold['売却案件名'].to_numpy(),
+    })
+
+
+def cost_override_changes(df_cost, df_register):
+    """取得原価の上書きを変更データにする（取得原価 = cost + overhead_cost - discount、月次償却額も再計算）"""
+    df_cost = df_cost.dropna(subset=['id', 'cost']).drop_duplicates('id', keep='last')
+    stock_ids = df_cost['id'].astype('int64').to_numpy()
+    cost = (df_cost['cost'] + df_cost['overhead_cost'].fillna(0) - df_cost['discount'].fillna(0)).astype('int64')
+
+    # 耐用年数は台帳から在庫idで引く（台帳に無い在庫は後で除外される）
+    positions = pd.Index(df_register[logic.STOCK_ID_COL]).get_indexer(stock_ids)
+    useful_life = df_register[USEFUL_LIFE_COL].to_numpy()[np.where(positions >= 0, positions, 0)]
+    useful_life = pd.Series(np.where(positions >= 0, useful_life, np.nan))
+    return pd.DataFrame({
+        logic.STOCK_ID_COL: stock_ids,
+        logic.COST_COLUMN_NAME: cost.to_numpy(),
+        logic.MONTHLY_DEPRECIATION_COL: monthly_depreciation(cost, useful_life),
+    })
+
+
+def combine_changes(df_register, changes):
+    """在庫idごとに変更データを1行にまとめ、台帳に無い在庫・列を除いて返す
+
+    片方の上書きにしか無い在庫は、もう片方の列を台帳の値で埋める。欠損で埋めるかどうかは
+    その上書きに在庫idがあるかで判定し、上書き自体の欠損（NULL で消す値）は台帳の値で埋めない。
+    結合で欠損が入って float になった列は台帳の型に戻し、変わっていない行まで再計算しないようにする。
+    戻り値は (変更データ, 台帳に無かった在庫idの件数, 台帳に無く反映しない列)。
+    """
+    supplied_ids = {}  # 列 -> その列を持つ上書きにある在庫id
+    for df in changes:
+        for col in df.columns:
+            if col != logic.STOCK_ID_COL:
+                supplied_ids[col] = df[logic.STOCK_ID_COL]
+    df_changes = changes[0]
+    for other in changes[1:]:
+        df_changes = df_changes.merge(other, on=logic.STOCK_ID_COL, how='outer', sort=False)
+    unknown_columns = [col for col in df_changes.columns if col not in df_register.columns]
+    df_changes = df_changes.drop(columns=unknown_columns)
+
+    is_known = df_changes[logic.STOCK_ID_COL].isin(df_register[logic.STOCK_ID_COL])
+    df_changes = df_changes[is_known].reset_index(drop=True)
+    positions = pd.Index(df_register[logic.STOCK_ID_COL]).get_indexer(df_changes[logic.STOCK_ID_COL])
+    for col in df_changes.columns:
+        if col == logic.STOCK_ID_COL:
+            continue
+        is_supplied = df_changes[logic.STOCK_ID_COL].isin(supplied_ids[col]).to_numpy()
+        current = df_register[col].iloc[positions].to_numpy()
+        filled = df_changes[col].where(is_supplied, current)
+        try:
+            filled = filled.astype(df_register[col].dtype)
+        except (TypeError, ValueError):
+            pass
+        df_changes[col] = filled
+    return df_changes, int((~is_known).sum()), unknown_columns
+
+
+def apply_month_end_overrides(df_register, sold_path=None, cost_path=None):
+    """上書きCSVを台帳に反映する
+
+    売却と取得原価の両方にある在庫は両方の列を上書きする。片方の上書きにしか無い在庫の、もう片方の列は元の値のまま。
+    戻り値は (反映後の台帳, 値が変わった在庫id)。
+    """
+    if logic.STOCK_ID_COL not in df_register.columns:
+        raise ValueError(f"台帳に{logic.STOCK_ID_COL}列がありません")
+    if df_register[logic.STOCK_ID_COL].duplicated().any():
+        raise ValueError(f"台帳の{logic.STOCK_ID_COL}が重複しています")
+    changes = []
+    if sold_path:
+        changes.append(sold_override_changes(read_override_csv(sold_path, SOLD_OVERRIDE_COLUMNS)))
+    if cost_path:
+        if USEFUL_LIFE_COL not in df_register.columns:
+            raise ValueError(f"月次償却額の再計算には台帳の{USEFUL_LIFE_COL}列が必要です")
+        changes.append(cost_override_changes(read_override_csv(cost_path, COST_OVERRIDE_COLUMNS), df_register))
+    if not changes:
+        raise ValueError("上書きCSV（売却 / 取得原価）を指定してください")
+
+    df_changes, unknown_ids, unknown_columns = combine_changes(df_register, changes)
+    if unknown_ids:
+        print(f"台帳に無い在庫id {unknown_ids:,}件は反映しません")
+    if unknown_columns:
+        print(f"台帳に無い列は反映しません: {', '.join(unknown_columns)}")
+    return logic.apply_input_changes(df_register, df_changes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="月末の上書きCSVを台帳に反映して簿価を再計算します")
+    parser.add_argument('--input', required=True, help="台帳CSV（python_book_value_logic.py の入力と同じ形式）")
+    parser.add_argument('--sold', metavar='CSV', help="売却の上書きCSV（在庫id, 除売却日, 売却案件名）")
+    parser.add_argument('--cost', metavar='CSV', help="取得原価の上書きCSV（id, cost, overhead_cost, discount 等）")
+    parser.add_argument('--output', required=True, help="出力ファイル（拡張子で形式を判定）")
+    parser.add_argument('--period', action='append', default=[], metavar='期首日:期末日', help="計算期間（複数指定可）")
+    parser.add_argument('--monthly', metavar='YYYY-MM', help="指定月から12か月分の月次期間を計算")
+    parser.add_argument('--previous-output', metavar='CSV',
+                        help="前回の出力CSV（指定すると値が変わった在庫だけを前回と同じ期間で再計算する）")
+    parser.add_argument('--updated-input', metavar='CSV', help="上書きを反映した台帳の保存先")
+    parser.add_argument('--engine', choices=[logic.ENGINE_VECTORIZED, logic.ENGINE_ROWWISE], default=logic.DEFAULT_ENGINE)
+    parser.add_argument('--quiet', action='store_true', help="進捗を表示しない")
+    args = parser.parse_args(argv)
+
+    try:
+        periods = [logic.parse_period(text) for text in args.period]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.monthly:
+        periods.extend(logic.monthly_periods(args.monthly))
+    if not periods and not args.previous_output:
+        parser.error("--period / --monthly で期間を指定するか、--previous-output を指定してください")
+    if not args.sold and not args.cost:
+        parser.error("--sold / --cost のいずれかを指定してください")
+
+    def print_progress(percent, message):
+        print(f"{percent:3d}% {message}")
+    if args.quiet:
+        print_progress = None
+
+    start_time = time.time()
+    df_register = logic.load_and_initial_process(args.input)
+    if df_register.empty:
+        print("CSVファイルが空か、データが読み取れませんでした")
+        return 1
+    try:
+        df_updated, changed_ids = apply_month_end_overrides(df_register, args.sold, args.cost)
+        if args.previous_output:
+            df_processed = logic.process_incremental(
+                logic.read_output_csv(args.previous_output), df_updated, changed_ids, print_progress, args.engine)
+        else:
+            df_processed = logic.process_periods(df_updated, periods, print_progress, args.engine, format_dates=False)
+    except (OSError, ValueError) as e:
+        print(f"処理エラー: {e}")
+        return 1
+    if df_processed.empty:
+        print("処理結果が空です")
+        return 1
+
+    logic.write_output(df_processed, args.output, logic.output_format_for(args.output))
+    if args.updated_input:
+        df_updated.to_csv(args.updated_input, index=False, encoding='utf-8')
+    print(f"上書きで値が変わった在庫 {len(changed_ids):,}件 / {len(df_processed):,}行を出力しました "
+          f"({time.time() - start_time:.2f}秒): {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
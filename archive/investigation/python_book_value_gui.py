@@ -0,0 +1,261 @@
+"""
+固定資産台帳 計算・出力アプリ（GUI）
+
+計算ロジックは python_book_value_logic.py にあり、このファイルは画面のみを扱う。
+tkinter はこのファイルでのみ読み込むため、計算ロジックは GUI の無い環境（バッチサーバー等）でも
+import / CLI 実行できる。
+"""
+
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+import pandas as pd
+import os
+import threading
+import time
+
+from python_book_value_logic import DEFAULT_CACHE_DIR, load_prepared_register, output_format_for, process_prepared_periods, write_output
+
+class FixedAssetCalculatorGUI:
+    def __init__(self):
+        self.root = tk.Tk()
+        self.root.title("固定資産台帳 計算・出力アプリ (修正版)")
+        self.root.geometry("700x550")
+        
+        # 変数定義
+        self.csv_file_path = tk.StringVar(value='fixed_assets.csv')
+        self.start_date = tk.StringVar(value='2024-03-01')
+        self.end_date = tk.StringVar(value='2025-02-28')
+        self.processing = False
+        
+        self.setup_ui()
+        
+    def setup_ui(self):
+        # メインフレーム
+        main_frame = ttk.Frame(self.root, padding="20")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # タイトルラベル
+        title_label = ttk.Label(main_frame, text="固定資産台帳 計算・出力アプリ (修正版)", 
+                               font=('Arial', 16, 'bold'))
+        title_label.grid(row=0, column=0, columnspan=3, pady=20)
+        
+        # 改善情報表示
+        info_label = ttk.Label(main_frame, 
+                              text="✓ 安定性向上\n✓ 詳細な進捗表示\n✓ エラーハンドリング強化", 
+                              font=('Arial', 9), foreground="green")
+        info_label.grid(row=1, column=0, columnspan=3, pady=10)
+        
+        # CSVファイル選択
+        ttk.Label(main_frame, text="入力CSVファイル:").grid(row=2, column=0, sticky=tk.W, pady=10)
+        ttk.Entry(main_frame, textvariable=self.csv_file_path, width=40).grid(row=2, column=1, padx=10)
+        ttk.Button(main_frame, text="参照", command=self.browse_input_file).grid(row=2, column=2)
+        
+        # 期首日
+        ttk.Label(main_frame, text="期首日 (YYYY-MM-DD):").grid(row=3, column=0, sticky=tk.W, pady=10)
+        self.start_date_entry = ttk.Entry(main_frame, textvariable=self.start_date, width=20)
+        self.start_date_entry.grid(row=3, column=1, sticky=tk.W, padx=10)
+        
+        # 期末日
+        ttk.Label(main_frame, text="期末日 (YYYY-MM-DD):").grid(row=4, column=0, sticky=tk.W, pady=10)
+        self.end_date_entry = ttk.Entry(main_frame, textvariable=self.end_date, width=20)
+        self.end_date_entry.grid(row=4, column=1, sticky=tk.W, padx=10)
+        
+        # 処理ボタン
+        self.process_button = ttk.Button(main_frame, text="計算実行", 
+                                        command=self.process_data)
+        self.process_button.grid(row=5, column=0, columnspan=3, pady=30)
+        
+        # ステータスラベル
+        self.status_label = ttk.Label(main_frame, text="", foreground="blue")
+        self.status_label.grid(row=6, column=0, columnspan=3, pady=10)
+        
+        # 進捗率ラベル
+        self.progress_percent_label = ttk.Label(main_frame, text="", foreground="green", font=('Arial', 14, 'bold'))
+        self.progress_percent_label.grid(row=7, column=0, columnspan=3, pady=5)
+        
+        # プログレスバー
+        self.progress = ttk.Progressbar(main_frame, mode='determinate', maximum=100)
+        self.progress.grid(row=8, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
+        self.progress.grid_remove()
+        
+        # 処理時間表示ラベル
+        self.time_label = ttk.Label(main_frame, text="", foreground="gray")
+        self.time_label.grid(row=9, column=0, columnspan=3, pady=5)
+        
+        # パフォーマンス情報表示
+        self.perf_label = ttk.Label(main_frame, text="", foreground="purple", font=('Arial', 9))
+        self.perf_label.grid(row=10, column=0, columnspan=3, pady=5)
+        
+        # グリッドの重み設定
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        
+    def browse_input_file(self):
+        filename = filedialog.askopenfilename(
+            title="CSVファイルを選択",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if filename:
+            self.csv_file_path.set(filename)
+            
+    def validate_inputs(self):
+        # ファイル存在確認
+        if not os.path.exists(self.csv_file_path.get()):
+            messagebox.showerror("エラー", f"ファイルが見つかりません: {self.csv_file_path.get()}")
+            return False
+            
+        # 日付妥当性確認
+        try:
+            start = pd.to_datetime(self.start_date.get())
+            end = pd.to_datetime(self.end_date.get())
+            if start >= end:
+                messagebox.showerror("エラー", "期首日は期末日より前の日付を設定してください")
+                return False
+        except:
+            messagebox.showerror("エラー", "日付の形式が正しくありません (YYYY-MM-DD)")
+            return False
+            
+        return True
+        
+    def process_data(self):
+        if self.processing:
+            return
+            
+        if not self.validate_inputs():
+            return
+            
+        self.processing = True
+        self.process_button.config(state='disabled')
+        self.progress.grid()
+        self.progress_percent_label.grid()
+        self.perf_label.grid()
+        self.start_time = time.time()
+        
+        # 処理開始情報表示
+        self.perf_label.config(text="処理を開始しています...")
+        
+        # 別スレッドで処理実行
+        thread = threading.Thread(target=self.run_processing)
+        thread.start()
+        
+    def progress_callback(self, percent, message):
+        """進捗率とメッセージを更新するコールバック関数"""
+        def update_ui():
+            self.progress['value'] = percent
+            self.status_label.config(text=message)
+            self.progress_percent_label.config(text=f"{percent}%")
+            
+            # 経過時間の表示
+            if hasattr(self, 'start_time'):
+                elapsed = time.time() - self.start_time
+                self.time_label.config(text=f"経過時間: {elapsed:.1f}秒")
+            
+        self.root.after(0, update_ui)
+        
+    def run_processing(self):
+        try:
+            # データ読み込み
+            self.update_status("CSVファイルを読み込み中...")
+            load_start = time.time()
+            df_prepared, engine, from_cache = load_prepared_register(
+                self.csv_file_path.get(), report=lambda message, rows=None: self.update_status(message),
+                cache_dir=DEFAULT_CACHE_DIR
+            )
+            load_time = time.time() - load_start
+            load_label = "データ読み込み（キャッシュ）" if from_cache else "データ読み込み・前処理"
+            
+            if df_prepared.empty:
+                self.show_error("CSVファイルが空か、データが読み取れませんでした")
+                return
+            
+            # メモリ使用量情報
+            try:
+                memory_usage = df_prepared.memory_usage(deep=True).sum() / 1024 / 1024  # MB
+                self.update_perf_info(f"{load_label}: {load_time:.2f}秒 | メモリ使用量: {memory_usage:.1f}MB")
+            except:
+                self.update_perf_info(f"{load_label}: {load_time:.2f}秒")
+                
+            # データ処理
+            process_start = time.time()
+            start_date = pd.to_datetime(self.start_date.get())
+            end_date = pd.to_datetime(self.end_date.get())
+            df_processed = process_prepared_periods(
+                df_prepared, [(start_date, end_date)], self.progress_callback, engine, workers=None, format_dates=False
+            )
+            process_time = time.time() - process_start
+            
+            if df_processed.empty:
+                self.show_error("処理結果が空です")
+                return
+                
+            # 出力ファイル保存
+            self.update_status("結果を保存中...")
+            output_filename = filedialog.asksaveasfilename(
+                defaultextension=".csv",
+                filetypes=[("CSV files", "*.csv"), ("Parquet files", "*.parquet"), ("Arrow files", "*.arrow"), ("All files", "*.*")],
+                initialfile='fixed_asset_register_output.csv'
+            )
+            
+            if output_filename:
+                save_start = time.time()
+                write_output(df_processed, output_filename, output_format_for(output_filename))
+                save_time = time.time() - save_start
+                
+                total_time = time.time() - self.start_time
+                rows_per_second = len(df_processed) / total_time if total_time > 0 else 0
+                
+                self.show_success(
+                    f"処理が完了しました。\n\n" + 
+                    f"📊 処理統計:\n" +
+                    f"• 総処理時間: {total_time:.2f}秒\n" +
+                    f"• データ処理: {process_time:.2f}秒\n" +
+                    f"• ファイル保存: {save_time:.2f}秒\n" +
+                    f"• 処理行数: {len(df_processed):,}行\n" +
+                    f"• 処理速度: {rows_per_second:.0f}行/秒\n\n" +
+                    f"💾 保存先: {output_filename}"
+                )
+            else:
+                self.show_info("保存がキャンセルされました")
+                
+        except Exception as e:
+            self.show_error(f"エラーが発生しました:\n{str(e)}")
+            
+        finally:
+            self.processing_complete()
+            
+    def update_status(self, message):
+        self.root.after(0, lambda: self.status_label.config(text=message))
+        
+    def update_perf_info(self, message):
+        self.root.after(0, lambda: self.perf_label.config(text=message))
+        
+    def show_error(self, message):
+        self.root.after(0, lambda: messagebox.showerror("エラー", message))
+        
+    def show_success(self, message):
+        self.root.after(0, lambda: messagebox.showinfo("処理完了", message))
+        
+    def show_info(self, message):
+        self.root.after(0, lambda: messagebox.showinfo("情報", message))
+        
+    def processing_complete(self):
+        def complete_ui():
+            self.progress.stop()
+            self.progress.grid_remove()
+            self.progress_percent_label.grid_remove()
+            self.process_button.config(state='normal')
+            self.status_label.config(text="")
+            if hasattr(self, 'start_time'):
+                elapsed = time.time() - self.start_time
+                self.time_label.config(text=f"✅ 完了 (総処理時間: {elapsed:.2f}秒)")
+        
+        self.root.after(0, complete_ui)
+        self.processing = False
+
+def main():
+    app = FixedAssetCalculatorGUI()
+    app.root.mainloop()
+
+if __name__ == "__main__":
+    main()
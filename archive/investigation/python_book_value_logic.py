@@ -21,18 +21,36 @@
 # ここに簿価計算のPythonコードを記述
 # ======================================
 
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
 import pandas as pd
 import numpy as np
 from datetime import date
 from collections import OrderedDict
 import re
 import os
-import threading
+import hashlib
+import json
+import tracemalloc
+import sys
+import argparse
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pa_compute
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.parquet as pa_parquet
+except ImportError:  # pyarrow が無い環境では並列計算のシャードを pickle で受け渡す（parquet / arrow 出力は不可）、CSV は pd.read_csv で読む
+    pa = pa_compute = pa_csv = pa_dataset = pa_parquet = None
+
+# 会計期間の期末日は tools/fiscal_calendar.py（ダッシュボードの再計算と共用）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'tools'))
+import fiscal_calendar
+import streaming_xlsx
 
 # --- グローバル定数定義 ---
+STOCK_ID_COL = '在庫id'
 SUPPLIER_COLUMN_NAME = 'サプライヤー名'
 SAMPLE_COLUMN_NAME = 'sample'
 INSPECTED_AT_COL = '入庫検品完了日'
@@ -45,6 +63,7 @@ CLASSIFICATION_OF_IMPOSSIBILITY_COL = '破損紛失分類'
 ASSET_CLASSIFICATION_COLUMN_NAME = '資産分類'
 ACCOUNTING_STATUS_COLUMN_NAME = '会計ステータス'
 FIRST_SHIPPED_AT_CALCULATED_COL = '_計算用初回出荷日'
+EXCLUDED_SUPPLIER_COL = '_計算用計上対象外'
 DISPLAY_NAME_FIRST_SHIPPED_AT = '供与開始日(初回出荷日)'
 ACQUISITION_COST_KISHU_COL = '期首取得原価'
 ACQUISITION_COST_INCREASE_COL = '増加取得原価'
@@ -74,6 +93,91 @@ INCREASE_BOOK_VALUE_COL = '増加簿価'
 DECREASE_BOOK_VALUE_COL = '減少簿価'
 CLOSING_BOOK_VALUE_COL = '期末簿価'
 
+# --- リース契約パターン定義 ---
+# サプライヤー名から供与開始日・リース再取得日を導出する契約パターン。
+# target（対象列）ごとに上から順に評価し、最初に一致したパターンを採用する。
+# 一致したが年月が不正な場合は NaT とし、既定値（CSVの日付）には戻さない。
+#   pattern       : 正規表現。名前付きグループ month は必須、year（西暦下2桁）が無い場合は base_year を使用
+#   months_offset : 契約開始月からの経過月数
+#   month_end     : True なら月末日、False なら月初日
+LEASE_CONTRACT_PATTERN_FIELDS = ['name', 'target', 'pattern', 'base_year', 'months_offset', 'month_end']
+DEFAULT_LEASE_CONTRACT_PATTERNS = [
+    {'name': '株式会社カンム', 'target': DISPLAY_NAME_FIRST_SHIPPED_AT,
+     'pattern': r"^株式会社カンム 契約No\.2022000(?P<month>\d)$",
+     'base_year': 2022, 'months_offset': 0, 'month_end': False},
+    {'name': '三井住友トラスト・パナソニックファイナンス', 'target': DISPLAY_NAME_FIRST_SHIPPED_AT,
+     'pattern': r"三井住友トラスト・パナソニックファイナンス株式会社\(リースバック品\)_契約開始(?P<year>\d{2})(?P<month>\d{2})$",
+     'base_year': None, 'months_offset': 0, 'month_end': True},
+    {'name': '株式会社カンム', 'target': LEASE_REACQUISITION_DATE_COL,
+     'pattern': r"^株式会社カンム 契約No\.2022000(?P<month>\d)$",
+     'base_year': 2022, 'months_offset': 24, 'month_end': False},
+    {'name': '三井住友トラスト・パナソニックファイナンス', 'target': LEASE_REACQUISITION_DATE_COL,
+     'pattern': r"^三井住友トラスト・パナソニックファイナンス株式会社\(リースバック品\)_契約開始(?:.*_契約開始)?(?P<year>\d{2})(?P<month>\d{2})$",
+     'base_year': None, 'months_offset': 30, 'month_end': True},
+]
+
+def load_lease_contract_patterns(file_path):
+    """契約パターンをCSVから読み込む（列は LEASE_CONTRACT_PATTERN_FIELDS と同じ）"""
+    table = pd.read_csv(file_path, encoding='utf-8', dtype=str, keep_default_na=False)
+    missing = [field for field in LEASE_CONTRACT_PATTERN_FIELDS if field not in table.columns]
+    if missing:
+        raise ValueError(f"契約パターンの列が不足しています: {', '.join(missing)}")
+    patterns = []
+    for record in table.to_dict('records'):
+        patterns.append({
+            'name': record['name'],
+            'target': record['target'],
+            'pattern': record['pattern'],
+            'base_year': int(float(record['base_year'])) if record['base_year'].strip() else None,
+            'months_offset': int(float(record['months_offset'] or 0)),
+            'month_end': record['month_end'].strip().upper() == 'TRUE',
+        })
+    return patterns
+
+def _compile_contract_patterns(contract_patterns):
+    compiled = []
+    for pattern in contract_patterns:
+        regex = re.compile(pattern['pattern'])
+        if 'month' not in regex.groupindex:
+            raise ValueError(f"契約パターン '{pattern['name']}' に month グループがありません")
+        compiled.append((pattern['target'], regex, pattern.get('base_year'),
+                         int(pattern.get('months_offset') or 0), bool(pattern.get('month_end'))))
+    return compiled
+
+_DEFAULT_COMPILED_CONTRACT_PATTERNS = _compile_contract_patterns(DEFAULT_LEASE_CONTRACT_PATTERNS)
+
+def match_contract_date(supplier_name, target, contract_patterns=None):
+    """サプライヤー名が契約パターンに一致すれば target 列の日付を返す（不一致なら None）"""
+    compiled = _DEFAULT_COMPILED_CONTRACT_PATTERNS if contract_patterns is None else _compile_contract_patterns(contract_patterns)
+    supplier_name_str = str(supplier_name)
+    for pattern_target, regex, base_year, months_offset, month_end in compiled:
+        if pattern_target != target:
+            continue
+        match = regex.search(supplier_name_str)
+        if not match:
+            continue
+        year = 2000 + int(match.group('year')) if 'year' in regex.groupindex else base_year
+        month = int(match.group('month'))
+        if year is None or not 1 <= month <= 12:
+            return pd.NaT
+        contract_date = pd.Timestamp(year=year, month=month, day=1) + pd.DateOffset(months=months_offset)
+        return contract_date + pd.offsets.MonthEnd(0) if month_end else contract_date
+    return None
+
+def _is_excluded_supplier_name(supplier_name_str):
+    return bool((re.search(r'レベシェア', supplier_name_str) and not re.search(r'リース・レベシェア', supplier_name_str)) or
+                re.search(r'法人小物管理用', supplier_name_str))
+
+def is_excluded_from_calculation(row):
+    """レベシェア品・小物等・サンプル品は計算対象外（各計算関数の CASE 1）
+
+    前処理で付与した計上対象外フラグ列があればそれを使い、無ければサプライヤー名から判定する。
+    """
+    excluded_supplier = row.get(EXCLUDED_SUPPLIER_COL)
+    if excluded_supplier is None:
+        excluded_supplier = _is_excluded_supplier_name(str(row.get(SUPPLIER_COLUMN_NAME, "")))
+    return bool(excluded_supplier or row.get(SAMPLE_COLUMN_NAME, False))
+
 # --- 計算関数定義（従来のロジックを維持） ---
 def calculate_months_diff(date1, date2):
     if pd.isna(date1) or pd.isna(date2): return 0
@@ -179,28 +283,17 @@ def determine_accounting_status(row, end_date_param):
         return "リース債権(貸手リース)"
     return asset_class
 
-def calculate_lease_reacquisition_date(supplier_name_val):
+def calculate_lease_reacquisition_date(supplier_name_val, contract_patterns=None):
     if pd.isna(supplier_name_val): return pd.NaT
-    supplier_name_str = str(supplier_name_val)
-    match_kanmu = re.search(r"^株式会社カンム 契約No\.2022000(\d)$", supplier_name_str)
-    if match_kanmu:
-        try:
-            val = pd.to_datetime(f"2024-{match_kanmu.group(1)}-01", errors='coerce')
-            return val.normalize() if pd.notna(val) else pd.NaT
-        except ValueError: return pd.NaT
-    if supplier_name_str.startswith("三井住友トラスト・パナソニックファイナンス株式会社(リースバック品)_契約開始"):
-        match_code = re.search(r'_契約開始(\d{4})$', supplier_name_str)
-        if match_code:
-            contract_code = match_code.group(1)
-            if len(contract_code) == 4:
-                try:
-                    base_date = pd.to_datetime(f"20{contract_code[:2]}-{contract_code[2:]}-01", errors='coerce')
-                    if pd.isna(base_date): return pd.NaT
-                    return (base_date + pd.DateOffset(months=30) + pd.offsets.MonthEnd(0))
-                except ValueError: return pd.NaT
-    return pd.NaT
-
-def calculate_first_shipped_at_calculated(row):
+    reacquisition_date = match_contract_date(supplier_name_val, LEASE_REACQUISITION_DATE_COL, contract_patterns)
+    return pd.NaT if reacquisition_date is None else reacquisition_date
+
+def calculate_contract_first_shipped_at(supplier_name, contract_patterns=None):
+    """契約パターンから供与開始日を決定する。該当しないサプライヤーは None を返す"""
+    if pd.isna(supplier_name): return None
+    return match_contract_date(supplier_name, DISPLAY_NAME_FIRST_SHIPPED_AT, contract_patterns)
+
+def calculate_first_shipped_at_calculated(row, contract_patterns=None):
     supplier_name = row.get(SUPPLIER_COLUMN_NAME)
     first_shipped_date_from_csv_col = row.get(DISPLAY_NAME_FIRST_SHIPPED_AT, pd.NaT)
     lease_first_shipped_at_from_csv_col = row.get(LEASE_FIRST_SHIPPED_AT_COL, pd.NaT)
@@ -209,35 +302,18 @@ def calculate_first_shipped_at_calculated(row):
         default_ship_date = first_shipped_date_from_csv_col
     elif pd.notna(lease_first_shipped_at_from_csv_col):
         default_ship_date = lease_first_shipped_at_from_csv_col
-    if pd.notna(supplier_name):
-        supplier_name_str = str(supplier_name)
-        kanmu_match = re.search(r"^株式会社カンム 契約No\.2022000(\d)$", supplier_name_str)
-        if kanmu_match:
-            try:
-                val = pd.to_datetime(f"2022-{int(kanmu_match.group(1)):02d}-01", errors='coerce')
-                return val.normalize() if pd.notna(val) else pd.NaT
-            except ValueError: return pd.NaT
-        smbc_match = re.search(r"三井住友トラスト・パナソニックファイナンス株式会社\(リースバック品\)_契約開始(\d{4})$", supplier_name_str)
-        if smbc_match:
-            contract_code = smbc_match.group(1)
-            if len(contract_code) == 4:
-                try:
-                    base_date = pd.to_datetime(f"20{contract_code[:2]}-{contract_code[2:]}-01", errors='coerce')
-                    if pd.isna(base_date): return pd.NaT
-                    return (base_date + pd.offsets.MonthEnd(0))
-                except ValueError: return pd.NaT
+    contract_ship_date = calculate_contract_first_shipped_at(supplier_name, contract_patterns)
+    if contract_ship_date is not None:
+        return contract_ship_date
     return default_ship_date
 
 def calculate_initial_cost(row, start_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     inspected_at = row.get(INSPECTED_AT_COL, pd.NaT)
     lease_reacquisition_date = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     impossibled_at = row.get(IMPOSSIBLED_AT_COL, pd.NaT)
     lease_first_shipped_at = row.get(LEASE_FIRST_SHIPPED_AT_COL, pd.NaT)
     cost = row.get(COST_COLUMN_NAME, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if pd.isna(inspected_at): return 0
     if pd.notna(inspected_at) and inspected_at >= start_date_param: return 0
     if pd.notna(lease_reacquisition_date):
@@ -248,15 +324,12 @@ def calculate_initial_cost(row, start_date_param):
     return cost
 
 def calculate_acquisition_cost_increase(row, start_date_param, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     lease_reacquisition_date = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     inspected_at = row.get(INSPECTED_AT_COL, pd.NaT)
     impossibled_at = row.get(IMPOSSIBLED_AT_COL, pd.NaT)
     lease_first_shipped_at = row.get(LEASE_FIRST_SHIPPED_AT_COL, pd.NaT)
     cost = row.get(COST_COLUMN_NAME, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if pd.notna(lease_reacquisition_date) and (start_date_param <= lease_reacquisition_date <= end_date_param):
         lease_reacquisition_date_month_start = lease_reacquisition_date.replace(day=1)
         condition_impossibled_ok = pd.isna(impossibled_at) or (pd.notna(impossibled_at) and impossibled_at >= lease_reacquisition_date_month_start)
@@ -266,14 +339,11 @@ def calculate_acquisition_cost_increase(row, start_date_param, end_date_param):
     return 0
 
 def calculate_acquisition_cost_decrease(row, start_date_param, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     impossibled_at = row.get(IMPOSSIBLED_AT_COL, pd.NaT)
     lease_first_shipped_at = row.get(LEASE_FIRST_SHIPPED_AT_COL, pd.NaT)
     lease_reacquisition_date = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     cost = row.get(COST_COLUMN_NAME, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-            re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if pd.notna(impossibled_at) and impossibled_at < start_date_param: return 0
     if pd.notna(lease_first_shipped_at) and lease_first_shipped_at < start_date_param: return 0
     if pd.notna(lease_reacquisition_date):
@@ -286,14 +356,11 @@ def calculate_acquisition_cost_decrease(row, start_date_param, end_date_param):
     return 0
     
 def calculate_acquisition_cost_kimatsu(row, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     kishu_cost = row.get(ACQUISITION_COST_KISHU_COL,0)
     increase_cost = row.get(ACQUISITION_COST_INCREASE_COL,0)
     decrease_cost = row.get(ACQUISITION_COST_DECREASE_COL,0)
     cost = kishu_cost + increase_cost - decrease_cost
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     accounting_status_at_end = row.get(ACCOUNTING_STATUS_COLUMN_NAME, "")
     if accounting_status_at_end not in ["賃貸用固定資産", "リース資産(借手リース)"]: return 0
     return max(0, cost)
@@ -327,8 +394,6 @@ def calculate_amortization_months_kishu(row, start_date_param):
     return 0
 
 def calculate_amortization_months_shokyaku(row, start_date_param, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     inspected_at = row.get(INSPECTED_AT_COL, pd.NaT)
     lease_reacquisition_date_val = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     depreciation_period_years = pd.to_numeric(row.get('耐用年数', 0), errors='coerce')
@@ -338,8 +403,7 @@ def calculate_amortization_months_shokyaku(row, start_date_param, end_date_param
     shokyaku_alpha = row.get(SHOKYAKU_ALPHA_COL, 0)
     shokyaku_beta = row.get(SHOKYAKU_BETA_COL, 0)
     shokyaku_gamma = row.get(SHOKYAKU_GAMMA_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if pd.notna(inspected_at) and inspected_at > end_date_param: return 0
     lease_reacquisition_date_month_start = pd.NaT
     if pd.notna(lease_reacquisition_date_val):
@@ -353,8 +417,6 @@ def calculate_amortization_months_shokyaku(row, start_date_param, end_date_param
         return max(0, val)
 
 def calculate_amortization_months_increase(row, start_date_param, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     lease_reacquisition_date_val = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     impossibled_at = row.get(IMPOSSIBLED_AT_COL, pd.NaT)
     lease_first_shipped_at_col_val = row.get(LEASE_FIRST_SHIPPED_AT_COL, pd.NaT)
@@ -363,8 +425,7 @@ def calculate_amortization_months_increase(row, start_date_param, end_date_param
     if pd.notna(depreciation_period_years) and depreciation_period_years > 0:
         depreciation_period_months = depreciation_period_years * 12
     shokyaku_gamma = row.get(SHOKYAKU_GAMMA_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     lease_reacquisition_date_month_start = pd.NaT
     if pd.notna(lease_reacquisition_date_val):
         lease_reacquisition_date_month_start = lease_reacquisition_date_val.replace(day=1)
@@ -382,8 +443,6 @@ def calculate_amortization_months_increase(row, start_date_param, end_date_param
     return min(shokyaku_gamma, depreciation_period_months)
 
 def calculate_amortization_months_decrease(row, start_date_param, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     classification_of_impossibility = row.get(CLASSIFICATION_OF_IMPOSSIBILITY_COL, None)
     impossibled_at = row.get(IMPOSSIBLED_AT_COL, pd.NaT)
     lease_first_shipped_at_col_val = row.get(LEASE_FIRST_SHIPPED_AT_COL, pd.NaT)
@@ -393,8 +452,7 @@ def calculate_amortization_months_decrease(row, start_date_param, end_date_param
     if pd.notna(depreciation_period_years) and depreciation_period_years > 0:
         depreciation_period_months = depreciation_period_years * 12
     shokyaku_beta = row.get(SHOKYAKU_BETA_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if classification_of_impossibility == "レベシェア品": return 0
     if (pd.notna(impossibled_at) and impossibled_at < start_date_param) or \
        (pd.notna(lease_first_shipped_at_col_val) and lease_first_shipped_at_col_val < start_date_param): return 0
@@ -410,8 +468,6 @@ def calculate_amortization_months_decrease(row, start_date_param, end_date_param
     return min(shokyaku_beta, depreciation_period_months)
 
 def calculate_accumulated_depreciation_kishu(row, start_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     amortization_months_kishu_val = row.get(AMORTIZATION_MONTHS_KISHU_COL, 0)
     lease_reacquisition_date_val = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     cost = row.get(COST_COLUMN_NAME, 0)
@@ -421,8 +477,7 @@ def calculate_accumulated_depreciation_kishu(row, start_date_param):
         depreciation_period_months = depreciation_period_years * 12
     shokyaku_alpha = row.get(SHOKYAKU_ALPHA_COL, 0)
     monthly_depreciation_amount = row.get(MONTHLY_DEPRECIATION_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if amortization_months_kishu_val == 0: return 0
     lease_reacquisition_date_month_start = pd.NaT
     if pd.notna(lease_reacquisition_date_val):
@@ -441,8 +496,6 @@ def calculate_accumulated_depreciation_kishu(row, start_date_param):
     return monthly_depreciation_amount * amortization_months_kishu_val
 
 def calculate_accumulated_depreciation_kimatsu(row, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     amortization_months_kimatsu_val = row.get(AMORTIZATION_MONTHS_KIMATSU_COL, 0) 
     lease_reacquisition_date_val = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     cost = row.get(COST_COLUMN_NAME, 0)
@@ -452,8 +505,7 @@ def calculate_accumulated_depreciation_kimatsu(row, end_date_param):
         depreciation_period_months = depreciation_period_years * 12
     shokyaku_beta = row.get(SHOKYAKU_BETA_COL, 0)
     monthly_depreciation_amount = row.get(MONTHLY_DEPRECIATION_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if amortization_months_kimatsu_val == 0: return 0
     lease_reacquisition_date_month_start = pd.NaT
     if pd.notna(lease_reacquisition_date_val):
@@ -470,8 +522,6 @@ def calculate_accumulated_depreciation_kimatsu(row, end_date_param):
     return monthly_depreciation_amount * amortization_months_kimatsu_val
 
 def calculate_accumulated_depreciation_increase(row):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     amortization_months_increase_val = row.get(AMORTIZATION_MONTHS_INCREASE_COL, 0)
     cost = row.get(COST_COLUMN_NAME, 0)
     depreciation_period_years = pd.to_numeric(row.get('耐用年数', 0), errors='coerce')
@@ -480,8 +530,7 @@ def calculate_accumulated_depreciation_increase(row):
         depreciation_period_months = depreciation_period_years * 12
     shokyaku_gamma = row.get(SHOKYAKU_GAMMA_COL, 0)
     monthly_depreciation_amount = row.get(MONTHLY_DEPRECIATION_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if amortization_months_increase_val == 0: return 0
     term_gamma_months_for_calc = shokyaku_gamma
     if depreciation_period_months > 0:
@@ -496,8 +545,6 @@ def calculate_accumulated_depreciation_increase(row):
     return monthly_depreciation_amount * amortization_months_increase_val
 
 def calculate_accumulated_depreciation_decrease(row):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     amortization_months_decrease_val = row.get(AMORTIZATION_MONTHS_DECREASE_COL, 0)
     cost = row.get(COST_COLUMN_NAME, 0)
     depreciation_period_years = pd.to_numeric(row.get('耐用年数', 0), errors='coerce')
@@ -506,8 +553,7 @@ def calculate_accumulated_depreciation_decrease(row):
         depreciation_period_months = depreciation_period_years * 12
     shokyaku_beta = row.get(SHOKYAKU_BETA_COL, 0) 
     monthly_depreciation_amount = row.get(MONTHLY_DEPRECIATION_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if amortization_months_decrease_val == 0: return 0
     term_beta_months_for_calc = shokyaku_beta
     if depreciation_period_months > 0:
@@ -522,8 +568,6 @@ def calculate_accumulated_depreciation_decrease(row):
     return monthly_depreciation_amount * amortization_months_decrease_val
 
 def calculate_interim_depreciation_expense(row):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     amortization_months_shokyaku_val = row.get(AMORTIZATION_MONTHS_SHOKYAKU_COL, 0)
     cost = row.get(COST_COLUMN_NAME, 0)
     depreciation_period_years = pd.to_numeric(row.get('耐用年数', 0), errors='coerce')
@@ -533,8 +577,7 @@ def calculate_interim_depreciation_expense(row):
     shokyaku_alpha = row.get(SHOKYAKU_ALPHA_COL, 0)
     shokyaku_beta = row.get(SHOKYAKU_BETA_COL, 0)
     monthly_depreciation_amount = row.get(MONTHLY_DEPRECIATION_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if amortization_months_shokyaku_val == 0: return 0
     total_depreciable_by_period_val = monthly_depreciation_amount * depreciation_period_months if depreciation_period_months > 0 else cost
     kishu_dep_amount_val = monthly_depreciation_amount * shokyaku_alpha
@@ -555,27 +598,21 @@ def calculate_interim_depreciation_expense(row):
     return monthly_depreciation_amount * amortization_months_shokyaku_val
 
 def calculate_new_impairment_loss_kishu(row, start_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     impairment_date = row.get(IMPAIRMENT_DATE_COL, pd.NaT)
     acquisition_cost_kishu = row.get(ACQUISITION_COST_KISHU_COL, 0)
     accumulated_depreciation_kishu = row.get(ACCUMULATED_DEPRECIATION_KISHU_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if pd.notna(impairment_date) and impairment_date < start_date_param:
         book_value_kishu = acquisition_cost_kishu - accumulated_depreciation_kishu
         return max(0, book_value_kishu) 
     else: return 0
 
 def calculate_new_impairment_loss_kimatsu(row, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     lease_reacquisition_date = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     impairment_date = row.get(IMPAIRMENT_DATE_COL, pd.NaT)
     acquisition_cost_kimatsu = row.get(ACQUISITION_COST_KIMATSU_COL, 0)
     accumulated_depreciation_kimatsu = row.get(ACCUMULATED_DEPRECIATION_KIMATSU_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     lease_reacquisition_date_month_start = pd.NaT
     if pd.notna(lease_reacquisition_date):
         lease_reacquisition_date_month_start = lease_reacquisition_date.replace(day=1)
@@ -586,15 +623,12 @@ def calculate_new_impairment_loss_kimatsu(row, end_date_param):
     return 0
 
 def calculate_new_impairment_loss_increase(row, start_date_param, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     impairment_date = row.get(IMPAIRMENT_DATE_COL, pd.NaT)
     lease_reacquisition_date = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     inspected_at = row.get(INSPECTED_AT_COL, pd.NaT)
     acquisition_cost_increase = row.get(ACQUISITION_COST_INCREASE_COL, 0)
     accumulated_depreciation_increase = row.get(ACCUMULATED_DEPRECIATION_INCREASE_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if pd.isna(impairment_date): return 0
     lease_reacquisition_date_month_start = pd.NaT
     if pd.notna(lease_reacquisition_date):
@@ -607,13 +641,10 @@ def calculate_new_impairment_loss_increase(row, start_date_param, end_date_param
     return max(0, book_value_increase_at_impairment)
 
 def calculate_new_impairment_loss_decrease(row, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     impairment_date = row.get(IMPAIRMENT_DATE_COL, pd.NaT)
     acquisition_cost_decrease = row.get(ACQUISITION_COST_DECREASE_COL, 0)
     accumulated_depreciation_decrease = row.get(ACCUMULATED_DEPRECIATION_DECREASE_COL, 0)
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample: return 0
+    if is_excluded_from_calculation(row): return 0
     if pd.notna(impairment_date) and impairment_date > end_date_param: return 0
     if pd.isna(impairment_date): return 0
     if pd.notna(impairment_date) and impairment_date <= end_date_param:
@@ -622,8 +653,6 @@ def calculate_new_impairment_loss_decrease(row, end_date_param):
     return 0
         
 def calculate_new_interim_impairment_loss(row, start_date_param, end_date_param):
-    supplier_name = str(row.get(SUPPLIER_COLUMN_NAME, ""))
-    sample = row.get(SAMPLE_COLUMN_NAME, False)
     lease_reacquisition_date = row.get(LEASE_REACQUISITION_DATE_COL, pd.NaT)
     inspected_at = row.get(INSPECTED_AT_COL, pd.NaT)
     impairment_date = row.get(IMPAIRMENT_DATE_COL, pd.NaT)
@@ -633,8 +662,7 @@ def calculate_new_interim_impairment_loss(row, start_date_param, end_date_param)
     impairment_loss_accumulated_kimatsu = row.get(IMPAIRMENT_LOSS_ACCUMULATED_KIMATSU_COL, 0)
 
     # CASE 1
-    if (re.search(r'レベシェア', supplier_name) and not re.search(r'リース・レベシェア', supplier_name)) or \
-       re.search(r'法人小物管理用', supplier_name) or sample:
+    if is_excluded_from_calculation(row):
         return 0
 
     # CASE 2
@@ -675,510 +703,1937 @@ def calculate_closing_book_value(row):
     if accounting_status not in ["賃貸用固定資産", "リース資産(借手リース)"]: return 0
     return max(0, closing_bv)
 
+# --- サプライヤー解決 ---
+SUPPLIER_TABLE_EXCLUDED_COL = '計上対象外'
+SUPPLIER_TABLE_CONTRACT_FIRST_SHIPPED_COL = '契約供与開始日'
+SUPPLIER_TABLE_HAS_CONTRACT_COL = '契約供与開始日あり'
+
+def resolve_suppliers(df, contract_patterns=None):
+    """サプライヤー名のユニーク値ごとに 計上対象外・資産分類・リース再取得日・契約上の供与開始日 を求める
+
+    戻り値は (各行のユニーク値番号, ユニーク値ごとの解決結果DataFrame)。
+    サプライヤーの種類は行数に比べてごく少ないため、文字列判定と正規表現はユニーク値の数だけ評価する。
+    """
+    if SUPPLIER_COLUMN_NAME in df.columns:
+        codes, uniques = pd.factorize(df[SUPPLIER_COLUMN_NAME], use_na_sentinel=False)
+    else:
+        codes, uniques = np.zeros(len(df), dtype=np.intp), [None]
+    contract_first_shipped = [calculate_contract_first_shipped_at(u, contract_patterns) for u in uniques]
+    reacquisition_dates = [calculate_lease_reacquisition_date(u, contract_patterns) for u in uniques]
+    table = pd.DataFrame({
+        SUPPLIER_COLUMN_NAME: pd.Series(list(uniques), dtype=object),
+        SUPPLIER_TABLE_EXCLUDED_COL: [_is_excluded_supplier_name(str(u)) for u in uniques],
+        ASSET_CLASSIFICATION_COLUMN_NAME: [classify_asset({SUPPLIER_COLUMN_NAME: u}) for u in uniques],
+        LEASE_REACQUISITION_DATE_COL: pd.to_datetime(pd.Series(reacquisition_dates, dtype=object), errors='coerce').dt.normalize(),
+        SUPPLIER_TABLE_CONTRACT_FIRST_SHIPPED_COL: pd.to_datetime(
+            pd.Series([pd.NaT if d is None else d for d in contract_first_shipped], dtype=object), errors='coerce'),
+        SUPPLIER_TABLE_HAS_CONTRACT_COL: [d is not None for d in contract_first_shipped],
+    })
+    return codes, table
+
+# --- ベクトル化計算関数定義（列単位で上記の行単位ロジックと同一の結果を返す） ---
+# 行単位関数は apply(axis=1) の戻り値から列の型を推論するため、Python int と float の
+# どちらを返したかで出力CSVの表記（"100" / "100.0"）が変わる。ベクトル化版では
+# 数値を (値配列, float判定配列) の組で扱い、同じ型推論を再現する。
+ENGINE_ROWWISE = 'rowwise'
+ENGINE_VECTORIZED = 'vectorized'
+DEFAULT_ENGINE = ENGINE_VECTORIZED
+DEPRECIATING_STATUSES = ["賃貸用固定資産", "リース資産(借手リース)"]
+
+def _supplier_values(df, column, suppliers=None):
+    """サプライヤー解決結果の列を行へ展開する"""
+    codes, table = resolve_suppliers(df) if suppliers is None else suppliers
+    return table[column].to_numpy()[codes]
+
+def _sample_mask(df):
+    if SAMPLE_COLUMN_NAME not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    values = df[SAMPLE_COLUMN_NAME].to_numpy()
+    if values.dtype == bool:
+        return values
+    return np.array([v is True for v in values], dtype=bool)
+
+def _excluded_mask(df):
+    """レベシェア品・小物等・サンプル品の判定（各計算関数の CASE 1 に相当）"""
+    if EXCLUDED_SUPPLIER_COL in df.columns:
+        supplier_excluded = df[EXCLUDED_SUPPLIER_COL].to_numpy(dtype=bool)
+    else:
+        supplier_excluded = _supplier_values(df, SUPPLIER_TABLE_EXCLUDED_COL).astype(bool)
+    return supplier_excluded | _sample_mask(df)
+
+def _date_values(df, col):
+    if col not in df.columns:
+        return np.full(len(df), np.datetime64('NaT', 'us'))
+    return pd.to_datetime(df[col], errors='coerce').to_numpy(dtype='datetime64[us]')
+
+def _date_param(value):
+    return np.datetime64(pd.Timestamp(value).to_datetime64(), 'us')
+
+def _month_start(values):
+    return values.astype('datetime64[M]').astype('datetime64[us]')
+
+def _months_diff(date1, date2):
+    """calculate_months_diff の列版（どちらかが NaT の行は 0）"""
+    date1 = np.broadcast_to(date1, np.shape(date2)) if np.ndim(date1) == 0 else date1
+    month1 = date1.astype('datetime64[M]').astype('int64')
+    month2 = date2.astype('datetime64[M]').astype('int64')
+    return np.where(np.isnat(date1) | np.isnat(date2), 0, month1 - month2)
+
+def _object_values(df, col):
+    if col not in df.columns:
+        return np.full(len(df), None, dtype=object)
+    series = df[col]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # カテゴリの文字列オブジェクトを共有する（行数分の文字列を新たに作らない）
+        categories = np.append(series.cat.categories.to_numpy(dtype=object), np.nan)
+        return categories[series.cat.codes.to_numpy()]
+    return series.to_numpy(dtype=object)
+
+def _equals(values, target):
+    return (pd.Series(values, dtype=object) == target).to_numpy(dtype=bool)
+
+def _isin(values, targets):
+    return pd.Series(values, dtype=object).isin(targets).to_numpy(dtype=bool)
+
+def _num(df, col, default=0):
+    """数値列を (値, float判定) の組で返す"""
+    if col not in df.columns:
+        return np.full(len(df), float(default)), np.zeros(len(df), dtype=bool)
+    series = df[col]
+    return series.to_numpy(dtype='float64', na_value=np.nan), np.full(len(df), series.dtype.kind == 'f')
+
+def _const(value, size):
+    return np.full(size, float(value)), np.full(size, isinstance(value, float))
+
+def _add(a, b):
+    return a[0] + b[0], a[1] | b[1]
+
+def _sub(a, b):
+    return a[0] - b[0], a[1] | b[1]
+
+def _mul(a, b):
+    return a[0] * b[0], a[1] | b[1]
+
+def _py_min(a, b):
+    """組み込み min(a, b) と同じく、b < a のときだけ b を採用する"""
+    take_b = b[0] < a[0]
+    return np.where(take_b, b[0], a[0]), np.where(take_b, b[1], a[1])
+
+def _py_max(a, b):
+    """組み込み max(a, b) と同じく、b > a のときだけ b を採用する"""
+    take_b = b[0] > a[0]
+    return np.where(take_b, b[0], a[0]), np.where(take_b, b[1], a[1])
+
+def _select(conditions, choices, default):
+    """if 文の連鎖と同じく、最初に成立した条件の値を採用する"""
+    values = np.select(conditions, [c[0] for c in choices], default[0])
+    is_float = np.select(conditions, [c[1] for c in choices], default[1])
+    return values, is_float
+
+def _to_series(df, number):
+    values, is_float = number
+    if is_float.any() or np.isnan(values).any():
+        return pd.Series(values, index=df.index, dtype='float64')
+    return pd.Series(values.astype('int64'), index=df.index)
+
+def _depreciation_months(df):
+    """耐用年数(月)。戻り値は (耐用年数>0 の判定, 耐用年数>0 でなければ 0 とした月数)"""
+    years = _num(df, '耐用年数')
+    positive = years[0] > 0
+    months = _mul(years, _const(12, len(df)))
+    return positive, (np.where(positive, months[0], 0.0), months[1] & positive)
+
+def _lease_reacquisition_month_start(df):
+    return _month_start(_date_values(df, LEASE_REACQUISITION_DATE_COL))
+
+def _impairment_precedes_other_events(impairment_date, impossibled_at, lease_first_shipped_at):
+    return ((np.isnat(impossibled_at) & np.isnat(lease_first_shipped_at)) |
+            (impossibled_at > impairment_date) | (lease_first_shipped_at > impairment_date))
+
+def _int_series(df, values):
+    return pd.Series(np.asarray(values, dtype='int64'), index=df.index)
+
+def calculate_shokyaku_alpha_vectorized(df, start_date_param):
+    start = _date_param(start_date_param)
+    first_shipped_at = _date_values(df, DISPLAY_NAME_FIRST_SHIPPED_AT)
+    impairment_date = _date_values(df, IMPAIRMENT_DATE_COL)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    lost = _equals(_object_values(df, CLASSIFICATION_OF_IMPOSSIBILITY_COL), "庫内紛失／棚卸差異")
+    months_to_impossibled = _months_diff(impossibled_at, first_shipped_at)
+    return _int_series(df, np.select(
+        [np.isnat(first_shipped_at) | (first_shipped_at >= start),
+         (impairment_date < start) & _impairment_precedes_other_events(impairment_date, impossibled_at, lease_first_shipped_at),
+         lease_first_shipped_at < start,
+         impossibled_at < start],
+        [0,
+         np.maximum(_months_diff(impairment_date, first_shipped_at) + 1, 0),
+         np.maximum(_months_diff(lease_first_shipped_at, first_shipped_at), 0),
+         np.maximum(months_to_impossibled + lost, 0)],
+        _months_diff(start, first_shipped_at)))
+
+def calculate_shokyaku_beta_vectorized(df, end_date_param):
+    end = _date_param(end_date_param)
+    first_shipped_at = _date_values(df, DISPLAY_NAME_FIRST_SHIPPED_AT)
+    impairment_date = _date_values(df, IMPAIRMENT_DATE_COL)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    lost = _equals(_object_values(df, CLASSIFICATION_OF_IMPOSSIBILITY_COL), "庫内紛失／棚卸差異")
+    return _int_series(df, np.select(
+        [np.isnat(first_shipped_at) | (first_shipped_at > end),
+         (impairment_date <= end) & _impairment_precedes_other_events(impairment_date, impossibled_at, lease_first_shipped_at),
+         lease_first_shipped_at <= end,
+         impossibled_at <= end],
+        [0,
+         np.maximum(_months_diff(impairment_date, first_shipped_at) + 1, 0),
+         np.maximum(_months_diff(lease_first_shipped_at, first_shipped_at), 0),
+         np.maximum(_months_diff(impossibled_at, first_shipped_at) + lost, 0)],
+        _months_diff(end, first_shipped_at) + 1))
+
+def calculate_shokyaku_gamma_vectorized(df):
+    lease_reacquisition_date = _date_values(df, LEASE_REACQUISITION_DATE_COL)
+    month_start = _month_start(lease_reacquisition_date)
+    first_shipped_at = _date_values(df, DISPLAY_NAME_FIRST_SHIPPED_AT)
+    impairment_date = _date_values(df, IMPAIRMENT_DATE_COL)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    lost = _equals(_object_values(df, CLASSIFICATION_OF_IMPOSSIBILITY_COL), "庫内紛失／棚卸差異")
+    return _int_series(df, np.select(
+        [np.isnat(lease_reacquisition_date),
+         (impairment_date < month_start) & _impairment_precedes_other_events(impairment_date, impossibled_at, lease_first_shipped_at),
+         lease_first_shipped_at < month_start,
+         impossibled_at < month_start,
+         ~np.isnat(first_shipped_at)],
+        [0,
+         np.maximum(_months_diff(impairment_date, first_shipped_at) + 1, 0),
+         np.maximum(_months_diff(lease_first_shipped_at, first_shipped_at), 0),
+         np.maximum(_months_diff(impossibled_at, first_shipped_at) + lost, 0),
+         _months_diff(lease_reacquisition_date, first_shipped_at)],
+        0))
+
+def classify_asset_vectorized(df, suppliers=None):
+    codes, table = resolve_suppliers(df) if suppliers is None else suppliers
+    supplier_classes = pd.Categorical(table[ASSET_CLASSIFICATION_COLUMN_NAME])
+    if "サンプル品" not in supplier_classes.categories:
+        supplier_classes = supplier_classes.add_categories(["サンプル品"])
+    row_codes = supplier_classes.codes[codes]
+    row_codes[_sample_mask(df)] = supplier_classes.categories.get_loc("サンプル品")
+    return pd.Series(pd.Categorical.from_codes(row_codes, supplier_classes.categories), index=df.index)
+
+def determine_accounting_status_vectorized(df, end_date_param):
+    end = _date_param(end_date_param)
+    asset_class = _object_values(df, ASSET_CLASSIFICATION_COLUMN_NAME)
+    inspected_at = _date_values(df, INSPECTED_AT_COL)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    classification = _object_values(df, CLASSIFICATION_OF_IMPOSSIBILITY_COL)
+    disposed = impossibled_at <= end
+    statuses = ["計上外(レベシェア)", "仕入高(小物等)", "研究開発費(サンプル品)", "計上外(入庫検品前)",
+                "仕入高(売却)", "雑費(除却)", "家具廃棄損(除却)", "リース債権(貸手リース)"]
+    # どの条件にも当たらない行は資産分類をそのままステータスとする。
+    # 文字列ではなくカテゴリ番号を選ぶことで、行数分の文字列オブジェクトを作らない。
+    asset_codes, asset_classes = pd.factorize(asset_class)
+    categories = pd.Index(list(dict.fromkeys(statuses + list(asset_classes))))
+    asset_status_codes = np.append(categories.get_indexer(asset_classes), -1).astype(np.int16)[asset_codes]
+    status_codes = np.select(
+        [_equals(asset_class, "レベシェア品"),
+         _equals(asset_class, "小物等"),
+         _equals(asset_class, "サンプル品"),
+         np.isnat(inspected_at) | (inspected_at > end),
+         disposed & _isin(classification, ["売却（顧客）", "売却（法人案件）", "売却（EC）"]),
+         disposed & _isin(classification, ["貸倒/所有権放棄", "貸倒"]),
+         disposed,
+         lease_first_shipped_at <= end],
+        np.arange(len(statuses), dtype=np.int16),
+        asset_status_codes)
+    return pd.Series(pd.Categorical.from_codes(status_codes, categories), index=df.index)
+
+def calculate_lease_reacquisition_date_vectorized(df, suppliers=None):
+    return pd.Series(_supplier_values(df, LEASE_REACQUISITION_DATE_COL, suppliers), index=df.index)
+
+def calculate_first_shipped_at_calculated_vectorized(df, suppliers=None):
+    first_shipped_at = _date_values(df, DISPLAY_NAME_FIRST_SHIPPED_AT)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    default_ship_date = np.where(np.isnat(first_shipped_at), lease_first_shipped_at, first_shipped_at)
+    has_contract = _supplier_values(df, SUPPLIER_TABLE_HAS_CONTRACT_COL, suppliers).astype(bool)
+    contract_ship_date = _supplier_values(df, SUPPLIER_TABLE_CONTRACT_FIRST_SHIPPED_COL, suppliers).astype('datetime64[us]')
+    return pd.Series(np.where(has_contract, contract_ship_date, default_ship_date), index=df.index)
+
+def calculate_initial_cost_vectorized(df, start_date_param):
+    start = _date_param(start_date_param)
+    inspected_at = _date_values(df, INSPECTED_AT_COL)
+    month_start = _lease_reacquisition_month_start(df)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         np.isnat(inspected_at) | (inspected_at >= start),
+         month_start >= start,
+         (impossibled_at < start) | (lease_first_shipped_at < start)],
+        [zero, zero, zero, zero],
+        _num(df, COST_COLUMN_NAME)))
+
+def calculate_acquisition_cost_increase_vectorized(df, start_date_param, end_date_param):
+    start, end = _date_param(start_date_param), _date_param(end_date_param)
+    lease_reacquisition_date = _date_values(df, LEASE_REACQUISITION_DATE_COL)
+    month_start = _month_start(lease_reacquisition_date)
+    inspected_at = _date_values(df, INSPECTED_AT_COL)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    cost = _num(df, COST_COLUMN_NAME)
+    zero = _const(0, len(df))
+    reacquired_in_period = ((start <= lease_reacquisition_date) & (lease_reacquisition_date <= end) &
+                            (np.isnat(impossibled_at) | (impossibled_at >= month_start)) &
+                            (np.isnat(lease_first_shipped_at) | (lease_first_shipped_at >= month_start)))
+    inspected_in_period = (start <= inspected_at) & (inspected_at <= end) & np.isnat(lease_reacquisition_date)
+    return _to_series(df, _select(
+        [_excluded_mask(df), reacquired_in_period, inspected_in_period],
+        [zero, cost, cost],
+        zero))
+
+def calculate_acquisition_cost_decrease_vectorized(df, start_date_param, end_date_param):
+    start, end = _date_param(start_date_param), _date_param(end_date_param)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    month_start = _lease_reacquisition_month_start(df)
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         (impossibled_at < start) | (lease_first_shipped_at < start),
+         (impossibled_at < month_start) | (lease_first_shipped_at < month_start),
+         ((start <= impossibled_at) & (impossibled_at <= end)) |
+         ((start <= lease_first_shipped_at) & (lease_first_shipped_at <= end))],
+        [zero, zero, zero, _num(df, COST_COLUMN_NAME)],
+        zero))
+
+def calculate_acquisition_cost_kimatsu_vectorized(df, end_date_param):
+    cost = _sub(_add(_num(df, ACQUISITION_COST_KISHU_COL), _num(df, ACQUISITION_COST_INCREASE_COL)),
+                _num(df, ACQUISITION_COST_DECREASE_COL))
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df), ~_isin(_object_values(df, ACCOUNTING_STATUS_COLUMN_NAME), DEPRECIATING_STATUSES)],
+        [zero, zero],
+        _py_max(zero, cost)))
+
+def calculate_shokyaku_months_kimatsu_vectorized(df, end_date_param):
+    positive, depreciation_months = _depreciation_months(df)
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [~_isin(_object_values(df, ACCOUNTING_STATUS_COLUMN_NAME), DEPRECIATING_STATUSES), ~positive],
+        [zero, zero],
+        _py_min(_num(df, SHOKYAKU_BETA_COL), depreciation_months)))
+
+def calculate_amortization_months_kishu_vectorized(df, start_date_param):
+    start = _date_param(start_date_param)
+    positive, depreciation_months = _depreciation_months(df)
+    first_shipped_at = _date_values(df, DISPLAY_NAME_FIRST_SHIPPED_AT)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [~positive,
+         (lease_first_shipped_at < start) | (impossibled_at < start),
+         first_shipped_at < start],
+        [zero, zero, _py_min(_num(df, SHOKYAKU_ALPHA_COL), depreciation_months)],
+        zero))
+
+def calculate_amortization_months_shokyaku_vectorized(df, start_date_param, end_date_param):
+    start, end = _date_param(start_date_param), _date_param(end_date_param)
+    _, depreciation_months = _depreciation_months(df)
+    inspected_at = _date_values(df, INSPECTED_AT_COL)
+    month_start = _lease_reacquisition_month_start(df)
+    beta_months = _py_min(depreciation_months, _num(df, SHOKYAKU_BETA_COL))
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df), inspected_at > end, month_start > end, month_start >= start],
+        [zero, zero, zero,
+         _py_max(zero, _sub(beta_months, _py_min(depreciation_months, _num(df, SHOKYAKU_GAMMA_COL))))],
+        _py_max(zero, _sub(beta_months, _py_min(depreciation_months, _num(df, SHOKYAKU_ALPHA_COL))))))
+
+def calculate_amortization_months_increase_vectorized(df, start_date_param, end_date_param):
+    start, end = _date_param(start_date_param), _date_param(end_date_param)
+    _, depreciation_months = _depreciation_months(df)
+    month_start = _lease_reacquisition_month_start(df)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         np.isnat(month_start) | (month_start < start) | (month_start > end),
+         (impossibled_at < month_start) | (lease_first_shipped_at < month_start)],
+        [zero, zero, zero],
+        _py_min(_num(df, SHOKYAKU_GAMMA_COL), depreciation_months)))
+
+def calculate_amortization_months_decrease_vectorized(df, start_date_param, end_date_param):
+    start, end = _date_param(start_date_param), _date_param(end_date_param)
+    _, depreciation_months = _depreciation_months(df)
+    impossibled_at = _date_values(df, IMPOSSIBLED_AT_COL)
+    lease_first_shipped_at = _date_values(df, LEASE_FIRST_SHIPPED_AT_COL)
+    month_start = _lease_reacquisition_month_start(df)
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         _equals(_object_values(df, CLASSIFICATION_OF_IMPOSSIBILITY_COL), "レベシェア品"),
+         (impossibled_at < start) | (lease_first_shipped_at < start),
+         (impossibled_at < month_start) | (lease_first_shipped_at < month_start),
+         lease_first_shipped_at > end,
+         np.isnat(lease_first_shipped_at) & (np.isnat(impossibled_at) | (impossibled_at > end))],
+        [zero, zero, zero, zero, zero, zero],
+        _py_min(_num(df, SHOKYAKU_BETA_COL), depreciation_months)))
+
+def calculate_accumulated_depreciation_kishu_vectorized(df, start_date_param):
+    start = _date_param(start_date_param)
+    positive, depreciation_months = _depreciation_months(df)
+    amortization_months = _num(df, AMORTIZATION_MONTHS_KISHU_COL)
+    cost = _num(df, COST_COLUMN_NAME)
+    shokyaku_alpha = _num(df, SHOKYAKU_ALPHA_COL)
+    month_start = _lease_reacquisition_month_start(df)
+    term_alpha_months = np.where(positive, _py_min(depreciation_months, shokyaku_alpha)[0], shokyaku_alpha[0])
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         amortization_months[0] == 0,
+         start <= month_start,
+         positive & ((cost[0] < term_alpha_months) | (depreciation_months[0] <= shokyaku_alpha[0]))],
+        [zero, zero, zero, cost],
+        _mul(_num(df, MONTHLY_DEPRECIATION_COL), amortization_months)))
+
+def calculate_accumulated_depreciation_kimatsu_vectorized(df, end_date_param):
+    end = _date_param(end_date_param)
+    positive, depreciation_months = _depreciation_months(df)
+    amortization_months = _num(df, AMORTIZATION_MONTHS_KIMATSU_COL)
+    cost = _num(df, COST_COLUMN_NAME)
+    month_start = _lease_reacquisition_month_start(df)
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         amortization_months[0] == 0,
+         month_start > end,
+         positive & ((cost[0] < amortization_months[0]) | (depreciation_months[0] <= _num(df, SHOKYAKU_BETA_COL)[0]))],
+        [zero, zero, zero, cost],
+        _mul(_num(df, MONTHLY_DEPRECIATION_COL), amortization_months)))
+
+def _accumulated_depreciation_for_months(df, amortization_months_col, shokyaku_col):
+    """増加・減少減価償却累計額の共通ロジック"""
+    positive, depreciation_months = _depreciation_months(df)
+    amortization_months = _num(df, amortization_months_col)
+    cost = _num(df, COST_COLUMN_NAME)
+    shokyaku_months = _num(df, shokyaku_col)
+    term_months = np.where(positive, _py_min(depreciation_months, shokyaku_months)[0], shokyaku_months[0])
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         amortization_months[0] == 0,
+         positive & ((cost[0] < term_months) | (depreciation_months[0] == amortization_months[0]))],
+        [zero, zero, cost],
+        _mul(_num(df, MONTHLY_DEPRECIATION_COL), amortization_months)))
+
+def calculate_accumulated_depreciation_increase_vectorized(df):
+    return _accumulated_depreciation_for_months(df, AMORTIZATION_MONTHS_INCREASE_COL, SHOKYAKU_GAMMA_COL)
+
+def calculate_accumulated_depreciation_decrease_vectorized(df):
+    return _accumulated_depreciation_for_months(df, AMORTIZATION_MONTHS_DECREASE_COL, SHOKYAKU_BETA_COL)
+
+def calculate_interim_depreciation_expense_vectorized(df):
+    size = len(df)
+    positive, depreciation_months = _depreciation_months(df)
+    amortization_months = _num(df, AMORTIZATION_MONTHS_SHOKYAKU_COL)
+    cost = _num(df, COST_COLUMN_NAME)
+    shokyaku_alpha = _num(df, SHOKYAKU_ALPHA_COL)
+    shokyaku_beta = _num(df, SHOKYAKU_BETA_COL)
+    monthly = _num(df, MONTHLY_DEPRECIATION_COL)
+    one, zero = _const(1, size), _const(0, size)
+    total_depreciable = np.where(positive, _mul(monthly, depreciation_months)[0], cost[0])
+    kishu_dep_amount = _mul(monthly, shokyaku_alpha)
+    kimatsu_dep_amount_candidate = _mul(monthly, shokyaku_beta)
+    term_alpha_months = _select([positive], [_py_min(shokyaku_alpha, depreciation_months)], shokyaku_alpha)
+    months_after_first = _select([amortization_months[0] > 0], [_sub(amortization_months, one)], zero)
+    fully_depreciated_value = _add(_sub(cost, _mul(monthly, _sub(depreciation_months, one))),
+                                   _mul(monthly, months_after_first))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         amortization_months[0] == 0,
+         positive & (cost[0] <= total_depreciable) & (cost[0] > kishu_dep_amount[0]) & (cost[0] < kimatsu_dep_amount_candidate[0]),
+         positive & (cost[0] < _mul(monthly, term_alpha_months)[0]),
+         positive & (depreciation_months[0] <= shokyaku_beta[0])],
+        [zero, zero, _sub(cost, kishu_dep_amount), zero, fully_depreciated_value],
+        _mul(monthly, amortization_months)))
+
+def calculate_new_impairment_loss_kishu_vectorized(df, start_date_param):
+    start = _date_param(start_date_param)
+    impairment_date = _date_values(df, IMPAIRMENT_DATE_COL)
+    book_value = _sub(_num(df, ACQUISITION_COST_KISHU_COL), _num(df, ACCUMULATED_DEPRECIATION_KISHU_COL))
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df), impairment_date < start],
+        [zero, _py_max(zero, book_value)],
+        zero))
+
+def calculate_new_impairment_loss_kimatsu_vectorized(df, end_date_param):
+    end = _date_param(end_date_param)
+    impairment_date = _date_values(df, IMPAIRMENT_DATE_COL)
+    month_start = _lease_reacquisition_month_start(df)
+    book_value = _sub(_num(df, ACQUISITION_COST_KIMATSU_COL), _num(df, ACCUMULATED_DEPRECIATION_KIMATSU_COL))
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df), month_start > end, impairment_date <= end],
+        [zero, zero, _py_max(zero, book_value)],
+        zero))
+
+def calculate_new_impairment_loss_increase_vectorized(df, start_date_param, end_date_param):
+    impairment_date = _date_values(df, IMPAIRMENT_DATE_COL)
+    lease_reacquisition_date = _date_values(df, LEASE_REACQUISITION_DATE_COL)
+    month_start = _month_start(lease_reacquisition_date)
+    inspected_at = _date_values(df, INSPECTED_AT_COL)
+    book_value = _sub(_num(df, ACQUISITION_COST_INCREASE_COL), _num(df, ACCUMULATED_DEPRECIATION_INCREASE_COL))
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         np.isnat(impairment_date),
+         impairment_date > month_start,
+         np.isnat(lease_reacquisition_date) & (impairment_date > inspected_at)],
+        [zero, zero, zero, zero],
+        _py_max(zero, book_value)))
+
+def calculate_new_impairment_loss_decrease_vectorized(df, end_date_param):
+    end = _date_param(end_date_param)
+    impairment_date = _date_values(df, IMPAIRMENT_DATE_COL)
+    book_value = _sub(_num(df, ACQUISITION_COST_DECREASE_COL), _num(df, ACCUMULATED_DEPRECIATION_DECREASE_COL))
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df), impairment_date > end, np.isnat(impairment_date)],
+        [zero, zero, zero],
+        _py_max(zero, book_value)))
+
+def calculate_new_interim_impairment_loss_vectorized(df, start_date_param, end_date_param):
+    start, end = _date_param(start_date_param), _date_param(end_date_param)
+    inspected_at = _date_values(df, INSPECTED_AT_COL)
+    impairment_date = _date_values(df, IMPAIRMENT_DATE_COL)
+    month_start = _lease_reacquisition_month_start(df)
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [_excluded_mask(df),
+         month_start > end,
+         (inspected_at <= end) & (start <= impairment_date) & (impairment_date <= end)],
+        [zero, zero,
+         _py_max(_num(df, IMPAIRMENT_LOSS_ACCUMULATED_DECREASE_COL), _num(df, IMPAIRMENT_LOSS_ACCUMULATED_KIMATSU_COL))],
+        zero))
+
+def _book_value_vectorized(df, cost_col, depreciation_col, impairment_col):
+    return _to_series(df, _sub(_sub(_num(df, cost_col), _num(df, depreciation_col)), _num(df, impairment_col)))
+
+def calculate_opening_book_value_vectorized(df):
+    return _book_value_vectorized(df, ACQUISITION_COST_KISHU_COL, ACCUMULATED_DEPRECIATION_KISHU_COL, IMPAIRMENT_LOSS_ACCUMULATED_KISHU_COL)
+
+def calculate_increase_book_value_vectorized(df):
+    return _book_value_vectorized(df, ACQUISITION_COST_INCREASE_COL, ACCUMULATED_DEPRECIATION_INCREASE_COL, IMPAIRMENT_LOSS_ACCUMULATED_INCREASE_COL)
+
+def calculate_decrease_book_value_vectorized(df):
+    return _book_value_vectorized(df, ACQUISITION_COST_DECREASE_COL, ACCUMULATED_DEPRECIATION_DECREASE_COL, IMPAIRMENT_LOSS_ACCUMULATED_DECREASE_COL)
+
+def calculate_closing_book_value_vectorized(df):
+    closing_bv = _sub(_sub(_num(df, ACQUISITION_COST_KIMATSU_COL), _num(df, ACCUMULATED_DEPRECIATION_KIMATSU_COL)),
+                      _num(df, IMPAIRMENT_LOSS_ACCUMULATED_KIMATSU_COL))
+    zero = _const(0, len(df))
+    return _to_series(df, _select(
+        [~_isin(_object_values(df, ACCOUNTING_STATUS_COLUMN_NAME), DEPRECIATING_STATUSES)],
+        [zero],
+        _py_max(zero, closing_bv)))
+
+def supports_vectorized_engine(df):
+    """ベクトル化版が行単位版と同一の結果を返せる入力かを判定する"""
+    if COST_COLUMN_NAME in df.columns and df[COST_COLUMN_NAME].dtype.kind not in 'iuf':
+        return False
+    for col in [MONTHLY_DEPRECIATION_COL, '耐用年数']:
+        if col in df.columns and df[col].dtype.kind == 'b':
+            return False
+    return True
+
+# --- 計算ステージ定義 ---
+# (進捗メッセージ, 出力列, 行単位関数, ベクトル化関数, 期間パラメータ, 丸め有無)
+COST_STAGES = [
+    ("取得原価を計算中...", ACQUISITION_COST_KISHU_COL, calculate_initial_cost, calculate_initial_cost_vectorized, ('start',), False),
+    ("増加取得原価を計算中...", ACQUISITION_COST_INCREASE_COL, calculate_acquisition_cost_increase, calculate_acquisition_cost_increase_vectorized, ('start', 'end'), False),
+    ("減少取得原価を計算中...", ACQUISITION_COST_DECREASE_COL, calculate_acquisition_cost_decrease, calculate_acquisition_cost_decrease_vectorized, ('start', 'end'), False),
+    ("期末取得原価を計算中...", ACQUISITION_COST_KIMATSU_COL, calculate_acquisition_cost_kimatsu, calculate_acquisition_cost_kimatsu_vectorized, ('end',), False),
+    ("償却αを計算中...", SHOKYAKU_ALPHA_COL, calculate_shokyaku_alpha, calculate_shokyaku_alpha_vectorized, ('start',), False),
+    ("償却βを計算中...", SHOKYAKU_BETA_COL, calculate_shokyaku_beta, calculate_shokyaku_beta_vectorized, ('end',), False),
+    ("償却γを計算中...", SHOKYAKU_GAMMA_COL, calculate_shokyaku_gamma, calculate_shokyaku_gamma_vectorized, (), False),
+]
+
+DEPRECIATION_STAGES = [
+    ("期首償却月数を計算中...", AMORTIZATION_MONTHS_KISHU_COL, calculate_amortization_months_kishu, calculate_amortization_months_kishu_vectorized, ('start',), False),
+    ("償却償却月数を計算中...", AMORTIZATION_MONTHS_SHOKYAKU_COL, calculate_amortization_months_shokyaku, calculate_amortization_months_shokyaku_vectorized, ('start', 'end'), False),
+    ("増加償却月数を計算中...", AMORTIZATION_MONTHS_INCREASE_COL, calculate_amortization_months_increase, calculate_amortization_months_increase_vectorized, ('start', 'end'), False),
+    ("減少償却月数を計算中...", AMORTIZATION_MONTHS_DECREASE_COL, calculate_amortization_months_decrease, calculate_amortization_months_decrease_vectorized, ('start', 'end'), False),
+    ("期末償却月数を計算中...", AMORTIZATION_MONTHS_KIMATSU_COL, calculate_shokyaku_months_kimatsu, calculate_shokyaku_months_kimatsu_vectorized, ('end',), False),
+    ("期首減価償却累計額を計算中...", ACCUMULATED_DEPRECIATION_KISHU_COL, calculate_accumulated_depreciation_kishu, calculate_accumulated_depreciation_kishu_vectorized, ('start',), True),
+    ("増加減価償却累計額を計算中...", ACCUMULATED_DEPRECIATION_INCREASE_COL, calculate_accumulated_depreciation_increase, calculate_accumulated_depreciation_increase_vectorized, (), True),
+    ("減少減価償却累計額を計算中...", ACCUMULATED_DEPRECIATION_DECREASE_COL, calculate_accumulated_depreciation_decrease, calculate_accumulated_depreciation_decrease_vectorized, (), True),
+    ("期中減価償却費を計算中...", INTERIM_DEPRECIATION_EXPENSE_COL, calculate_interim_depreciation_expense, calculate_interim_depreciation_expense_vectorized, (), True),
+    ("期末減価償却累計額を計算中...", ACCUMULATED_DEPRECIATION_KIMATSU_COL, calculate_accumulated_depreciation_kimatsu, calculate_accumulated_depreciation_kimatsu_vectorized, ('end',), True),
+    ("期首減損損失累計額を計算中...", IMPAIRMENT_LOSS_ACCUMULATED_KISHU_COL, calculate_new_impairment_loss_kishu, calculate_new_impairment_loss_kishu_vectorized, ('start',), True),
+    ("増加減損損失累計額を計算中...", IMPAIRMENT_LOSS_ACCUMULATED_INCREASE_COL, calculate_new_impairment_loss_increase, calculate_new_impairment_loss_increase_vectorized, ('start', 'end'), True),
+    ("減少減損損失累計額を計算中...", IMPAIRMENT_LOSS_ACCUMULATED_DECREASE_COL, calculate_new_impairment_loss_decrease, calculate_new_impairment_loss_decrease_vectorized, ('end',), True),
+    ("期末減損損失累計額を計算中...", IMPAIRMENT_LOSS_ACCUMULATED_KIMATSU_COL, calculate_new_impairment_loss_kimatsu, calculate_new_impairment_loss_kimatsu_vectorized, ('end',), True),
+    ("期中減損損失を計算中...", INTERIM_IMPAIRMENT_LOSS_COL, calculate_new_interim_impairment_loss, calculate_new_interim_impairment_loss_vectorized, ('start', 'end'), True),
+]
+
+BOOK_VALUE_STAGES = [
+    (OPENING_BOOK_VALUE_COL, calculate_opening_book_value, calculate_opening_book_value_vectorized),
+    (INCREASE_BOOK_VALUE_COL, calculate_increase_book_value, calculate_increase_book_value_vectorized),
+    (DECREASE_BOOK_VALUE_COL, calculate_decrease_book_value, calculate_decrease_book_value_vectorized),
+    (CLOSING_BOOK_VALUE_COL, calculate_closing_book_value, calculate_closing_book_value_vectorized),
+]
+
+def run_calculation_stage(df, stage, start_date_dt, end_date_dt, engine=DEFAULT_ENGINE):
+    """計算ステージを1つ実行し、出力列を df に追加する"""
+    _, column, rowwise_func, vectorized_func, params, round_result = stage
+    args = tuple(start_date_dt if p == 'start' else end_date_dt for p in params)
+    if engine == ENGINE_VECTORIZED:
+        result = vectorized_func(df, *args)
+    else:
+        result = df.apply(rowwise_func, args=args, axis=1)
+    df[column] = result.round(0) if round_result else result
+
+# --- 作業用DataFrameの省メモリ化 ---
+# 種類の少ない文字列列は category、月数列は値域に応じた int16/int32 で保持する。
+# 金額列は出力CSVの "100" / "100.0" 表記を保つため、整数なら int64・float なら float64 のまま。
+# 日付列は pandas 3 の既定（datetime64[us]）のまま（秒単位にしても1要素8バイトで変わらないため）。
+COMPACT_WORKING_FRAME = True
+CATEGORY_COLS = [SUPPLIER_COLUMN_NAME, CLASSIFICATION_OF_IMPOSSIBILITY_COL, ASSET_CLASSIFICATION_COLUMN_NAME, ACCOUNTING_STATUS_COLUMN_NAME]
+MONTH_COUNT_COLS = [
+    SHOKYAKU_ALPHA_COL, SHOKYAKU_BETA_COL, SHOKYAKU_GAMMA_COL,
+    AMORTIZATION_MONTHS_KISHU_COL, AMORTIZATION_MONTHS_SHOKYAKU_COL, AMORTIZATION_MONTHS_INCREASE_COL,
+    AMORTIZATION_MONTHS_DECREASE_COL, AMORTIZATION_MONTHS_KIMATSU_COL,
+]
+
+def _smallest_int_dtype(series):
+    for dtype in (np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if series.empty or (series.min() >= info.min and series.max() <= info.max):
+            return dtype
+    return series.dtype
+
+def compact_working_frame(df, columns):
+    """df の指定列のうち対象のものを省メモリな型に変換する（df を直接変更する）
+
+    出力に影響しない変換だけを行う: category は文字列として、int16/int32 は整数として書き出される。
+    float の月数列（耐用年数が小数の台帳）は float64 のまま。
+    """
+    if not COMPACT_WORKING_FRAME:
+        return df
+    for col in columns:
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if col in CATEGORY_COLS:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype('category')
+        elif col in MONTH_COUNT_COLS and series.dtype.kind == 'i':
+            df[col] = series.astype(_smallest_int_dtype(series))
+    return df
+
+# --- 台帳CSVの型付き読み込み ---
+# 計算に使う列の型。date は REGISTER_DATE_FORMATS のいずれか、number は数値、bool は TRUE / FALSE として読み込み時に変換する
+REGISTER_COLUMN_TYPES = OrderedDict([
+    (INSPECTED_AT_COL, 'date'),
+    (DISPLAY_NAME_FIRST_SHIPPED_AT, 'date'),
+    (IMPAIRMENT_DATE_COL, 'date'),
+    (IMPOSSIBLED_AT_COL, 'date'),
+    (LEASE_FIRST_SHIPPED_AT_COL, 'date'),
+    ('耐用年数', 'number'),
+    (COST_COLUMN_NAME, 'number'),
+    (MONTHLY_DEPRECIATION_COL, 'number'),
+    (SAMPLE_COLUMN_NAME, 'bool'),
+])
+# BigQuery の DATE / DATETIME の CSV 出力と、出力CSV（YYYY/MM/DD）の表記。
+# これらに合わない値（小数秒・'Z' 付き・'20250301' 等）は pd.to_datetime で変換する（_convert_date_strings）
+REGISTER_DATE_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']
+# 値のある行のうちこの割合を超えて変換できない列は、書式の誤りとしてエラーにする
+MAX_INVALID_RATIO = 0.5
+REGISTER_TRUE_VALUES = ['TRUE', 'True', 'true']
+REGISTER_FALSE_VALUES = ['FALSE', 'False', 'false']
+# pd.read_csv が既定で欠損とみなす文字列（型付き読み込みでも同じ値を欠損にする）
+CSV_NULL_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                   '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+_INTEGER_PATTERN = r'^[+-]?\d+$'
+_TIMEZONE_SUFFIX_PATTERN = r'\s*(Z|UTC|[+-]\d{2}:?\d{2})$'
+_NUMBER_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+def _invalid_count(text, converted):
+    """文字列としては値があるのに変換後に欠損になった件数"""
+    return pa_compute.sum(pa_compute.and_(pa_compute.is_valid(text), pa_compute.is_null(converted))).as_py() or 0
+
+def _check_invalid_ratio(col, values, invalid):
+    filled = len(values) - values.null_count
+    if filled and invalid > filled * MAX_INVALID_RATIO:
+        raise ValueError(f"{col} の {invalid:,} / {filled:,} 件が変換できません（列の書式を確認してください）")
+
+def _convert_date_strings(values, date_formats):
+    """日付の文字列を timestamp[us] にする（read_register_csv と分割読み込みで共用）
+
+    date_formats のいずれにも合わない値は pd.to_datetime（ISO8601、次に値ごとに書式を推定）で変換する。
+    タイムゾーン表記（Z / UTC / +09:00）は無視し、書かれている日時のまま扱う。
+    戻り値は (変換後の配列, 変換できなかった件数)。
+    """
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    text = pa_compute.utf8_trim_whitespace(values)
+    converted = None
+    for date_format in date_formats:
+        parsed = pa_compute.strptime(text, format=date_format, unit='us', error_is_null=True)
+        converted = parsed if converted is None else pa_compute.coalesce(converted, parsed)
+    unparsed = pa_compute.and_(pa_compute.is_valid(text), pa_compute.is_null(converted))
+    if pa_compute.any(unparsed).as_py():
+        rest = text.filter(unparsed).to_pandas().str.replace(_TIMEZONE_SUFFIX_PATTERN, '', regex=True)
+        parsed = pd.to_datetime(rest, errors='coerce', format='ISO8601')
+        retry = parsed.isna()
+        if retry.any():
+            parsed[retry] = pd.to_datetime(rest[retry], errors='coerce', format='mixed')
+        converted = pa_compute.replace_with_mask(
+            converted, unparsed, pa.Array.from_pandas(parsed.astype('datetime64[us]'), type=pa.timestamp('us')))
+    return converted, _invalid_count(text, converted)
+
+def convert_register_dates(df, date_formats=None):
+    """pd.read_csv で読んだ台帳の日付列（REGISTER_COLUMN_TYPES の date）を read_register_csv と同じ規則で日時にする
+
+    分割読み込み（process_csv_in_chunks）で一括読み込みと同じ日付になるようにするため。
+    戻り値は (変換後の DataFrame, {列名: 変換できなかった値の件数})。
+    """
+    date_formats = REGISTER_DATE_FORMATS if date_formats is None else date_formats
+    invalid_counts = {}
+    for col, kind in REGISTER_COLUMN_TYPES.items():
+        if kind != 'date' or col not in df.columns or df[col].dtype.kind == 'M':
+            continue
+        series = df[col]
+        if series.dtype.kind in 'iuf':
+            # '20250301' だけの列は数値として読まれる（欠損を含めば float）ため、整数の表記に戻す
+            series = series.astype('Int64')
+        values = pa.array(series.astype('string'), type=pa.string(), from_pandas=True)
+        converted, invalid = _convert_date_strings(values, date_formats)
+        _check_invalid_ratio(col, values, invalid)
+        if invalid:
+            invalid_counts[col] = invalid
+        df = df.assign(**{col: converted.to_pandas().set_axis(df.index)})
+    return df, invalid_counts
+
+def print_invalid_counts(invalid_counts):
+    for col, count in invalid_counts.items():
+        treated_as = "False" if REGISTER_COLUMN_TYPES.get(col) == 'bool' else "欠損"
+        print(f"警告: {col} に変換できない値が {count:,} 件あります（{treated_as}として扱います）")
+
+def _convert_number_strings(values):
+    """数値の文字列を pd.read_csv の推論と同じ型にする（全て整数で欠損なしなら int64、それ以外は float64）"""
+    text = pa_compute.utf8_trim_whitespace(values)
+    is_number = pa_compute.match_substring_regex(text, _NUMBER_PATTERN)
+    valid_text = pa_compute.if_else(is_number, text, pa.scalar(None, pa.string()))
+    all_integer = (valid_text.null_count == 0
+                   and pa_compute.all(pa_compute.match_substring_regex(valid_text, _INTEGER_PATTERN)).as_py() is not False)
+    converted = pa_compute.cast(valid_text, pa.int64() if all_integer else pa.float64())
+    return converted, _invalid_count(text, converted)
+
+def _convert_bool_strings(values):
+    """TRUE / FALSE（前後の空白・大文字小文字は問わない）を bool にする"""
+    text = pa_compute.utf8_upper(pa_compute.utf8_trim_whitespace(values))
+    is_true = pa_compute.equal(text, 'TRUE')
+    is_bool = pa_compute.or_(is_true, pa_compute.equal(text, 'FALSE'))
+    converted = pa_compute.if_else(is_bool, is_true, pa.scalar(None, pa.bool_()))
+    return converted, _invalid_count(text, converted)
+
+def read_register_csv(file_path, column_types=None, date_formats=None):
+    """台帳CSVを pyarrow の CSV リーダー（複数スレッド）で読み、計算に使う列を読み込み時に型変換する
+
+    column_types（省略時は REGISTER_COLUMN_TYPES、台帳に無い列は無視）:
+      date   : date_formats（省略時は REGISTER_DATE_FORMATS）の書式、合わなければ pd.to_datetime で日時にする
+      number : 全て整数で欠損が無ければ int64、それ以外は float64（pd.read_csv の推論と同じ）
+      bool   : TRUE / FALSE。欠損は False
+    変換できない値は欠損（bool は False）にし、列ごとの件数を返す（値の半分を超える場合は ValueError）。その他の列の型は pd.read_csv と
+    同じになるよう推論する（日付らしい文字列の列も文字列のまま）。列名は pd.read_csv と同じ（重複は 'X.1' 等）。
+    戻り値は (DataFrame, {列名: 変換できなかった値の件数})。
+    """
+    if pa_csv is None:
+        raise ValueError("型付きのCSV読み込みには pyarrow が必要です")
+    column_types = REGISTER_COLUMN_TYPES if column_types is None else column_types
+    date_formats = REGISTER_DATE_FORMATS if date_formats is None else date_formats
+    column_names = list(pd.read_csv(file_path, encoding='utf-8', nrows=0).columns)
+    typed = OrderedDict((col, kind) for col, kind in column_types.items() if col in column_names)
+    date_columns = [col for col, kind in typed.items() if kind == 'date']
+
+    read_options = pa_csv.ReadOptions(column_names=column_names, skip_rows=1)
+    def convert_options(date_type):
+        return pa_csv.ConvertOptions(
+            column_types={col: date_type for col in date_columns},
+            null_values=CSV_NULL_VALUES, strings_can_be_null=True, timestamp_parsers=[pa_csv.ISO8601] + list(date_formats),
+            true_values=REGISTER_TRUE_VALUES, false_values=REGISTER_FALSE_VALUES)
+
+    # 日付列は書式を指定して読み込み時に変換し、数値・bool 列は読み込み時の型推論に任せる。
+    # 書式に合わない日付があれば日付列を文字列で読み直し、_convert_date_strings で変換して件数を数える
+    invalid_counts = {}
+    try:
+        table = pa_csv.read_csv(file_path, read_options, convert_options=convert_options(pa.timestamp('us')))
+    except pa.ArrowInvalid:
+        table = pa_csv.read_csv(file_path, read_options, convert_options=convert_options(pa.string()))
+        for col in date_columns:
+            values = table.column(col)
+            converted, invalid_counts[col] = _convert_date_strings(values, date_formats)
+            _check_invalid_ratio(col, values, invalid_counts[col])
+            table = table.set_column(column_names.index(col), col, converted)
+
+    for col, kind in typed.items():
+        values = table.column(col)
+        if kind == 'number' and not (pa.types.is_integer(values.type) or pa.types.is_floating(values.type)):
+            # 数値以外の値があると文字列として読まれるため、値ごとに変換する（全て欠損の列は float64）
+            converted, invalid_counts[col] = _convert_number_strings(values.cast(pa.string()))
+            _check_invalid_ratio(col, values, invalid_counts[col])
+        elif kind == 'bool':
+            if not pa.types.is_boolean(values.type):
+                converted, invalid_counts[col] = _convert_bool_strings(values.cast(pa.string()))
+                _check_invalid_ratio(col, values, invalid_counts[col])
+                values = converted
+            converted = pa_compute.fill_null(values, False)
+        else:
+            continue
+        table = table.set_column(column_names.index(col), col, converted)
+
+    # 型推論で日付・時刻になったその他の列は、pd.read_csv と同じく元の文字列で読み直す
+    inferred_dates = [field.name for field in table.schema if field.name not in typed and pa.types.is_temporal(field.type)]
+    if inferred_dates:
+        strings = pa_csv.read_csv(file_path, read_options, convert_options=pa_csv.ConvertOptions(
+            column_types={col: pa.string() for col in inferred_dates}, include_columns=inferred_dates,
+            null_values=CSV_NULL_VALUES, strings_can_be_null=True))
+        for col in inferred_dates:
+            table = table.set_column(column_names.index(col), col, strings.column(col))
+
+    return table.to_pandas(), {col: count for col, count in invalid_counts.items() if count}
+
 # --- データ処理関数 ---
 def load_and_initial_process(file_path):
-    """最適化されたCSV読み込み"""
+    """台帳CSVの読み込み（pyarrow があれば read_register_csv で型付きで読み、無ければ pd.read_csv）
+
+    列名は読み込み時に重複しないよう区別されるため、ここでは重複列の削除はしない。
+    """
     try:
-        df = pd.read_csv(file_path, encoding='utf-8', low_memory=False)
+        if pa_csv is not None:
+            df, invalid_counts = read_register_csv(file_path)
+            print_invalid_counts(invalid_counts)
+        else:
+            df = pd.read_csv(file_path, encoding='utf-8', low_memory=False)
     except Exception as e:
         print(f"CSV読み込みエラー: {e}")
         return pd.DataFrame()
     
     if df.empty: 
         return pd.DataFrame()
-    
-    # 重複列の削除
-    df = df.loc[:, ~df.columns.duplicated(keep='first')]
     return df
 
-def process_dataframe_with_progress(df_original, start_date_input_val, end_date_input_val, progress_callback=None):
-    """進捗表示付きデータ処理（改善版）"""
-    if df_original.empty:
-        return pd.DataFrame()
-    
-    def update_progress(step, total_steps, message):
+PREPARATION_STEP_COUNT = 8
+PERIOD_STEP_COUNT = len(COST_STAGES) + len(DEPRECIATION_STAGES) + 3
+FINALIZE_STEP_COUNT = 3
+
+OUTPUT_COLUMN_ORDER = [
+    '期首日(計算基準日)', '期末日(計算基準日)', '在庫id', 'パーツid', 'パーツ名', '耐用年数',
+    'サプライヤー名', '取得原価', '資産分類', '会計ステータス', '入庫検品完了日',
+    '供与開始日(初回出荷日)', '減損損失日', '除売却日', '破損紛失分類', '売却案件名',
+    '貸手リース開始日', '貸手リース案件名', 'リース再取得日', '月次償却額',
+    '期首取得原価', '期首減価償却累計額', '期首減損損失累計額', '期首簿価',
+    '増加取得原価', '増加減価償却累計額', '増加減損損失累計額', '増加簿価',
+    '減少取得原価', '減少減価償却累計額', '減少減損損失累計額', '減少簿価',
+    '期中減価償却費', '期中減損損失',
+    '期末取得原価', '期末減価償却累計額', '期末減損損失累計額', '期末簿価'
+]
+
+def _make_progress_reporter(progress_callback, total_steps, instrumentation=None):
+    """ステップ単位で進捗を通知する関数 report(message, rows) を返す（呼ぶたびに次のステップへ進む）
+
+    rows はそのステップ開始時点の行数。instrumentation（StageInstrumentation）を渡すと
+    ステップの区切りごとに計測イベントを記録する。
+    """
+    state = {'step': 0}
+    def report(message, rows=None):
+        percent = int((min(state['step'], total_steps) / total_steps) * 100)
         if progress_callback:
-            progress = int((step / total_steps) * 100)
-            progress_callback(progress, message)
-    
-    total_steps = 30
-    current_step = 0
-    
-    try:
-        update_progress(current_step, total_steps, "データを初期化中...")
+            progress_callback(percent, message)
+        if instrumentation is not None:
+            instrumentation.stage_started(message, rows, percent)
+        state['step'] += 1
+    return report
+
+def _no_progress(message, rows=None):
+    pass
+
+# --- 計測（ステップごとの処理時間・メモリ） ---
+class StageInstrumentation:
+    """計算ステップごとに1件の計測イベント（dict）を sinks に送る
+
+    イベントの項目:
+      stage: ステップ名（進捗メッセージ）、step: 通し番号、percent: 開始時点の進捗率
+      rows_in / rows_out: ステップ開始時・終了時の行数
+      wall_seconds / cpu_seconds: 経過時間・CPU時間（プロセス全体）
+      memory_delta_bytes: tracemalloc で追跡したメモリ（numpy 配列を含む）の増減（trace_memory=True の場合のみ）
+    sinks は イベントを受け取る関数（JsonLinesSink, MemorySink, callback_sink など）。
+    tracemalloc は行単位の処理（日付の書式設定等）を数倍遅くするため、メモリの追跡は既定では行わない。
+    """
+    def __init__(self, *sinks, trace_memory=False):
+        self.sinks = sinks
+        self.trace_memory = trace_memory
+        self._current = None
+        self._step = 0
+        self._started_tracing = False
+
+    def stage_started(self, message, rows=None, percent=None):
+        self._close(rows)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._current = {
+            'stage': message, 'step': self._step, 'percent': percent, 'rows_in': rows,
+            '_wall': time.perf_counter(), '_cpu': time.process_time(),
+            '_memory': tracemalloc.get_traced_memory()[0] if self.trace_memory else None,
+        }
+        self._step += 1
+
+    def finish(self, rows=None):
+        """最後のステップを閉じる（処理の終了時に呼ぶ）"""
+        self._close(rows)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _close(self, rows_out):
+        if self._current is None:
+            return
+        current, self._current = self._current, None
+        event = {key: value for key, value in current.items() if not key.startswith('_')}
+        event['rows_out'] = rows_out
+        event['wall_seconds'] = time.perf_counter() - current['_wall']
+        event['cpu_seconds'] = time.process_time() - current['_cpu']
+        event['memory_delta_bytes'] = (
+            tracemalloc.get_traced_memory()[0] - current['_memory'] if current['_memory'] is not None else None)
+        for sink in self.sinks:
+            sink(event)
+
+class JsonLinesSink:
+    """計測イベントを JSON Lines 形式でファイルに追記する"""
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def __call__(self, event):
+        with open(self.file_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+class MemorySink:
+    """計測イベントをリスト（events）に集める"""
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+def callback_sink(progress_callback):
+    """計測イベントを既存の progress_callback(percent, message) の形式で通知するシンク"""
+    def sink(event):
+        progress_callback(event['percent'], f"{event['stage']} 完了: {event['wall_seconds']:.2f}秒 (CPU {event['cpu_seconds']:.2f}秒)")
+    return sink
+
+def prepare_register(df_original, engine=DEFAULT_ENGINE, report=_no_progress, contract_patterns=None):
+    """期間に依存しない前処理（日付正規化・初回出荷日・資産分類・リース再取得日）
+
+    戻り値は (前処理済みDataFrame, 実際に使用する計算エンジン)。
+    """
+    report("データを初期化中...", len(df_original))
+    if df_original.columns.duplicated().any():
+        df_to_process = df_original.loc[:, ~df_original.columns.duplicated(keep='first')].copy()
+    else:
         df_to_process = df_original.copy()
-        df_to_process = df_to_process.loc[:, ~df_to_process.columns.duplicated(keep='first')]
-        start_date_dt = pd.to_datetime(start_date_input_val)
-        end_date_dt = pd.to_datetime(end_date_input_val)
-        df_to_process['期首日(計算基準日)'] = start_date_dt
-        df_to_process['期末日(計算基準日)'] = end_date_dt
-        current_step += 1
-
-        update_progress(current_step, total_steps, "サンプル列を処理中...")
-        if SAMPLE_COLUMN_NAME in df_to_process.columns:
-            df_to_process[SAMPLE_COLUMN_NAME] = df_to_process[SAMPLE_COLUMN_NAME].apply(lambda x: True if isinstance(x, str) and x.strip().upper() == 'TRUE' else (True if x is True else False))
-        else: 
-            df_to_process[SAMPLE_COLUMN_NAME] = False
-        current_step += 1
-
-        update_progress(current_step, total_steps, "日付データを正規化中...")
-        date_cols_to_normalize_early = [DISPLAY_NAME_FIRST_SHIPPED_AT, LEASE_FIRST_SHIPPED_AT_COL]
-        for col in date_cols_to_normalize_early:
-            if col in df_to_process.columns: 
-                df_to_process[col] = pd.to_datetime(df_to_process[col], errors='coerce').dt.normalize()
-            else: 
-                df_to_process[col] = pd.NaT
-        current_step += 1
-
-        update_progress(current_step, total_steps, "初回出荷日を計算中...")
-        df_to_process[FIRST_SHIPPED_AT_CALCULATED_COL] = df_to_process.apply(calculate_first_shipped_at_calculated, axis=1)
-        df_to_process[FIRST_SHIPPED_AT_CALCULATED_COL] = pd.to_datetime(df_to_process[FIRST_SHIPPED_AT_CALCULATED_COL], errors='coerce').dt.normalize()
-        df_to_process[DISPLAY_NAME_FIRST_SHIPPED_AT] = df_to_process[FIRST_SHIPPED_AT_CALCULATED_COL]
-        current_step += 1
-
-        update_progress(current_step, total_steps, "その他の日付列を正規化中...")
-        date_cols_to_normalize_later = [INSPECTED_AT_COL, IMPOSSIBLED_AT_COL, IMPAIRMENT_DATE_COL]
-        for col in date_cols_to_normalize_later:
-            if col in df_to_process.columns: 
-                df_to_process[col] = pd.to_datetime(df_to_process[col], errors='coerce').dt.normalize()
-            elif col == IMPAIRMENT_DATE_COL: 
-                df_to_process[col] = pd.NaT
-        current_step += 1
-
-        update_progress(current_step, total_steps, "資産分類を決定中...")
-        if SUPPLIER_COLUMN_NAME in df_to_process.columns or SAMPLE_COLUMN_NAME in df_to_process.columns:
-            df_to_process[ASSET_CLASSIFICATION_COLUMN_NAME] = df_to_process.apply(classify_asset, axis=1)
-        else:
-            df_to_process[ASSET_CLASSIFICATION_COLUMN_NAME] = "賃貸用固定資産"
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "リース再取得日を計算中...")
-        if SUPPLIER_COLUMN_NAME in df_to_process.columns:
-            df_to_process[LEASE_REACQUISITION_DATE_COL] = df_to_process[SUPPLIER_COLUMN_NAME].apply(calculate_lease_reacquisition_date)
-            df_to_process[LEASE_REACQUISITION_DATE_COL] = pd.to_datetime(df_to_process[LEASE_REACQUISITION_DATE_COL], errors='coerce').dt.normalize()
-        else: 
-            df_to_process[LEASE_REACQUISITION_DATE_COL] = pd.NaT
-        current_step += 1
-
-        update_progress(current_step, total_steps, "会計ステータスを決定中...")
-        if ASSET_CLASSIFICATION_COLUMN_NAME in df_to_process.columns:
-            df_to_process[ACCOUNTING_STATUS_COLUMN_NAME] = df_to_process.apply(determine_accounting_status, args=(end_date_dt,), axis=1)
-        else:
-            df_to_process[ACCOUNTING_STATUS_COLUMN_NAME] = "計算エラー"
-        current_step += 1
+    if engine == ENGINE_VECTORIZED and not supports_vectorized_engine(df_to_process):
+        engine = ENGINE_ROWWISE
+    use_vectorized = engine == ENGINE_VECTORIZED
 
-        update_progress(current_step, total_steps, "取得原価を計算中...")
-        df_to_process[ACQUISITION_COST_KISHU_COL] = df_to_process.apply(calculate_initial_cost, args=(start_date_dt,), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "増加取得原価を計算中...")
-        df_to_process[ACQUISITION_COST_INCREASE_COL] = df_to_process.apply(calculate_acquisition_cost_increase, args=(start_date_dt, end_date_dt), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "減少取得原価を計算中...")
-        df_to_process[ACQUISITION_COST_DECREASE_COL] = df_to_process.apply(calculate_acquisition_cost_decrease, args=(start_date_dt, end_date_dt), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "期末取得原価を計算中...")
-        df_to_process[ACQUISITION_COST_KIMATSU_COL] = df_to_process.apply(calculate_acquisition_cost_kimatsu, args=(end_date_dt,), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "償却αを計算中...")
-        df_to_process[SHOKYAKU_ALPHA_COL] = df_to_process.apply(calculate_shokyaku_alpha, args=(start_date_dt,), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "償却βを計算中...")
-        df_to_process[SHOKYAKU_BETA_COL] = df_to_process.apply(calculate_shokyaku_beta, args=(end_date_dt,), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "償却γを計算中...")
-        df_to_process[SHOKYAKU_GAMMA_COL] = df_to_process.apply(calculate_shokyaku_gamma, axis=1)
-        current_step += 1
+    report("サンプル列を処理中...", len(df_to_process))
+    if SAMPLE_COLUMN_NAME in df_to_process.columns and df_to_process[SAMPLE_COLUMN_NAME].dtype == bool:
+        pass  # read_register_csv で読み込み時に bool になっている
+    elif SAMPLE_COLUMN_NAME in df_to_process.columns:
+        df_to_process[SAMPLE_COLUMN_NAME] = df_to_process[SAMPLE_COLUMN_NAME].apply(lambda x: True if isinstance(x, str) and x.strip().upper() == 'TRUE' else (True if x is True else False))
+    else:
+        df_to_process[SAMPLE_COLUMN_NAME] = False
+
+    report("サプライヤー情報を解決中...", len(df_to_process))
+    suppliers = resolve_suppliers(df_to_process, contract_patterns)
+    df_to_process[EXCLUDED_SUPPLIER_COL] = _supplier_values(df_to_process, SUPPLIER_TABLE_EXCLUDED_COL, suppliers)
 
-        update_progress(current_step, total_steps, "数値列を変換中...")
-        if MONTHLY_DEPRECIATION_COL in df_to_process.columns:
-            df_to_process[MONTHLY_DEPRECIATION_COL] = pd.to_numeric(df_to_process[MONTHLY_DEPRECIATION_COL], errors='coerce').fillna(0)
+    report("日付データを正規化中...", len(df_to_process))
+    date_cols_to_normalize_early = [DISPLAY_NAME_FIRST_SHIPPED_AT, LEASE_FIRST_SHIPPED_AT_COL]
+    for col in date_cols_to_normalize_early:
+        if col in df_to_process.columns:
+            df_to_process[col] = pd.to_datetime(df_to_process[col], errors='coerce').dt.normalize()
         else:
-            df_to_process[MONTHLY_DEPRECIATION_COL] = 0
-        if '耐用年数' in df_to_process.columns: 
-            df_to_process['耐用年数'] = pd.to_numeric(df_to_process['耐用年数'], errors='coerce').fillna(0)
-        else: 
-            df_to_process['耐用年数'] = 0
-        if COST_COLUMN_NAME in df_to_process.columns: 
-            df_to_process[COST_COLUMN_NAME] = pd.to_numeric(df_to_process[COST_COLUMN_NAME], errors='coerce').fillna(0)
-        else: 
-            df_to_process[COST_COLUMN_NAME] = 0
-        current_step += 1
-
-        update_progress(current_step, total_steps, "期首償却月数を計算中...")
-        df_to_process[AMORTIZATION_MONTHS_KISHU_COL] = df_to_process.apply(calculate_amortization_months_kishu, args=(start_date_dt,), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "償却償却月数を計算中...")
-        df_to_process[AMORTIZATION_MONTHS_SHOKYAKU_COL] = df_to_process.apply(calculate_amortization_months_shokyaku, args=(start_date_dt, end_date_dt,), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "増加償却月数を計算中...")
-        df_to_process[AMORTIZATION_MONTHS_INCREASE_COL] = df_to_process.apply(calculate_amortization_months_increase, args=(start_date_dt, end_date_dt,), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "減少償却月数を計算中...")
-        df_to_process[AMORTIZATION_MONTHS_DECREASE_COL] = df_to_process.apply(calculate_amortization_months_decrease, args=(start_date_dt, end_date_dt,), axis=1)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "期末償却月数を計算中...")
-        df_to_process[AMORTIZATION_MONTHS_KIMATSU_COL] = df_to_process.apply(calculate_shokyaku_months_kimatsu, args=(end_date_dt,), axis=1)
-        current_step += 1
+            df_to_process[col] = pd.NaT
 
-        update_progress(current_step, total_steps, "期首減価償却累計額を計算中...")
-        df_to_process[ACCUMULATED_DEPRECIATION_KISHU_COL] = df_to_process.apply(calculate_accumulated_depreciation_kishu, args=(start_date_dt,), axis=1).round(0)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "増加減価償却累計額を計算中...")
-        df_to_process[ACCUMULATED_DEPRECIATION_INCREASE_COL] = df_to_process.apply(calculate_accumulated_depreciation_increase, axis=1).round(0)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "減少減価償却累計額を計算中...")
-        df_to_process[ACCUMULATED_DEPRECIATION_DECREASE_COL] = df_to_process.apply(calculate_accumulated_depreciation_decrease, axis=1).round(0)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "期中減価償却費を計算中...")
-        df_to_process[INTERIM_DEPRECIATION_EXPENSE_COL] = df_to_process.apply(calculate_interim_depreciation_expense, axis=1).round(0)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "期末減価償却累計額を計算中...")
-        df_to_process[ACCUMULATED_DEPRECIATION_KIMATSU_COL] = df_to_process.apply(calculate_accumulated_depreciation_kimatsu, args=(end_date_dt,), axis=1).round(0)
-        current_step += 1
+    report("初回出荷日を計算中...", len(df_to_process))
+    if use_vectorized:
+        df_to_process[FIRST_SHIPPED_AT_CALCULATED_COL] = calculate_first_shipped_at_calculated_vectorized(df_to_process, suppliers)
+    else:
+        df_to_process[FIRST_SHIPPED_AT_CALCULATED_COL] = df_to_process.apply(calculate_first_shipped_at_calculated, args=(contract_patterns,), axis=1)
+    df_to_process[FIRST_SHIPPED_AT_CALCULATED_COL] = pd.to_datetime(df_to_process[FIRST_SHIPPED_AT_CALCULATED_COL], errors='coerce').dt.normalize()
+    df_to_process[DISPLAY_NAME_FIRST_SHIPPED_AT] = df_to_process[FIRST_SHIPPED_AT_CALCULATED_COL]
 
-        update_progress(current_step, total_steps, "期首減損損失累計額を計算中...")
-        df_to_process[IMPAIRMENT_LOSS_ACCUMULATED_KISHU_COL] = df_to_process.apply(calculate_new_impairment_loss_kishu, args=(start_date_dt,), axis=1).round(0)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "増加減損損失累計額を計算中...")
-        df_to_process[IMPAIRMENT_LOSS_ACCUMULATED_INCREASE_COL] = df_to_process.apply(calculate_new_impairment_loss_increase, args=(start_date_dt, end_date_dt,), axis=1).round(0)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "減少減損損失累計額を計算中...")
-        df_to_process[IMPAIRMENT_LOSS_ACCUMULATED_DECREASE_COL] = df_to_process.apply(calculate_new_impairment_loss_decrease, args=(end_date_dt,), axis=1).round(0)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "期末減損損失累計額を計算中...")
-        df_to_process[IMPAIRMENT_LOSS_ACCUMULATED_KIMATSU_COL] = df_to_process.apply(calculate_new_impairment_loss_kimatsu, args=(end_date_dt,), axis=1).round(0)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "期中減損損失を計算中...")
-        df_to_process[INTERIM_IMPAIRMENT_LOSS_COL] = df_to_process.apply(calculate_new_interim_impairment_loss, args=(start_date_dt, end_date_dt,), axis=1).round(0)
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "簿価を計算中...")
-        df_to_process[OPENING_BOOK_VALUE_COL] = df_to_process.apply(calculate_opening_book_value, axis=1).round(0)
-        df_to_process[INCREASE_BOOK_VALUE_COL] = df_to_process.apply(calculate_increase_book_value, axis=1).round(0)
-        df_to_process[DECREASE_BOOK_VALUE_COL] = df_to_process.apply(calculate_decrease_book_value, axis=1).round(0)
-        df_to_process[CLOSING_BOOK_VALUE_COL] = df_to_process.apply(calculate_closing_book_value, axis=1).round(0)
-        current_step += 1
-
-        update_progress(current_step, total_steps, "カラム順序を整理中...")
-        # 重複列の削除
+    report("その他の日付列を正規化中...", len(df_to_process))
+    date_cols_to_normalize_later = [INSPECTED_AT_COL, IMPOSSIBLED_AT_COL, IMPAIRMENT_DATE_COL]
+    for col in date_cols_to_normalize_later:
+        if col in df_to_process.columns:
+            df_to_process[col] = pd.to_datetime(df_to_process[col], errors='coerce').dt.normalize()
+        elif col == IMPAIRMENT_DATE_COL:
+            df_to_process[col] = pd.NaT
+
+    report("資産分類を決定中...", len(df_to_process))
+    if use_vectorized:
+        df_to_process[ASSET_CLASSIFICATION_COLUMN_NAME] = classify_asset_vectorized(df_to_process, suppliers)
+    elif SUPPLIER_COLUMN_NAME in df_to_process.columns or SAMPLE_COLUMN_NAME in df_to_process.columns:
+        df_to_process[ASSET_CLASSIFICATION_COLUMN_NAME] = df_to_process.apply(classify_asset, axis=1)
+    else:
+        df_to_process[ASSET_CLASSIFICATION_COLUMN_NAME] = "賃貸用固定資産"
+
+    report("リース再取得日を計算中...", len(df_to_process))
+    if use_vectorized:
+        df_to_process[LEASE_REACQUISITION_DATE_COL] = calculate_lease_reacquisition_date_vectorized(df_to_process, suppliers)
+    elif SUPPLIER_COLUMN_NAME in df_to_process.columns:
+        df_to_process[LEASE_REACQUISITION_DATE_COL] = df_to_process[SUPPLIER_COLUMN_NAME].apply(calculate_lease_reacquisition_date, args=(contract_patterns,))
+        df_to_process[LEASE_REACQUISITION_DATE_COL] = pd.to_datetime(df_to_process[LEASE_REACQUISITION_DATE_COL], errors='coerce').dt.normalize()
+    else:
+        df_to_process[LEASE_REACQUISITION_DATE_COL] = pd.NaT
+
+    if use_vectorized:
+        compact_working_frame(df_to_process, CATEGORY_COLS)
+    return df_to_process, engine
+
+def calculate_period(df_prepared, start_date_input_val, end_date_input_val, engine=DEFAULT_ENGINE, report=_no_progress):
+    """前処理済みデータに対して、指定期間の会計ステータス・取得原価・償却・減損・簿価を計算する
+
+    df_prepared は変更しない（期間ごとに列を追加した浅いコピーを返す）。
+    """
+    use_vectorized = engine == ENGINE_VECTORIZED
+    df_to_process = df_prepared.copy(deep=False)
+    start_date_dt = pd.to_datetime(start_date_input_val)
+    end_date_dt = pd.to_datetime(end_date_input_val)
+    df_to_process['期首日(計算基準日)'] = start_date_dt
+    df_to_process['期末日(計算基準日)'] = end_date_dt
+
+    report("会計ステータスを決定中...", len(df_to_process))
+    if use_vectorized:
+        df_to_process[ACCOUNTING_STATUS_COLUMN_NAME] = determine_accounting_status_vectorized(df_to_process, end_date_dt)
+    elif ASSET_CLASSIFICATION_COLUMN_NAME in df_to_process.columns:
+        df_to_process[ACCOUNTING_STATUS_COLUMN_NAME] = df_to_process.apply(determine_accounting_status, args=(end_date_dt,), axis=1)
+    else:
+        df_to_process[ACCOUNTING_STATUS_COLUMN_NAME] = "計算エラー"
+
+    for stage in COST_STAGES:
+        report(stage[0], len(df_to_process))
+        run_calculation_stage(df_to_process, stage, start_date_dt, end_date_dt, engine)
+    if use_vectorized:
+        # 行単位版は numpy の小さい整数型のまま掛け算するとあふれるため、ベクトル化版のみ
+        compact_working_frame(df_to_process, [ACCOUNTING_STATUS_COLUMN_NAME] + MONTH_COUNT_COLS)
+
+    report("数値列を変換中...", len(df_to_process))
+    if MONTHLY_DEPRECIATION_COL in df_to_process.columns:
+        df_to_process[MONTHLY_DEPRECIATION_COL] = pd.to_numeric(df_to_process[MONTHLY_DEPRECIATION_COL], errors='coerce').fillna(0)
+    else:
+        df_to_process[MONTHLY_DEPRECIATION_COL] = 0
+    if '耐用年数' in df_to_process.columns:
+        df_to_process['耐用年数'] = pd.to_numeric(df_to_process['耐用年数'], errors='coerce').fillna(0)
+    else:
+        df_to_process['耐用年数'] = 0
+    if COST_COLUMN_NAME in df_to_process.columns:
+        df_to_process[COST_COLUMN_NAME] = pd.to_numeric(df_to_process[COST_COLUMN_NAME], errors='coerce').fillna(0)
+    else:
+        df_to_process[COST_COLUMN_NAME] = 0
+
+    for stage in DEPRECIATION_STAGES:
+        report(stage[0], len(df_to_process))
+        run_calculation_stage(df_to_process, stage, start_date_dt, end_date_dt, engine)
+    if use_vectorized:
+        compact_working_frame(df_to_process, MONTH_COUNT_COLS)
+
+    report("簿価を計算中...", len(df_to_process))
+    for column, rowwise_func, vectorized_func in BOOK_VALUE_STAGES:
+        result = vectorized_func(df_to_process) if use_vectorized else df_to_process.apply(rowwise_func, axis=1)
+        df_to_process[column] = result.round(0)
+
+    return df_to_process
+
+OUTPUT_DATE_COLUMNS = [
+    '期首日(計算基準日)', '期末日(計算基準日)', INSPECTED_AT_COL, IMPOSSIBLED_AT_COL,
+    LEASE_FIRST_SHIPPED_AT_COL, IMPAIRMENT_DATE_COL, LEASE_REACQUISITION_DATE_COL,
+    DISPLAY_NAME_FIRST_SHIPPED_AT
+]
+# numpy の日付文字列（YYYY-MM-DD）が strftime('%Y') と同じ4桁になる範囲
+_FORMATTABLE_DATE_RANGE = (np.datetime64('1000-01-01'), np.datetime64('9999-12-31'))
+
+def format_date_column(series):
+    """日付列を 'YYYY/MM/DD' の文字列（欠損は空文字）にする
+
+    datetime64 の列は numpy でまとめて文字列化する。それ以外の列（日付と文字列が混在する列など）や
+    4桁でない年を含む列は、従来どおり1要素ずつ strftime する。
+    """
+    if series.dtype.kind == 'M' and getattr(series.dtype, 'tz', None) is None:
+        days = series.to_numpy().astype('datetime64[D]')
+        valid = ~np.isnat(days)
+        lower, upper = _FORMATTABLE_DATE_RANGE
+        if ((days[valid] >= lower) & (days[valid] <= upper)).all():
+            text = np.datetime_as_string(days, unit='D').astype('<U10')
+            chars = text.view('<U1').reshape(len(text), 10)
+            chars[:, [4, 7]] = '/'
+            return pd.Series(np.where(valid, text, ''), index=series.index, dtype=str)
+    return series.apply(lambda x: x.strftime('%Y/%m/%d') if isinstance(x, pd.Timestamp) and pd.notna(x) else ("" if pd.isna(x) else x))
+
+def format_output_dates(df):
+    """OUTPUT_DATE_COLUMNS のうちまだ datetime64 の列を文字列にした DataFrame を返す（df は変更しない）"""
+    columns = [col for col in OUTPUT_DATE_COLUMNS if col in df.columns and df[col].dtype.kind == 'M']
+    if not columns:
+        return df
+    return df.assign(**{col: format_date_column(df[col]) for col in columns})
+
+def finalize_output(df_to_process, report=_no_progress, format_dates=True):
+    """カラム順序の整理・中間列の削除・日付の書式設定
+
+    format_dates=False では日付列を datetime64 のまま返す（write_output が出力形式に合わせて変換する）。
+    """
+    report("カラム順序を整理中...", len(df_to_process))
+    # 重複列の削除（prepare_register を通らない DataFrame のため。重複が無ければコピーしない）
+    if df_to_process.columns.duplicated().any():
         df_to_process = df_to_process.loc[:, ~df_to_process.columns.duplicated(keep='first')]
-        if 'Unnamed: 14' in df_to_process.columns:
-            df_to_process.drop(columns=['Unnamed: 14'], inplace=True, errors='ignore')
-
-        # 指定されたカラム配置順序に変更
-        desired_column_order = [
-            '期首日(計算基準日)', '期末日(計算基準日)', '在庫id', 'パーツid', 'パーツ名', '耐用年数', 
-            'サプライヤー名', '取得原価', '資産分類', '会計ステータス', '入庫検品完了日', 
-            '供与開始日(初回出荷日)', '減損損失日', '除売却日', '破損紛失分類', '売却案件名',
-            '貸手リース開始日', '貸手リース案件名', 'リース再取得日', '月次償却額',
-            '期首取得原価', '期首減価償却累計額', '期首減損損失累計額', '期首簿価',
-            '増加取得原価', '増加減価償却累計額', '増加減損損失累計額', '増加簿価',
-            '減少取得原価', '減少減価償却累計額', '減少減損損失累計額', '減少簿価',
-            '期中減価償却費', '期中減損損失',
-            '期末取得原価', '期末減価償却累計額', '期末減損損失累計額', '期末簿価'
-        ]
-        
-        # 実際に存在するカラムのみを含む最終的なカラム順序を作成
-        final_column_order = []
-        for col in desired_column_order:
-            if col in df_to_process.columns:
-                final_column_order.append(col)
-        
-        # 指定されていないカラムがあれば末尾に追加
-        for col in df_to_process.columns:
-            if col not in final_column_order:
-                final_column_order.append(col)
-        
-        # カラム順序を適用
-        df_to_process = df_to_process[final_column_order]
-        
-        # 不要な列を削除
-        columns_to_drop_final = [
-            SAMPLE_COLUMN_NAME, SHOKYAKU_ALPHA_COL, SHOKYAKU_BETA_COL, SHOKYAKU_GAMMA_COL,
-            AMORTIZATION_MONTHS_KISHU_COL, AMORTIZATION_MONTHS_SHOKYAKU_COL,
-            AMORTIZATION_MONTHS_INCREASE_COL, AMORTIZATION_MONTHS_DECREASE_COL,
-            AMORTIZATION_MONTHS_KIMATSU_COL,
-            FIRST_SHIPPED_AT_CALCULATED_COL
-        ]
-        columns_to_drop_existing_final = [col for col in columns_to_drop_final if col in df_to_process.columns]
-        if columns_to_drop_existing_final:
-            df_to_process = df_to_process.drop(columns=columns_to_drop_existing_final, errors='ignore')
-        current_step += 1
-
-        update_progress(current_step, total_steps, "日付の書式を設定中...")
-        date_columns_to_format_output = [
-            '期首日(計算基準日)', '期末日(計算基準日)', INSPECTED_AT_COL, IMPOSSIBLED_AT_COL,
-            LEASE_FIRST_SHIPPED_AT_COL, IMPAIRMENT_DATE_COL, LEASE_REACQUISITION_DATE_COL,
-            DISPLAY_NAME_FIRST_SHIPPED_AT
-        ]
-        for col_name in date_columns_to_format_output:
+    if 'Unnamed: 14' in df_to_process.columns:
+        df_to_process = df_to_process.drop(columns=['Unnamed: 14'], errors='ignore')
+
+    # 実際に存在するカラムのみを含む最終的なカラム順序を作成
+    final_column_order = []
+    for col in OUTPUT_COLUMN_ORDER:
+        if col in df_to_process.columns:
+            final_column_order.append(col)
+
+    # 指定されていないカラムがあれば末尾に追加
+    for col in df_to_process.columns:
+        if col not in final_column_order:
+            final_column_order.append(col)
+
+    # カラム順序を適用
+    df_to_process = df_to_process[final_column_order]
+
+    # 不要な列を削除
+    columns_to_drop_final = [
+        SAMPLE_COLUMN_NAME, SHOKYAKU_ALPHA_COL, SHOKYAKU_BETA_COL, SHOKYAKU_GAMMA_COL,
+        AMORTIZATION_MONTHS_KISHU_COL, AMORTIZATION_MONTHS_SHOKYAKU_COL,
+        AMORTIZATION_MONTHS_INCREASE_COL, AMORTIZATION_MONTHS_DECREASE_COL,
+        AMORTIZATION_MONTHS_KIMATSU_COL,
+        FIRST_SHIPPED_AT_CALCULATED_COL, EXCLUDED_SUPPLIER_COL
+    ]
+    columns_to_drop_existing_final = [col for col in columns_to_drop_final if col in df_to_process.columns]
+    if columns_to_drop_existing_final:
+        df_to_process = df_to_process.drop(columns=columns_to_drop_existing_final, errors='ignore')
+
+    if format_dates:
+        report("日付の書式を設定中...", len(df_to_process))
+        for col_name in OUTPUT_DATE_COLUMNS:
             if col_name in df_to_process.columns:
-                df_to_process[col_name] = df_to_process[col_name].apply(lambda x: x.strftime('%Y/%m/%d') if isinstance(x, pd.Timestamp) and pd.notna(x) else ("" if pd.isna(x) else x))
-        current_step += 1
-        
-        update_progress(current_step, total_steps, "最終処理中...")
-        df_to_process = df_to_process.loc[:, ~df_to_process.columns.duplicated(keep='first')]
-        current_step += 1
-        
-        update_progress(total_steps, total_steps, "処理完了")
+                df_to_process[col_name] = format_date_column(df_to_process[col_name])
+
+    report("最終処理中...", len(df_to_process))
+    return df_to_process
+
+def process_dataframe_with_progress(df_original, start_date_input_val, end_date_input_val, progress_callback=None, engine=DEFAULT_ENGINE, contract_patterns=None, workers=1, instrumentation=None, format_dates=True):
+    """進捗表示付きデータ処理（改善版）
+
+    engine: 'vectorized'（既定、列単位のベクトル化計算）または 'rowwise'（従来の行単位 apply）。
+    ベクトル化版で扱えない入力（取得原価が数値列でない等）は自動的に行単位で計算する。
+    contract_patterns: リース契約パターン（省略時は DEFAULT_LEASE_CONTRACT_PATTERNS）。
+    workers: 1 以外（None はCPUコア数）を指定すると process_periods_parallel で複数プロセス計算する。
+    instrumentation: StageInstrumentation を渡すとステップごとの計測イベントを記録する（複数プロセス計算では記録しない）。
+    format_dates: False では日付列を文字列にせず datetime64 のまま返す（write_output で書き出す場合）。
+    """
+    if df_original.empty:
+        return pd.DataFrame()
+    if engine not in (ENGINE_VECTORIZED, ENGINE_ROWWISE):
+        raise ValueError(f"不明な計算エンジンです: {engine}")
+    if workers != 1:
+        return process_periods_parallel(df_original, [(start_date_input_val, end_date_input_val)], workers, progress_callback, engine, contract_patterns, format_dates)
+
+    total_steps = PREPARATION_STEP_COUNT + PERIOD_STEP_COUNT + FINALIZE_STEP_COUNT
+    report = _make_progress_reporter(progress_callback, total_steps, instrumentation)
+
+    try:
+        df_prepared, engine = prepare_register(df_original, engine, report, contract_patterns)
+        df_to_process = calculate_period(df_prepared, start_date_input_val, end_date_input_val, engine, report)
+        df_to_process = finalize_output(df_to_process, report, format_dates)
+        if instrumentation is not None:
+            instrumentation.finish(len(df_to_process))
+        if progress_callback:
+            progress_callback(100, "処理完了")
         return df_to_process
-        
+
     except Exception as e:
         print(f"処理エラー: {e}")
         return pd.DataFrame()
 
-class FixedAssetCalculatorGUI:
-    def __init__(self):
-        self.root = tk.Tk()
-        self.root.title("固定資産台帳 計算・出力アプリ (修正版)")
-        self.root.geometry("700x550")
-        
-        # 変数定義
-        self.csv_file_path = tk.StringVar(value='fixed_assets.csv')
-        self.start_date = tk.StringVar(value='2024-03-01')
-        self.end_date = tk.StringVar(value='2025-02-28')
-        self.processing = False
-        
-        self.setup_ui()
-        
-    def setup_ui(self):
-        # メインフレーム
-        main_frame = ttk.Frame(self.root, padding="20")
-        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
-        # タイトルラベル
-        title_label = ttk.Label(main_frame, text="固定資産台帳 計算・出力アプリ (修正版)", 
-                               font=('Arial', 16, 'bold'))
-        title_label.grid(row=0, column=0, columnspan=3, pady=20)
-        
-        # 改善情報表示
-        info_label = ttk.Label(main_frame, 
-                              text="✓ 安定性向上\n✓ 詳細な進捗表示\n✓ エラーハンドリング強化", 
-                              font=('Arial', 9), foreground="green")
-        info_label.grid(row=1, column=0, columnspan=3, pady=10)
-        
-        # CSVファイル選択
-        ttk.Label(main_frame, text="入力CSVファイル:").grid(row=2, column=0, sticky=tk.W, pady=10)
-        ttk.Entry(main_frame, textvariable=self.csv_file_path, width=40).grid(row=2, column=1, padx=10)
-        ttk.Button(main_frame, text="参照", command=self.browse_input_file).grid(row=2, column=2)
-        
-        # 期首日
-        ttk.Label(main_frame, text="期首日 (YYYY-MM-DD):").grid(row=3, column=0, sticky=tk.W, pady=10)
-        self.start_date_entry = ttk.Entry(main_frame, textvariable=self.start_date, width=20)
-        self.start_date_entry.grid(row=3, column=1, sticky=tk.W, padx=10)
-        
-        # 期末日
-        ttk.Label(main_frame, text="期末日 (YYYY-MM-DD):").grid(row=4, column=0, sticky=tk.W, pady=10)
-        self.end_date_entry = ttk.Entry(main_frame, textvariable=self.end_date, width=20)
-        self.end_date_entry.grid(row=4, column=1, sticky=tk.W, padx=10)
-        
-        # 処理ボタン
-        self.process_button = ttk.Button(main_frame, text="計算実行", 
-                                        command=self.process_data)
-        self.process_button.grid(row=5, column=0, columnspan=3, pady=30)
-        
-        # ステータスラベル
-        self.status_label = ttk.Label(main_frame, text="", foreground="blue")
-        self.status_label.grid(row=6, column=0, columnspan=3, pady=10)
-        
-        # 進捗率ラベル
-        self.progress_percent_label = ttk.Label(main_frame, text="", foreground="green", font=('Arial', 14, 'bold'))
-        self.progress_percent_label.grid(row=7, column=0, columnspan=3, pady=5)
-        
-        # プログレスバー
-        self.progress = ttk.Progressbar(main_frame, mode='determinate', maximum=100)
-        self.progress.grid(row=8, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
-        self.progress.grid_remove()
-        
-        # 処理時間表示ラベル
-        self.time_label = ttk.Label(main_frame, text="", foreground="gray")
-        self.time_label.grid(row=9, column=0, columnspan=3, pady=5)
-        
-        # パフォーマンス情報表示
-        self.perf_label = ttk.Label(main_frame, text="", foreground="purple", font=('Arial', 9))
-        self.perf_label.grid(row=10, column=0, columnspan=3, pady=5)
-        
-        # グリッドの重み設定
-        self.root.columnconfigure(0, weight=1)
-        self.root.rowconfigure(0, weight=1)
-        main_frame.columnconfigure(1, weight=1)
-        
-    def browse_input_file(self):
-        filename = filedialog.askopenfilename(
-            title="CSVファイルを選択",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
-        )
-        if filename:
-            self.csv_file_path.set(filename)
-            
-    def validate_inputs(self):
-        # ファイル存在確認
-        if not os.path.exists(self.csv_file_path.get()):
-            messagebox.showerror("エラー", f"ファイルが見つかりません: {self.csv_file_path.get()}")
-            return False
-            
-        # 日付妥当性確認
-        try:
-            start = pd.to_datetime(self.start_date.get())
-            end = pd.to_datetime(self.end_date.get())
-            if start >= end:
-                messagebox.showerror("エラー", "期首日は期末日より前の日付を設定してください")
-                return False
-        except:
-            messagebox.showerror("エラー", "日付の形式が正しくありません (YYYY-MM-DD)")
-            return False
-            
-        return True
-        
-    def process_data(self):
-        if self.processing:
-            return
-            
-        if not self.validate_inputs():
-            return
-            
-        self.processing = True
-        self.process_button.config(state='disabled')
-        self.progress.grid()
-        self.progress_percent_label.grid()
-        self.perf_label.grid()
-        self.start_time = time.time()
-        
-        # 処理開始情報表示
-        self.perf_label.config(text="処理を開始しています...")
-        
-        # 別スレッドで処理実行
-        thread = threading.Thread(target=self.run_processing)
-        thread.start()
-        
-    def progress_callback(self, percent, message):
-        """進捗率とメッセージを更新するコールバック関数"""
-        def update_ui():
-            self.progress['value'] = percent
-            self.status_label.config(text=message)
-            self.progress_percent_label.config(text=f"{percent}%")
-            
-            # 経過時間の表示
-            if hasattr(self, 'start_time'):
-                elapsed = time.time() - self.start_time
-                self.time_label.config(text=f"経過時間: {elapsed:.1f}秒")
-            
-        self.root.after(0, update_ui)
-        
-    def run_processing(self):
+    finally:
+        if instrumentation is not None:
+            instrumentation.finish()
+
+def process_periods(df_original, periods, progress_callback=None, engine=DEFAULT_ENGINE, contract_patterns=None, workers=1, instrumentation=None, format_dates=True):
+    """複数の (期首日, 期末日) をまとめて計算し、期間ごとの結果を縦に連結して返す
+
+    期間に依存しない前処理は1回だけ実行する。各期間の結果は
+    process_dataframe_with_progress を期間ごとに呼んだ場合と同一で、
+    (在庫id, 期首日(計算基準日), 期末日(計算基準日)) で一意になる。
+    workers: 1 以外（None はCPUコア数）を指定すると process_periods_parallel で複数プロセス計算する。
+    instrumentation, format_dates: process_dataframe_with_progress と同じ。
+    """
+    if df_original.empty or not periods:
+        return pd.DataFrame()
+    if engine not in (ENGINE_VECTORIZED, ENGINE_ROWWISE):
+        raise ValueError(f"不明な計算エンジンです: {engine}")
+    if workers != 1:
+        return process_periods_parallel(df_original, periods, workers, progress_callback, engine, contract_patterns, format_dates)
+
+    total_steps = PREPARATION_STEP_COUNT + (PERIOD_STEP_COUNT + FINALIZE_STEP_COUNT) * len(periods)
+    report = _make_progress_reporter(progress_callback, total_steps, instrumentation)
+
+    try:
+        df_prepared, engine = prepare_register(df_original, engine, report, contract_patterns)
+        df_processed = _calculate_periods(df_prepared, periods, engine, report, format_dates)
+        if instrumentation is not None:
+            instrumentation.finish(len(df_processed))
+        if progress_callback:
+            progress_callback(100, "処理完了")
+        return df_processed
+
+    except Exception as e:
+        print(f"処理エラー: {e}")
+        return pd.DataFrame()
+
+    finally:
+        if instrumentation is not None:
+            instrumentation.finish()
+
+def _calculate_periods(df_prepared, periods, engine, report, format_dates=True):
+    """前処理済みデータを期間ごとに計算・整形し、縦に連結する"""
+    period_results = []
+    for index, (start_date_input_val, end_date_input_val) in enumerate(periods, start=1):
+        def period_report(message, rows=None, index=index):
+            report(f"[{index}/{len(periods)}] {message}", rows)
+        df_period = calculate_period(df_prepared, start_date_input_val, end_date_input_val, engine, period_report)
+        period_results.append(finalize_output(df_period, period_report, format_dates))
+    return pd.concat(period_results, ignore_index=True)
+
+def process_prepared_periods(df_prepared, periods, progress_callback=None, engine=DEFAULT_ENGINE, workers=1, instrumentation=None, format_dates=True):
+    """prepare_register 済みのデータ（load_prepared_register の結果など）から複数期間を計算する
+
+    engine には prepare_register が返したエンジンを渡す。結果は process_periods と同一。
+    instrumentation, format_dates: process_dataframe_with_progress と同じ。
+    """
+    if df_prepared.empty or not periods:
+        return pd.DataFrame()
+    if engine not in (ENGINE_VECTORIZED, ENGINE_ROWWISE):
+        raise ValueError(f"不明な計算エンジンです: {engine}")
+    if workers != 1:
+        return _run_sharded(df_prepared, periods, workers, progress_callback, engine, None, format_dates, prepared=True)
+
+    report = _make_progress_reporter(progress_callback, (PERIOD_STEP_COUNT + FINALIZE_STEP_COUNT) * len(periods), instrumentation)
+    try:
+        df_processed = _calculate_periods(df_prepared, periods, engine, report, format_dates)
+        if instrumentation is not None:
+            instrumentation.finish(len(df_processed))
+        if progress_callback:
+            progress_callback(100, "処理完了")
+        return df_processed
+
+    except Exception as e:
+        print(f"処理エラー: {e}")
+        return pd.DataFrame()
+
+    finally:
+        if instrumentation is not None:
+            instrumentation.finish()
+
+# --- 並列計算（複数プロセス） ---
+MIN_ROWS_PER_SHARD = 20_000
+
+def _encode_frame(df):
+    """プロセス間で受け渡すDataFrameを Arrow IPC 形式にする（pyarrow が無い・変換できない場合はそのまま pickle）"""
+    if pa is None:
+        return df
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, TypeError, ValueError):
+        return df
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def _decode_frame(payload):
+    if isinstance(payload, pd.DataFrame):
+        return payload
+    return pa.ipc.open_stream(payload).read_all().to_pandas()
+
+def _process_shard(payload, periods, engine, contract_patterns, format_dates=True, prepared=False):
+    """ワーカープロセスで1シャード分の前処理〜全期間の計算〜出力整形を行う（prepared なら前処理済み）"""
+    df_prepared = _decode_frame(payload)
+    if not prepared:
+        df_prepared, engine = prepare_register(df_prepared, engine, contract_patterns=contract_patterns)
+    return [
+        _encode_frame(finalize_output(calculate_period(df_prepared, start_date_input_val, end_date_input_val, engine), format_dates=format_dates))
+        for start_date_input_val, end_date_input_val in periods
+    ]
+
+def process_periods_parallel(df_original, periods, workers=None, progress_callback=None, engine=DEFAULT_ENGINE, contract_patterns=None, format_dates=True):
+    """process_periods と同じ結果を、台帳を行の連続範囲（シャード）に分けて複数プロセスで計算する
+
+    在庫idごとの計算は互いに独立なため、シャードごとに前処理から出力整形までを行い、
+    期間ごとに元の行順で連結する。シャードは Arrow IPC 形式で受け渡す。
+    workers: プロセス数（省略時はCPUコア数）。1シャードが MIN_ROWS_PER_SHARD 行を
+    下回らないよう減らし、1 になる場合は process_periods で計算する。
+    """
+    if df_original.empty or not periods:
+        return pd.DataFrame()
+    if engine not in (ENGINE_VECTORIZED, ENGINE_ROWWISE):
+        raise ValueError(f"不明な計算エンジンです: {engine}")
+    return _run_sharded(df_original, periods, workers, progress_callback, engine, contract_patterns, format_dates)
+
+def _run_sharded(df_original, periods, workers, progress_callback, engine, contract_patterns, format_dates=True, prepared=False):
+    workers = min(workers or os.cpu_count() or 1, len(df_original) // MIN_ROWS_PER_SHARD)
+    if workers <= 1:
+        if prepared:
+            return process_prepared_periods(df_original, periods, progress_callback, engine, format_dates=format_dates)
+        return process_periods(df_original, periods, progress_callback, engine, contract_patterns, format_dates=format_dates)
+
+    try:
+        if progress_callback:
+            progress_callback(0, f"{workers}プロセスで計算中...")
+        bounds = np.linspace(0, len(df_original), workers + 1).astype(int)
+        shard_results = [None] * workers
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_process_shard, _encode_frame(df_original.iloc[lower:upper]), periods, engine, contract_patterns, format_dates, prepared): index
+                for index, (lower, upper) in enumerate(zip(bounds[:-1], bounds[1:]))
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                shard_results[futures[future]] = [_decode_frame(payload) for payload in future.result()]
+                if progress_callback:
+                    progress_callback(int(done / workers * 100), f"{workers}プロセスで計算中... ({done}/{workers})")
+
+        # 期間ごとに全シャードを元の行順で連結（process_periods と同じく期間ごとに全行が並ぶ）
+        period_results = [
+            pd.concat([shard[period_index] for shard in shard_results], ignore_index=True)
+            for period_index in range(len(periods))
+        ]
+        if progress_callback:
+            progress_callback(100, "処理完了")
+        return pd.concat(period_results, ignore_index=True)
+
+    except Exception as e:
+        print(f"処理エラー: {e}")
+        return pd.DataFrame()
+
+# --- 前処理済みデータのキャッシュ ---
+# 入力CSVの内容ハッシュをキーに prepare_register の結果を Arrow IPC ファイルとして保存し、
+# 同じCSVで期間だけ変えて再実行する場合に CSV 解析と日付変換を省略する。
+# prepare_register の出力（列・型・計算内容）を変えたら CACHE_SCHEMA_VERSION を上げること。
+# 2: 台帳CSVの型付き読み込み（read_register_csv）で日付の解釈が変わった（'20250301'・小数秒・'Z' 付き）
+CACHE_SCHEMA_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'book_value_register')
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+CACHE_FILE_SUFFIX = '.arrow'
+
+def file_content_hash(file_path, block_size=1024 * 1024):
+    """ファイル内容の SHA-256（16進）"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def register_cache_key(file_path, engine=DEFAULT_ENGINE, contract_patterns=None):
+    """キャッシュのキー（入力CSVの内容・キャッシュ形式・計算エンジン・リース契約パターンから決まる）"""
+    settings = json.dumps({
+        'schema_version': CACHE_SCHEMA_VERSION,
+        'engine': engine,
+        'contract_patterns': contract_patterns,
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    settings_hash = hashlib.sha256(settings.encode('utf-8')).hexdigest()[:16]
+    return f"{file_content_hash(file_path)}-{settings_hash}"
+
+def _read_cached_register(cache_path):
+    """キャッシュファイルを読み込み、(前処理済みDataFrame, 計算エンジン) を返す
+
+    to_pandas で列はコピーされるため、キャッシュで省略できるのは CSV 解析と日付変換だけ
+    （DataFrame のメモリ使用量は CSV から読んだ場合と変わらない）。
+    """
+    with pa.OSFile(cache_path, 'rb') as source:
+        table = pa.ipc.open_file(source).read_all()
+        engine = table.schema.metadata[b'engine'].decode('utf-8')
+        df_prepared = table.to_pandas()
+    os.utime(cache_path)  # 最終利用日時を更新（古いものから削除するため）
+    return df_prepared, engine
+
+def _write_cached_register(cache_path, df_prepared, engine):
+    """前処理済みDataFrameを一時ファイルに書いてから置き換える（書き込み途中のファイルを読まないため）"""
+    table = pa.Table.from_pandas(df_prepared, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'engine': engine.encode('utf-8')})
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with pa.OSFile(temp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temp_path, cache_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def evict_register_cache(cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES, keep=()):
+    """キャッシュの合計サイズが max_bytes 以下になるまで、最終利用日時の古いものから削除する"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith(CACHE_FILE_SUFFIX) and path not in keep:
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total_bytes = sum(size for _, size, _ in entries) + sum(os.path.getsize(path) for path in keep if os.path.exists(path))
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
         try:
-            # データ読み込み
-            self.update_status("CSVファイルを読み込み中...")
-            load_start = time.time()
-            df_original = load_and_initial_process(self.csv_file_path.get())
-            load_time = time.time() - load_start
-            
-            if df_original.empty:
-                self.show_error("CSVファイルが空か、データが読み取れませんでした")
-                return
-            
-            # メモリ使用量情報
+            os.remove(path)
+            total_bytes -= size
+        except OSError:
+            pass  # 他プロセスが使用中など
+
+def load_prepared_register(file_path, engine=DEFAULT_ENGINE, contract_patterns=None, report=_no_progress, cache_dir=None, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """CSVを読み込んで prepare_register を行う（cache_dir 指定時は前処理済みデータをキャッシュする）
+
+    同じ内容のCSV・同じ設定のキャッシュがあれば CSV の解析と前処理を省略する。
+    CSVの内容が変われば別のキーになるため、古いキャッシュは容量超過時に削除されるだけで使われない。
+    pyarrow が無い場合はキャッシュを使わない。
+    戻り値は (前処理済みDataFrame, 計算エンジン, キャッシュを使ったか)。CSVが空なら空のDataFrame。
+    """
+    use_cache = cache_dir is not None and pa is not None
+    cache_path = None
+    if use_cache:
+        report("キャッシュを確認中...")
+        cache_path = os.path.join(cache_dir, register_cache_key(file_path, engine, contract_patterns) + CACHE_FILE_SUFFIX)
+        if os.path.exists(cache_path):
             try:
-                memory_usage = df_original.memory_usage(deep=True).sum() / 1024 / 1024  # MB
-                self.update_perf_info(f"データ読み込み: {load_time:.2f}秒 | メモリ使用量: {memory_usage:.1f}MB")
-            except:
-                self.update_perf_info(f"データ読み込み: {load_time:.2f}秒")
-                
-            # データ処理
-            process_start = time.time()
-            start_date = pd.to_datetime(self.start_date.get())
-            end_date = pd.to_datetime(self.end_date.get())
-            df_processed = process_dataframe_with_progress(
-                df_original, start_date, end_date, self.progress_callback
-            )
-            process_time = time.time() - process_start
-            
-            if df_processed.empty:
-                self.show_error("処理結果が空です")
-                return
-                
-            # 出力ファイル保存
-            self.update_status("結果を保存中...")
-            output_filename = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
-                initialfile='fixed_asset_register_output.csv'
-            )
-            
-            if output_filename:
-                save_start = time.time()
-                df_processed.to_csv(output_filename, index=False, encoding='utf-8-sig')
-                save_time = time.time() - save_start
-                
-                total_time = time.time() - self.start_time
-                rows_per_second = len(df_processed) / total_time if total_time > 0 else 0
-                
-                self.show_success(
-                    f"処理が完了しました。\n\n" + 
-                    f"📊 処理統計:\n" +
-                    f"• 総処理時間: {total_time:.2f}秒\n" +
-                    f"• データ処理: {process_time:.2f}秒\n" +
-                    f"• ファイル保存: {save_time:.2f}秒\n" +
-                    f"• 処理行数: {len(df_processed):,}行\n" +
-                    f"• 処理速度: {rows_per_second:.0f}行/秒\n\n" +
-                    f"💾 保存先: {output_filename}"
-                )
+                df_prepared, cached_engine = _read_cached_register(cache_path)
+                return df_prepared, cached_engine, True
+            except Exception as e:
+                print(f"キャッシュ読み込みエラー（再計算します）: {e}")
+
+    report("CSVファイルを読み込み中...")
+    df_original = load_and_initial_process(file_path)
+    if df_original.empty:
+        return pd.DataFrame(), engine, False
+    df_prepared, engine = prepare_register(df_original, engine, report, contract_patterns)
+
+    if use_cache:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            _write_cached_register(cache_path, df_prepared, engine)
+            evict_register_cache(cache_dir, cache_max_bytes, keep=(cache_path,))
+        except Exception as e:
+            print(f"キャッシュ書き込みエラー: {e}")
+    return df_prepared, engine, False
+
+# --- 分割読み込み（大容量CSV向け） ---
+DEFAULT_CHUNK_SIZE = 100_000
+
+def _read_csv_chunks(file_path, chunk_size, read_dtypes=None, object_columns=()):
+    """CSVを chunk_size 行ずつ読み込む（read_dtypes / object_columns で列型を揃える）"""
+    for chunk in pd.read_csv(file_path, encoding='utf-8', chunksize=chunk_size, dtype=read_dtypes):
+        for col in object_columns:
+            chunk[col] = chunk[col].astype(object)
+        yield chunk
+
+def scan_csv_dtypes(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """分割読み込みでも一括読み込みと同じ列型になるよう、各チャンクの型推論結果から列型を決める
+
+    read_csv の型推論はチャンクごとに行われるため、そのままでは
+    「あるチャンクでは int、別のチャンクでは欠損を含むため float」のように
+    列型がぶれて出力の書式（100 と 100.0 など）が一括読み込みと変わってしまう。
+    戻り値は (read_csv に渡す dtype 指定, 読み込み後に object 型へ変換する列, チャンク数)。
+    """
+    observed_dtypes = {}     # 列 -> 欠損のみでないチャンクで推論された型
+    columns_with_empty_chunk = set()
+    columns = []
+    chunk_count = 0
+    for chunk in _read_csv_chunks(file_path, chunk_size):
+        chunk_count += 1
+        columns = chunk.columns
+        for col in chunk.columns:
+            if chunk[col].isna().all():
+                columns_with_empty_chunk.add(col)
             else:
-                self.show_info("保存がキャンセルされました")
-                
+                observed_dtypes.setdefault(col, set()).add(chunk[col].dtype)
+
+    read_dtypes, object_columns = {}, []
+    for col in columns:
+        dtypes = observed_dtypes.get(col, set())
+        if not dtypes or (len(dtypes) == 1 and col not in columns_with_empty_chunk):
+            continue
+        kinds = {dtype.kind for dtype in dtypes}
+        if kinds <= {'i', 'f'}:
+            # 整数と欠損・小数が混在 → 一括読み込みでは float
+            read_dtypes[col] = 'float64'
+        elif kinds == {'b'}:
+            # TRUE/FALSE と欠損が混在 → 一括読み込みでは True/False/NaN の object
+            object_columns.append(col)
+        else:
+            # 文字列と数値等が混在 → 一括読み込みでは元の文字列のまま
+            read_dtypes[col] = str
+    return read_dtypes, object_columns, chunk_count
+
+def process_csv_in_chunks(input_path, output_path, periods, chunk_size=DEFAULT_CHUNK_SIZE, progress_callback=None, engine=DEFAULT_ENGINE, contract_patterns=None):
+    """メモリに載り切らない台帳CSVを chunk_size 行ずつ計算し、出力CSVへ逐次追記する
+
+    各行の計算は他の行に依存しないため、チャンク単位で前処理〜期間計算〜出力整形を行う。
+    出力は load_and_initial_process + process_periods の結果を utf-8-sig で
+    書き出した場合と同一になるよう、次の3段階で処理する。
+      1. 全チャンクを読み、列型を一括読み込みと揃える指定を決める（scan_csv_dtypes）
+      2. 全チャンクを計算し、どこかのチャンクで小数になる出力列を調べる
+      3. もう一度計算し、2 の列を float に揃えてから追記する
+    計算は2回行うが、同時に保持するのは1チャンク分のみ。
+    戻り値は出力行数（エラー時は None）。
+    """
+    if engine not in (ENGINE_VECTORIZED, ENGINE_ROWWISE):
+        raise ValueError(f"不明な計算エンジンです: {engine}")
+    if not periods:
+        return 0
+
+    try:
+        if progress_callback:
+            progress_callback(0, "列型を確認中...")
+        read_dtypes, object_columns, chunk_count = scan_csv_dtypes(input_path, chunk_size)
+        if chunk_count == 0:
+            return 0
+        total_steps = chunk_count * len(periods) * 2
+
+        def calculated_chunks(step_offset, message, invalid_counts=None):
+            # 出力順を一括処理（期間ごとに全行）と揃えるため、期間ごとに入力を読み直す
+            step = step_offset
+            for period_index, (start_date_input_val, end_date_input_val) in enumerate(periods):
+                for chunk in _read_csv_chunks(input_path, chunk_size, read_dtypes, object_columns):
+                    if progress_callback:
+                        progress_callback(int(step / total_steps * 100), f"{message} ({step - step_offset + 1}/{total_steps // 2})")
+                    if pa_csv is not None:
+                        # 日付は一括読み込み（read_register_csv）と同じ規則で変換する
+                        chunk, chunk_invalid_counts = convert_register_dates(chunk)
+                        if invalid_counts is not None and period_index == 0:
+                            for col, count in chunk_invalid_counts.items():
+                                invalid_counts[col] = invalid_counts.get(col, 0) + count
+                    df_prepared, chunk_engine = prepare_register(chunk, engine, contract_patterns=contract_patterns)
+                    yield calculate_period(df_prepared, start_date_input_val, end_date_input_val, chunk_engine)
+                    step += 1
+
+        # 数値列の型は finalize_output（列の並べ替え・日付の書式設定）で変わらないため、ここでは整形を省く
+        float_columns = set()
+        invalid_counts = {}
+        for df_period in calculated_chunks(0, "出力列の型を確認中...", invalid_counts):
+            float_columns.update(col for col in df_period.columns if df_period[col].dtype.kind == 'f')
+        print_invalid_counts(invalid_counts)
+
+        row_count = 0
+        with open(output_path, 'w', encoding='utf-8-sig', newline='') as output_file:
+            for df_period in calculated_chunks(total_steps // 2, "計算結果を書き出し中..."):
+                df_chunk = finalize_output(df_period)
+                widen = {col: 'float64' for col in float_columns if col in df_chunk.columns and df_chunk[col].dtype.kind in 'iu'}
+                if widen:
+                    df_chunk = df_chunk.astype(widen)
+                df_chunk.to_csv(output_file, index=False, header=(row_count == 0))
+                row_count += len(df_chunk)
+        if progress_callback:
+            progress_callback(100, "処理完了")
+        return row_count
+
+    except Exception as e:
+        print(f"処理エラー: {e}")
+        return None
+
+# --- 差分再計算（変更された在庫のみ） ---
+PERIOD_KEY_COLS = ['期首日(計算基準日)', '期末日(計算基準日)']
+CALCULATION_NUMERIC_COLS = [COST_COLUMN_NAME, '耐用年数', MONTHLY_DEPRECIATION_COL]
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+def apply_input_changes(df_previous_input, df_changes):
+    """変更データ（在庫idをキーとした全列または一部の列）を前回の入力に反映する
+
+    既存の在庫idは変更データにある列だけを上書きし（元の行位置のまま）、新しい在庫idは末尾に追加する。
+    上書き前後の行ハッシュを比べ、値が変わらなかった行は変更なしとして扱う。
+    変更によって計算に使う数値列（CALCULATION_NUMERIC_COLS）の型が変わった場合は全件を変更ありとする。
+    戻り値は (反映後の入力, 内容が変わった・追加された在庫id)。
+    """
+    for df, label in ((df_previous_input, "前回の入力"), (df_changes, "変更データ")):
+        if STOCK_ID_COL not in df.columns:
+            raise ValueError(f"{label}に{STOCK_ID_COL}列がありません")
+        if df[STOCK_ID_COL].duplicated().any():
+            raise ValueError(f"{label}の{STOCK_ID_COL}が重複しています")
+    unknown_columns = [col for col in df_changes.columns if col not in df_previous_input.columns]
+    if unknown_columns:
+        raise ValueError(f"前回の入力に無い列があります: {', '.join(unknown_columns)}")
+
+    positions = pd.Index(df_previous_input[STOCK_ID_COL]).get_indexer(df_changes[STOCK_ID_COL])
+    is_existing = positions >= 0
+    existing_positions = positions[is_existing]
+
+    df_updated = df_previous_input.copy()
+    for col in df_changes.columns:
+        if col == STOCK_ID_COL:
+            continue
+        # 元の列と変更値を連結して共通の型にしてから差し替える（int 列に int を入れても float にしない）
+        combined = pd.concat([df_updated[col], df_changes[col][is_existing]], ignore_index=True)
+        column = combined.iloc[:len(df_updated)].copy()
+        column.iloc[existing_positions] = combined.iloc[len(df_updated):].to_numpy()
+        column.index = df_updated.index
+        df_updated[col] = column
+
+    # 型を揃えて（int → float など）から行ハッシュを比較する
+    before = df_previous_input.iloc[existing_positions].reset_index(drop=True)
+    after = df_updated.iloc[existing_positions].reset_index(drop=True)
+    try:
+        before = before.astype(after.dtypes.to_dict())
+    except (TypeError, ValueError):
+        pass
+    is_changed = _row_hashes(before) != _row_hashes(after)
+
+    df_added = df_changes[~is_existing]
+    if not df_added.empty:
+        df_updated = pd.concat([df_updated, df_added.reindex(columns=df_updated.columns)], ignore_index=True)
+    if any(col in df_updated.columns and df_updated[col].dtype != df_previous_input[col].dtype for col in CALCULATION_NUMERIC_COLS):
+        # 計算に使う数値列の型が変わる（int 列に小数や欠損が入る等）と、変更していない行の計算結果の型も変わるため全件を再計算する
+        return df_updated, df_updated[STOCK_ID_COL].to_numpy()
+    changed_ids = np.concatenate([after[STOCK_ID_COL].to_numpy()[is_changed], df_added[STOCK_ID_COL].to_numpy()])
+    return df_updated, changed_ids
+
+def read_changes_csv(file_path, df_previous_input):
+    """変更データCSVを読み込む（前回の入力で文字列の列は文字列のまま読み、'012' が 12 にならないようにする）
+
+    前回の入力で日付型の列（read_register_csv で読んだ日付列）は日付に変換し、変更のない行が変更ありにならないようにする。
+    """
+    columns = pd.read_csv(file_path, encoding='utf-8', nrows=0).columns
+    string_columns = {
+        col: str for col in columns
+        if col in df_previous_input.columns and df_previous_input[col].dtype.kind not in 'iufb'
+    }
+    df_changes = pd.read_csv(file_path, encoding='utf-8', dtype=string_columns, low_memory=False)
+    for col in df_changes.columns:
+        if col in df_previous_input.columns and df_previous_input[col].dtype.kind == 'M':
+            df_changes[col] = pd.to_datetime(df_changes[col], errors='coerce').astype(df_previous_input[col].dtype)
+    return df_changes
+
+def read_output_csv(file_path):
+    """出力CSVを文字列のまま読み込む（差し替えない行を書き出し時にそのまま再現するため）"""
+    return pd.read_csv(file_path, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+
+def _as_csv_text(series):
+    return series.astype(str).where(series.notna(), '')
+
+def splice_recomputed_rows(df_previous_output, df_recomputed):
+    """前回の出力（read_output_csv の結果）の (期首日, 期末日, 在庫id) が一致する行を再計算結果で差し替える
+
+    前回に無い在庫idの行は各期間の末尾に追加する（全件を再計算した場合と同じ並び）。
+    数値列は、差し替えない行が小数表記か再計算結果が小数であれば float に揃える
+    （全件再計算で列が float になる条件と同じ）。
+    """
+    key_cols = PERIOD_KEY_COLS + [STOCK_ID_COL]
+    if set(df_recomputed.columns) != set(df_previous_output.columns):
+        raise ValueError("前回の出力と再計算結果の列構成が異なります（入力の列が変わった場合は全件を再計算してください）")
+    df_recomputed = df_recomputed[df_previous_output.columns]
+
+    previous_keys = pd.MultiIndex.from_frame(df_previous_output[key_cols])
+    if previous_keys.duplicated().any():
+        raise ValueError("前回の出力で (期首日, 期末日, 在庫id) が重複しています")
+    recomputed_keys = pd.MultiIndex.from_frame(df_recomputed[key_cols].apply(_as_csv_text))
+    positions = previous_keys.get_indexer(recomputed_keys)
+    is_replaced = np.zeros(len(df_previous_output), dtype=bool)
+    is_replaced[positions[positions >= 0]] = True
+    df_kept = df_previous_output[~is_replaced]
+
+    df_recomputed = df_recomputed.copy()
+    for col in df_recomputed.columns:
+        if df_recomputed[col].dtype.kind not in 'iuf':
+            continue
+        kept_is_float = df_kept[col].str.contains(r'[.eE]|nan', regex=True).any()
+        if df_recomputed[col].dtype.kind == 'f' or kept_is_float:
+            df_kept = df_kept.assign(**{col: pd.to_numeric(df_kept[col], errors='coerce')})
+            df_recomputed[col] = df_recomputed[col].astype('float64')
+
+    # (期間の出現順, 期間内の位置) で並べる。差し替えた行は元の位置、追加行は期間の末尾
+    period_codes, period_texts = pd.MultiIndex.from_frame(df_previous_output[PERIOD_KEY_COLS]).factorize()
+    block_positions = df_previous_output.groupby(period_codes).cumcount().to_numpy()
+    block_sizes = np.bincount(period_codes, minlength=len(period_texts))
+    recomputed_codes = period_texts.get_indexer(recomputed_keys.droplevel(STOCK_ID_COL))
+    if (recomputed_codes < 0).any():
+        raise ValueError("前回の出力に無い期間の再計算結果があります")
+    is_new = positions < 0
+    new_offsets = pd.Series(is_new).groupby(recomputed_codes).cumsum().to_numpy() - 1
+    recomputed_positions = np.where(is_new, block_sizes[recomputed_codes] + new_offsets, block_positions[positions])
+    recomputed_blocks = np.where(is_new, recomputed_codes, period_codes[positions])
+
+    df_spliced = pd.concat([df_kept, df_recomputed], ignore_index=True)
+    order = np.lexsort((
+        np.concatenate([block_positions[~is_replaced], recomputed_positions]),
+        np.concatenate([period_codes[~is_replaced], recomputed_blocks]),
+    ))
+    return df_spliced.iloc[order].reset_index(drop=True)
+
+def process_incremental(df_previous_output, df_updated_input, changed_ids, progress_callback=None, engine=DEFAULT_ENGINE, contract_patterns=None):
+    """changed_ids の在庫だけを前回の出力と同じ期間で再計算し、前回の出力に差し込む
+
+    df_previous_output は read_output_csv で読んだ前回の出力、df_updated_input と changed_ids は
+    apply_input_changes の結果。変更が無ければ前回の出力をそのまま返す。
+    在庫の削除は扱わない（削除がある場合は全件を再計算する）。
+    """
+    if len(changed_ids) == 0:
+        return df_previous_output.copy()
+    period_texts = df_previous_output[PERIOD_KEY_COLS].drop_duplicates()
+    periods = [
+        (pd.to_datetime(start, format='%Y/%m/%d'), pd.to_datetime(end, format='%Y/%m/%d'))
+        for start, end in period_texts.itertuples(index=False)
+    ]
+    df_changed_input = df_updated_input[df_updated_input[STOCK_ID_COL].isin(changed_ids)]
+    df_recomputed = process_periods(df_changed_input, periods, progress_callback, engine, contract_patterns)
+    if df_recomputed.empty:
+        raise ValueError("変更された在庫の再計算に失敗しました")
+    return splice_recomputed_rows(df_previous_output, df_recomputed)
+
+# --- 出力 ---
+OUTPUT_FORMATS = ('csv', 'parquet', 'arrow', 'xlsx')
+OUTPUT_BLOCK_ROWS = 100_000
+# parquet / arrow 出力の分割キー（hive 形式の ディレクトリ名=値 で分割する）
+PARTITION_KEYS = OrderedDict([
+    ('period', PERIOD_KEY_COLS),
+    ('status', [ACCOUNTING_STATUS_COLUMN_NAME]),
+])
+
+def output_format_for(file_path):
+    """出力ファイルの拡張子から出力形式を決める（該当しなければ csv）"""
+    extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+    return extension if extension in OUTPUT_FORMATS else 'csv'
+
+def write_csv(df, file_path, block_rows=OUTPUT_BLOCK_ROWS):
+    """CSV を block_rows 行ずつ書き出す（日付の文字列化もブロックごとに行い、全行分の文字列を同時に持たない）"""
+    with open(file_path, 'w', encoding='utf-8-sig', newline='') as output_file:
+        for lower in range(0, max(len(df), 1), block_rows):
+            block = format_output_dates(df.iloc[lower:lower + block_rows])
+            block.to_csv(output_file, index=False, header=(lower == 0))
+
+def _output_arrow_table(df):
+    """日付列を date32（日単位）にした Arrow テーブル（category 列は dictionary 型のまま）"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for index, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            table = table.set_column(index, field.name, table.column(index).cast(pa.date32()))
+    return table
+
+def write_output(df, file_path, output_format='csv', partition_by=()):
+    """計算結果をファイルに書き出す
+
+    csv: Excel で文字化けしないよう utf-8-sig。日付は 'YYYY/MM/DD'（write_csv で逐次書き出す）。
+    xlsx: 日付は csv と同じ文字列。tools/streaming_xlsx で逐次書き出し、1シートの行数上限を超えたらシートを分ける
+      （金額列は桁区切り。export_to_excel.py 等の出力と同じ）。
+    parquet / arrow（Arrow IPC）: 日付は date32、会計ステータス等は dictionary 型のまま書き出すため、
+      読む側で文字列を解析し直す必要がない。partition_by に PARTITION_KEYS のキー（'period', 'status'）を
+      指定すると file_path をディレクトリとし、その値ごとのファイルに分割する。
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不明な出力形式です: {output_format}")
+    if partition_by and output_format not in ('parquet', 'arrow'):
+        raise ValueError("分割出力は parquet / arrow 形式でのみ使用できます")
+    unknown_keys = [key for key in partition_by if key not in PARTITION_KEYS]
+    if unknown_keys:
+        raise ValueError(f"不明な分割キーです: {', '.join(unknown_keys)}")
+    if output_format == 'csv':
+        write_csv(df, file_path)
+    elif output_format == 'xlsx':
+        blocks = (format_output_dates(df.iloc[start:start + OUTPUT_BLOCK_ROWS])
+                  for start in range(0, max(len(df), 1), OUTPUT_BLOCK_ROWS))
+        streaming_xlsx.write_excel_streaming(blocks, file_path, column_formats=streaming_xlsx.amount_column_formats(df.columns))
+    else:
+        if pa is None:
+            raise ValueError(f"{output_format} 形式の出力には pyarrow が必要です")
+        table = _output_arrow_table(df)
+        if partition_by:
+            partition_columns = [col for key in partition_by for col in PARTITION_KEYS[key] if col in table.column_names]
+            pa_dataset.write_dataset(
+                table, file_path, format='parquet' if output_format == 'parquet' else 'ipc',
+                partitioning=partition_columns, partitioning_flavor='hive',
+                existing_data_behavior='delete_matching')
+        elif output_format == 'parquet':
+            pa_parquet.write_table(table, file_path, row_group_size=OUTPUT_BLOCK_ROWS)
+        else:
+            with pa.OSFile(file_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=OUTPUT_BLOCK_ROWS)
+
+def monthly_periods(first_month, months=12):
+    """first_month を含む月から months か月分の (月初日, 月末日) を返す"""
+    first_day = pd.Timestamp(first_month).replace(day=1)
+    return fiscal_calendar.period_ranges(first_day - pd.Timedelta(days=1), months, range(1, 13))
+
+def quarterly_periods(fiscal_year_start, quarters=4):
+    """fiscal_year_start の月から3か月ごとの (四半期初日, 四半期末日) を返す"""
+    first_day = pd.Timestamp(fiscal_year_start).replace(day=1)
+    end_months = [(first_day.month + 3 * quarter + 1) % 12 + 1 for quarter in range(4)]
+    return fiscal_calendar.period_ranges(first_day - pd.Timedelta(days=1), quarters, end_months)
+
+def term_periods(as_of, terms=fiscal_calendar.DEFAULT_TERM_COUNT):
+    """as_of より後の term1〜termN の四半期 (期首日, 期末日)（ダッシュボードの各ターム末の簿価用）"""
+    return fiscal_calendar.period_ranges(as_of, terms)
+
+def parse_period(text):
+    """'YYYY-MM-DD:YYYY-MM-DD' 形式の期間指定を (期首日, 期末日) に変換する"""
+    start_text, separator, end_text = text.partition(':')
+    if not separator:
+        raise ValueError(f"期間は 期首日:期末日 の形式で指定してください: {text}")
+    start, end = pd.to_datetime(start_text), pd.to_datetime(end_text)
+    if start >= end:
+        raise ValueError(f"期首日は期末日より前の日付を設定してください: {text}")
+    return start, end
+
+def main(argv=None):
+    """コマンドラインからの一括計算（複数期間対応、GUI を使わない）
+
+    例: python python_book_value_logic.py --input fixed_assets.csv --period 2024-03-01:2025-02-28 --output result.parquet
+    """
+    parser = argparse.ArgumentParser(description="固定資産台帳の簿価を計算してCSVに出力します")
+    parser.add_argument('--input', required=True, help="入力CSVファイル")
+    parser.add_argument('--output', default='fixed_asset_register_output.csv', help="出力ファイル")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS,
+                        help="出力形式（省略時は --output の拡張子から判定、該当しなければ csv）")
+    parser.add_argument('--partition-by', nargs='+', choices=list(PARTITION_KEYS), default=[],
+                        help="parquet / arrow 出力を期間・会計ステータスごとのファイルに分割する（--output はディレクトリ）")
+    parser.add_argument('--quiet', action='store_true', help="進捗を表示しない（cron 等での定期実行向け）")
+    parser.add_argument('--trace-events', metavar='JSONL',
+                        help="ステップごとの処理時間・CPU時間を JSON Lines で追記する（単一プロセス計算時）")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="--trace-events にメモリ増減も記録する（tracemalloc を使うため処理が遅くなる）")
+    parser.add_argument('--period', action='append', default=[], metavar='期首日:期末日',
+                        help="計算期間（複数指定可）例: 2024-03-01:2025-02-28")
+    parser.add_argument('--monthly', metavar='YYYY-MM', help="指定月から12か月分の月次期間を計算")
+    parser.add_argument('--quarterly', metavar='YYYY-MM', help="指定月を期首とする4四半期を計算")
+    parser.add_argument('--terms', metavar='YYYY-MM-DD',
+                        help="基準日より後の term1〜term4 の四半期を計算（ダッシュボードの各ターム末の簿価）")
+    parser.add_argument('--engine', choices=[ENGINE_VECTORIZED, ENGINE_ROWWISE], default=DEFAULT_ENGINE)
+    parser.add_argument('--contract-patterns', metavar='CSV', help="リース契約パターン定義CSV（省略時は既定のパターン）")
+    parser.add_argument('--chunk-size', type=int, metavar='行数',
+                        help="指定行数ずつ分割して読み込み・書き出す（メモリに載らない大容量CSV向け）")
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help="計算に使うプロセス数（0 でCPUコア数、既定は1）")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="前処理済みデータのキャッシュ保存先（同じCSVの再計算で読み込み・日付変換を省略）")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_CACHE_MAX_BYTES // 1024 ** 2, metavar='MB',
+                        help="キャッシュの合計サイズ上限（超えたら最終利用日時の古いものから削除）")
+    parser.add_argument('--previous-output', metavar='CSV',
+                        help="差分再計算: 前回の出力CSV（--input は前回の入力、期間は前回の出力と同じ）")
+    parser.add_argument('--changes', metavar='CSV', help="差分再計算: 変更・追加する在庫の行（在庫id列と変更する列）")
+    parser.add_argument('--updated-input', metavar='CSV', help="差分再計算: 変更を反映した入力の保存先（次回の --input 用）")
+    args = parser.parse_args(argv)
+
+    try:
+        periods = [parse_period(text) for text in args.period]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.monthly:
+        periods.extend(monthly_periods(args.monthly))
+    if args.quarterly:
+        periods.extend(quarterly_periods(args.quarterly))
+    if args.terms:
+        periods.extend(term_periods(args.terms))
+    if bool(args.previous_output) != bool(args.changes):
+        parser.error("差分再計算には --previous-output と --changes の両方を指定してください")
+    if not periods and not args.previous_output:
+        parser.error("--period / --monthly / --quarterly / --terms のいずれかで期間を指定してください")
+
+    if args.chunk_size is not None and args.chunk_size <= 0:
+        parser.error("--chunk-size には1以上の行数を指定してください")
+    if args.workers < 0:
+        parser.error("--workers には0以上のプロセス数を指定してください")
+    output_format = args.format or output_format_for(args.output)
+    if args.chunk_size and output_format != 'csv':
+        parser.error("--chunk-size は csv 出力でのみ使用できます")
+    if args.partition_by and output_format not in ('parquet', 'arrow'):
+        parser.error("--partition-by は parquet / arrow 出力でのみ使用できます")
+
+    contract_patterns = load_lease_contract_patterns(args.contract_patterns) if args.contract_patterns else None
+
+    def print_progress(percent, message):
+        print(f"{percent:3d}% {message}")
+    if args.quiet:
+        print_progress = None
+    instrumentation = StageInstrumentation(JsonLinesSink(args.trace_events), trace_memory=args.trace_memory) if args.trace_events else None
+
+    if args.previous_output:
+        start_time = time.time()
+        try:
+            df_previous_input = load_and_initial_process(args.input)
+            df_updated_input, changed_ids = apply_input_changes(
+                df_previous_input, read_changes_csv(args.changes, df_previous_input))
+            df_processed = process_incremental(
+                read_output_csv(args.previous_output), df_updated_input, changed_ids,
+                print_progress, args.engine, contract_patterns)
+        except (OSError, ValueError) as e:
+            print(f"処理エラー: {e}")
+            return 1
+        write_output(df_processed, args.output, output_format, args.partition_by)
+        if args.updated_input:
+            df_updated_input.to_csv(args.updated_input, index=False, encoding='utf-8')
+        print(f"{len(changed_ids):,}件の在庫を再計算 / {len(df_processed):,}行を出力しました ({time.time() - start_time:.2f}秒): {args.output}")
+        return 0
+
+    if args.chunk_size:
+        start_time = time.time()
+        row_count = process_csv_in_chunks(args.input, args.output, periods, args.chunk_size, print_progress, args.engine, contract_patterns)
+        if not row_count:
+            print("処理結果が空です")
+            return 1
+        print(f"{len(periods)}期間 / {row_count:,}行を出力しました ({time.time() - start_time:.2f}秒): {args.output}")
+        return 0
+
+    start_time = time.time()
+    if args.cache_dir:
+        try:
+            df_prepared, engine, from_cache = load_prepared_register(
+                args.input, args.engine, contract_patterns, cache_dir=args.cache_dir,
+                cache_max_bytes=args.cache_max_mb * 1024 ** 2)
         except Exception as e:
-            self.show_error(f"エラーが発生しました:\n{str(e)}")
-            
-        finally:
-            self.processing_complete()
-            
-    def update_status(self, message):
-        self.root.after(0, lambda: self.status_label.config(text=message))
-        
-    def update_perf_info(self, message):
-        self.root.after(0, lambda: self.perf_label.config(text=message))
-        
-    def show_error(self, message):
-        self.root.after(0, lambda: messagebox.showerror("エラー", message))
-        
-    def show_success(self, message):
-        self.root.after(0, lambda: messagebox.showinfo("処理完了", message))
-        
-    def show_info(self, message):
-        self.root.after(0, lambda: messagebox.showinfo("情報", message))
-        
-    def processing_complete(self):
-        def complete_ui():
-            self.progress.stop()
-            self.progress.grid_remove()
-            self.progress_percent_label.grid_remove()
-            self.process_button.config(state='normal')
-            self.status_label.config(text="")
-            if hasattr(self, 'start_time'):
-                elapsed = time.time() - self.start_time
-                self.time_label.config(text=f"✅ 完了 (総処理時間: {elapsed:.2f}秒)")
-        
-        self.root.after(0, complete_ui)
-        self.processing = False
+            print(f"処理エラー: {e}")
+            return 1
+        if df_prepared.empty:
+            print("CSVファイルが空か、データが読み取れませんでした")
+            return 1
+        if from_cache:
+            print(f"前処理済みデータのキャッシュを使用しました: {args.cache_dir}")
+        df_processed = process_prepared_periods(df_prepared, periods, print_progress, engine, args.workers or None, instrumentation, format_dates=False)
+    else:
+        df_original = load_and_initial_process(args.input)
+        if df_original.empty:
+            print("CSVファイルが空か、データが読み取れませんでした")
+            return 1
+        df_processed = process_periods(df_original, periods, print_progress, args.engine, contract_patterns, args.workers or None, instrumentation, format_dates=False)
+    if df_processed.empty:
+        print("処理結果が空です")
+        return 1
+    write_output(df_processed, args.output, output_format, args.partition_by)
+    print(f"{len(periods)}期間 / {len(df_processed):,}行を出力しました ({time.time() - start_time:.2f}秒): {args.output}")
+    return 0
+
+def __getattr__(name):
+    # GUI は tkinter を読み込むため、使われるときに初めて import する
+    if name == 'FixedAssetCalculatorGUI':
+        from python_book_value_gui import FixedAssetCalculatorGUI
+        return FixedAssetCalculatorGUI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    app = FixedAssetCalculatorGUI()
-    app.root.mainloop()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        sys.exit(main())
+    from python_book_value_gui import main as gui_main
+    gui_main()
\ No newline at end of file
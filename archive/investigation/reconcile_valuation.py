@@ -0,0 +1,483 @@
+"""
+簿価計算結果の突合（Python の出力と SQL の出力を在庫idごとに比較する）
+
+looker_studio_vs_python_comparison.md・implementation_complete.md（ステップ9-3）では、
+python_book_value_logic の出力と SQL（finance.book_value_calculation）の結果を、
+数件の在庫と簿価の合計値で列ごとに手作業で比べていた。
+ここでは2つの出力を (期首日, 期末日, 在庫id) のキーでソートして突き合わせ、
+期首 / 増加 / 減少 / 期中 / 期末 の金額列を列ごとの許容誤差でまとめて比較する。
+
+入力: CSV（python_book_value_logic の出力）/ Parquet / Arrow（ファイルまたは期間・会計ステータスで分割したディレクトリ）
+  SQL の英語の列名（stock_id, book_value_closing など）は日本語の列名に読み替える。
+  期間の列が両方に無い場合は在庫idだけで突き合わせる（在庫idが重複していればエラー）。
+  金額の欠損は0円として比較・集計する（SQL の NULL と Python の 0 を同じ扱いにする）。
+
+出力: 列ごとの不一致件数と合計の差、差の大きい在庫、会計ステータスごとの合計。
+  --output-dir を指定すると、それぞれの表と不一致の明細（1行 = 1在庫 × 1列）をCSVで保存する。
+  差（不一致・片方にしか無い行）があれば終了コード 1。
+
+使い方:
+  python reconcile_valuation.py --left python_202511.csv --right sql_202511.parquet
+  python reconcile_valuation.py --left python_202511.parquet --right sql_202511.csv \
+      --tolerance 期末簿価=1 --tolerance 期中減価償却費=1 --top 50 --output-dir reconcile_202511
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import python_book_value_logic as logic
+
+# 比較する金額列（OUTPUT_COLUMN_ORDER の並び）
+AMOUNT_COLUMNS = [
+    logic.ACQUISITION_COST_KISHU_COL, logic.ACCUMULATED_DEPRECIATION_KISHU_COL,
+    logic.IMPAIRMENT_LOSS_ACCUMULATED_KISHU_COL, logic.OPENING_BOOK_VALUE_COL,
+    logic.ACQUISITION_COST_INCREASE_COL, logic.ACCUMULATED_DEPRECIATION_INCREASE_COL,
+    logic.IMPAIRMENT_LOSS_ACCUMULATED_INCREASE_COL, logic.INCREASE_BOOK_VALUE_COL,
+    logic.ACQUISITION_COST_DECREASE_COL, logic.ACCUMULATED_DEPRECIATION_DECREASE_COL,
+    logic.IMPAIRMENT_LOSS_ACCUMULATED_DECREASE_COL, logic.DECREASE_BOOK_VALUE_COL,
+    logic.INTERIM_DEPRECIATION_EXPENSE_COL, logic.INTERIM_IMPAIRMENT_LOSS_COL,
+    logic.ACQUISITION_COST_KIMATSU_COL, logic.ACCUMULATED_DEPRECIATION_KIMATSU_COL,
+    logic.IMPAIRMENT_LOSS_ACCUMULATED_KIMATSU_COL, logic.CLOSING_BOOK_VALUE_COL,
+]
+# SQL（sql_implementation_plan.md の book_value_calculation）の列名 → Python の出力の列名
+SQL_COLUMN_NAMES = {
+    'stock_id': logic.STOCK_ID_COL,
+    'period_start': logic.PERIOD_KEY_COLS[0],
+    'period_end': logic.PERIOD_KEY_COLS[1],
+    'accounting_status': logic.ACCOUNTING_STATUS_COLUMN_NAME,
+    'acquisition_cost_opening': logic.ACQUISITION_COST_KISHU_COL,
+    'acquisition_cost_increase': logic.ACQUISITION_COST_INCREASE_COL,
+    'acquisition_cost_decrease': logic.ACQUISITION_COST_DECREASE_COL,
+    'acquisition_cost_closing': logic.ACQUISITION_COST_KIMATSU_COL,
+    'accumulated_depreciation_opening': logic.ACCUMULATED_DEPRECIATION_KISHU_COL,
+    'accumulated_depreciation_increase': logic.ACCUMULATED_DEPRECIATION_INCREASE_COL,
+    'accumulated_depreciation_decrease': logic.ACCUMULATED_DEPRECIATION_DECREASE_COL,
+    'interim_depreciation_expense': logic.INTERIM_DEPRECIATION_EXPENSE_COL,
+    'accumulated_depreciation_closing': logic.ACCUMULATED_DEPRECIATION_KIMATSU_COL,
+    'impairment_loss_opening': logic.IMPAIRMENT_LOSS_ACCUMULATED_KISHU_COL,
+    'impairment_loss_increase': logic.IMPAIRMENT_LOSS_ACCUMULATED_INCREASE_COL,
+    'impairment_loss_decrease': logic.IMPAIRMENT_LOSS_ACCUMULATED_DECREASE_COL,
+    'interim_impairment_loss': logic.INTERIM_IMPAIRMENT_LOSS_COL,
+    'impairment_loss_closing': logic.IMPAIRMENT_LOSS_ACCUMULATED_KIMATSU_COL,
+    'book_value_opening': logic.OPENING_BOOK_VALUE_COL,
+    'book_value_increase': logic.INCREASE_BOOK_VALUE_COL,
+    'book_value_decrease': logic.DECREASE_BOOK_VALUE_COL,
+    'book_value_closing': logic.CLOSING_BOOK_VALUE_COL,
+}
+# implementation_complete.md の「許容誤差: ±0.01円」
+DEFAULT_TOLERANCE = 0.01
+DEFAULT_TOP = 20
+UNKNOWN_STATUS = '(不明)'
+# (期間, 在庫id) を1つの整数キーにするときの在庫idの上限
+STOCK_ID_LIMIT = 1 << 40
+
+
+def parse_tolerances(texts):
+    """'列名=許容誤差' の指定を {列名: 許容誤差} にする（SQL の列名も可）"""
+    tolerances = {}
+    for text in texts:
+        column, separator, value = text.partition('=')
+        column = SQL_COLUMN_NAMES.get(column.strip(), column.strip())
+        if not separator or column not in AMOUNT_COLUMNS:
+            raise ValueError(f"許容誤差は 金額列=値 で指定してください: {text}")
+        try:
+            tolerances[column] = float(value)
+        except ValueError:
+            raise ValueError(f"許容誤差が数値ではありません: {text}") from None
+        if tolerances[column] < 0:
+            raise ValueError(f"許容誤差は0以上で指定してください: {text}")
+    return tolerances
+
+
+def _renamed(columns):
+    """読み込む列 {ファイルの列名: 日本語の列名}（キー・会計ステータス・金額列のみ）"""
+    wanted = set(logic.PERIOD_KEY_COLS + [logic.STOCK_ID_COL, logic.ACCOUNTING_STATUS_COLUMN_NAME] + AMOUNT_COLUMNS)
+    selected = {}
+    for column in columns:
+        name = SQL_COLUMN_NAMES.get(column, column)
+        if name in wanted and name not in selected.values():
+            selected[column] = name
+    return selected
+
+
+def read_valuation(file_path):
+    """簿価計算の出力から突合に使う列だけを読み込む（金額列は float64、列名は日本語にそろえる）"""
+    if os.path.isdir(file_path) or logic.output_format_for(file_path) in ('parquet', 'arrow'):
+        if logic.pa is None:
+            raise ValueError("parquet / arrow の読み込みには pyarrow が必要です")
+        file_format = 'ipc' if logic.output_format_for(file_path) == 'arrow' else 'parquet'
+        if os.path.isdir(file_path) and not any(name.endswith('.parquet') for _, _, names in os.walk(file_path) for name in names):
+            file_format = 'ipc'
+        dataset = logic.pa_dataset.dataset(file_path, format=file_format, partitioning='hive')
+        columns = _renamed(dataset.schema.names)
+        df = dataset.to_table(columns=list(columns)).to_pandas(date_as_object=False)
+    else:
+        header = pd.read_csv(file_path, encoding='utf-8-sig', nrows=0).columns
+        columns = _renamed(header)
+        amount_dtypes = {column: 'float64' for column, name in columns.items() if name in AMOUNT_COLUMNS}
+        # pyarrow があれば複数スレッドで読む（数百万行の出力では読み込みが大半を占める）
+        engine_options = {'engine': 'pyarrow'} if logic.pa is not None else {'low_memory': False}
+        df = pd.read_csv(file_path, encoding='utf-8-sig', usecols=list(columns), dtype=amount_dtypes, **engine_options)
+    df = df.rename(columns=columns)
+    if logic.STOCK_ID_COL not in df.columns:
+        raise ValueError(f"{file_path} に{logic.STOCK_ID_COL}列（SQL では stock_id）がありません")
+    # 金額列は欠損を0にした float64 の numpy 配列にそろえる（比較・集計のたびに変換しない）
+    for column in AMOUNT_COLUMNS:
+        if column in df.columns:
+            values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+            df[column] = np.where(np.isnan(values), 0.0, values)
+    return df
+
+
+def _period_days(series):
+    """期間の列を datetime64[D] にする（'YYYY/MM/DD'・'YYYY-MM-DD'・日付型のいずれも）
+
+    文字列の列は、同じ期間の行が続く（期間ごとに縦に連結した出力）ことを利用し、値の変わり目だけを変換する。
+    """
+    if series.dtype.kind == 'M':
+        return series.to_numpy().astype('datetime64[D]')
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        values = series.cat.categories.to_numpy()
+    else:
+        values = series.to_numpy(dtype=object)
+        changes = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]])) if len(values) else np.array([], dtype='int64')
+        run_codes, values = pd.factorize(values[changes], use_na_sentinel=False)
+        codes = np.repeat(run_codes, np.diff(np.append(changes, len(series))))
+    days = pd.to_datetime(pd.Series(values, dtype=object).astype(str).str.replace('/', '-'), format='%Y-%m-%d', errors='coerce')
+    if days.isna().any():
+        raise ValueError(f"{series.name} に日付でない値があります: {values[days.isna().to_numpy()][0]}")
+    return days.to_numpy(dtype='datetime64[D]')[codes]
+
+
+def _stock_ids(df, label):
+    stock_ids = pd.to_numeric(df[logic.STOCK_ID_COL], errors='coerce')
+    if stock_ids.isna().any():
+        raise ValueError(f"{label} の{logic.STOCK_ID_COL}に欠損または数値でない値があります")
+    stock_ids = stock_ids.to_numpy(dtype='int64')
+    if len(stock_ids) and (stock_ids.min() < 0 or stock_ids.max() >= STOCK_ID_LIMIT):
+        raise ValueError(f"{label} の{logic.STOCK_ID_COL}が範囲外です")
+    return stock_ids
+
+
+def _join_keys(df_left, df_right, labels):
+    """両方の出力の行を (期間, 在庫id) の整数キーにする
+
+    戻り値は (左のキー, 右のキー, 期間の一覧 [(期首日, 期末日)], キーの列名)。
+    期間の列が片方にしか無ければ在庫idだけをキーにする。
+    """
+    use_periods = all(column in df.columns for df in (df_left, df_right) for column in logic.PERIOD_KEY_COLS)
+    if not use_periods:
+        periods = [(pd.NaT, pd.NaT)]
+        keys = [_stock_ids(df, label) for df, label in zip((df_left, df_right), labels)]
+        return keys[0], keys[1], periods, [logic.STOCK_ID_COL]
+
+    # 期間 (期首日, 期末日) を両方の出力で共通の番号にする（期首日と期末日の日数を1つの整数にして番号を振る）
+    period_days = [(_period_days(df[logic.PERIOD_KEY_COLS[0]]), _period_days(df[logic.PERIOD_KEY_COLS[1]])) for df in (df_left, df_right)]
+    starts = np.concatenate([starts for starts, _ in period_days]).astype('int64')
+    ends = np.concatenate([ends for _, ends in period_days]).astype('int64')
+    if np.any(ends < starts):
+        raise ValueError(f"{logic.PERIOD_KEY_COLS[1]}が{logic.PERIOD_KEY_COLS[0]}より前の行があります")
+    period_codes, period_values = pd.factorize((starts << 32) + (ends - starts))
+    period_starts = (period_values >> 32).astype('datetime64[D]')
+    periods = list(zip(pd.DatetimeIndex(period_starts), pd.DatetimeIndex(period_starts + (period_values & 0xFFFFFFFF))))
+    boundary = len(df_left)
+    keys = [
+        period_codes[:boundary].astype('int64') * STOCK_ID_LIMIT + _stock_ids(df_left, labels[0]),
+        period_codes[boundary:].astype('int64') * STOCK_ID_LIMIT + _stock_ids(df_right, labels[1]),
+    ]
+    return keys[0], keys[1], periods, logic.PERIOD_KEY_COLS + [logic.STOCK_ID_COL]
+
+
+def _sorted_order(keys, label):
+    """キーの昇順の並び（出力は在庫id順のことが多いので、既に昇順ならソートしない）。重複はエラー"""
+    order = np.arange(len(keys)) if np.all(keys[1:] >= keys[:-1]) else np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    duplicated = np.flatnonzero(sorted_keys[1:] == sorted_keys[:-1])
+    if len(duplicated):
+        raise ValueError(f"{label} でキーが重複しています（{logic.STOCK_ID_COL} {sorted_keys[duplicated[0]] % STOCK_ID_LIMIT} など）")
+    return order, sorted_keys
+
+
+def align(left_keys, right_keys, labels=('left', 'right')):
+    """ソート済みのキーで突き合わせる
+
+    戻り値は (両方にある行の左の位置, 同じく右の位置, 左にだけある行の位置, 右にだけある行の位置)。
+    両方にある行はキーの昇順。
+    """
+    left_order, left_sorted = _sorted_order(left_keys, labels[0])
+    right_order, right_sorted = _sorted_order(right_keys, labels[1])
+    positions = np.searchsorted(left_sorted, right_sorted)
+    found = positions < len(left_sorted)
+    found[found] = left_sorted[positions[found]] == right_sorted[found]
+    left_matched = np.zeros(len(left_sorted), dtype=bool)
+    left_matched[positions[found]] = True
+    return (left_order[positions[found]], right_order[found],
+            left_order[~left_matched], right_order[~found])
+
+
+class Reconciliation:
+    """2つの簿価計算結果の突合
+
+    df_left / df_right は read_valuation の結果。tolerances は {金額列: 許容誤差}（無い列は default_tolerance）。
+    |右 - 左| が許容誤差を超える値を不一致とする。
+    """
+
+    def __init__(self, df_left, df_right, tolerances=None, default_tolerance=DEFAULT_TOLERANCE, labels=('left', 'right')):
+        self.df_left = df_left
+        self.df_right = df_right
+        self.labels = tuple(labels)
+        self.left_keys, self.right_keys, self.periods, self.key_columns = _join_keys(df_left, df_right, self.labels)
+        self.left_positions, self.right_positions, self.left_only, self.right_only = align(self.left_keys, self.right_keys, self.labels)
+
+        self.columns = [column for column in AMOUNT_COLUMNS if column in df_left.columns and column in df_right.columns]
+        self.missing_columns = [column for column in AMOUNT_COLUMNS if column not in self.columns]
+        tolerances = tolerances or {}
+        self.tolerances = {column: tolerances.get(column, default_tolerance) for column in self.columns}
+        self._compare()
+
+    def _values(self, df, column, positions=None):
+        values = df[column].to_numpy()
+        return values if positions is None else values[positions]
+
+    def _compare(self):
+        """列ごとに不一致の位置を求め、行ごとの不一致列数・差の合計・最も差の大きい列を積み上げる"""
+        rows = len(self.left_positions)
+        self.mismatch_positions = {}
+        self.row_mismatches = np.zeros(rows, dtype='int16')
+        self.row_difference = np.zeros(rows, dtype='float64')
+        self.row_max_difference = np.zeros(rows, dtype='float64')
+        self.row_max_column = np.full(rows, -1, dtype='int16')
+        for index, column in enumerate(self.columns):
+            difference = np.abs(self._values(self.df_right, column, self.right_positions)
+                                - self._values(self.df_left, column, self.left_positions))
+            mismatch = difference > self.tolerances[column]
+            positions = np.flatnonzero(mismatch)
+            self.mismatch_positions[column] = positions
+            if len(positions) == 0:
+                continue
+            self.row_mismatches[positions] += 1
+            self.row_difference[positions] += difference[positions]
+            larger = positions[difference[positions] > self.row_max_difference[positions]]
+            self.row_max_difference[larger] = difference[larger]
+            self.row_max_column[larger] = index
+
+    @property
+    def mismatched_rows(self):
+        return int(np.count_nonzero(self.row_mismatches))
+
+    @property
+    def has_differences(self):
+        return bool(self.mismatched_rows or len(self.left_only) or len(self.right_only))
+
+    def _keys_frame(self, keys):
+        """整数キーをキーの列（期首日・期末日・在庫id）の DataFrame に戻す"""
+        frame = pd.DataFrame({logic.STOCK_ID_COL: keys % STOCK_ID_LIMIT})
+        if len(self.key_columns) > 1:
+            period_codes = keys // STOCK_ID_LIMIT
+            starts = np.array([start for start, _ in self.periods], dtype='datetime64[D]')
+            ends = np.array([end for _, end in self.periods], dtype='datetime64[D]')
+            frame.insert(0, logic.PERIOD_KEY_COLS[0], starts[period_codes])
+            frame.insert(1, logic.PERIOD_KEY_COLS[1], ends[period_codes])
+        return frame
+
+    def _matched_keys(self, positions):
+        """両方にある行のうち positions 番目の行のキー"""
+        return self._keys_frame(self.left_keys[self.left_positions[positions]])
+
+    def one_sided_keys(self):
+        """片方にしか無い行のキー（列 '出力' は左右どちらの出力にある行か）"""
+        frame = self._keys_frame(np.concatenate([self.left_keys[self.left_only], self.right_keys[self.right_only]]))
+        frame.insert(0, '出力', np.repeat(self.labels, [len(self.left_only), len(self.right_only)]))
+        return frame
+
+    def column_summary(self):
+        """金額列ごとの 許容誤差・不一致件数・最大差（両方にある行）と、各出力の全行の合計・合計の差"""
+        records = []
+        for column in self.columns:
+            positions = self.mismatch_positions[column]
+            left_total = self._values(self.df_left, column).sum()
+            right_total = self._values(self.df_right, column).sum()
+            max_difference = np.abs(self._values(self.df_right, column, self.right_positions[positions])
+                                    - self._values(self.df_left, column, self.left_positions[positions])).max(initial=0)
+            records.append({
+                '列': column,
+                '許容誤差': self.tolerances[column],
+                '不一致件数': len(positions),
+                '最大差': max_difference,
+                f'{self.labels[0]}合計': left_total,
+                f'{self.labels[1]}合計': right_total,
+                '合計の差': right_total - left_total,
+            })
+        return pd.DataFrame(records)
+
+    def _statuses(self):
+        """各出力の行の会計ステータス（Categorical の codes）と、共通のカテゴリ
+
+        会計ステータス列が片方にしか無い場合、その出力の行は突き合わせた相手の値を使い、相手が無ければ UNKNOWN_STATUS。
+        """
+        column = logic.ACCOUNTING_STATUS_COLUMN_NAME
+        factorized = [pd.factorize(df[column]) if column in df.columns else None for df in (self.df_left, self.df_right)]
+        categories = pd.Index([UNKNOWN_STATUS])
+        for item in factorized:
+            if item is not None:
+                categories = categories.append(pd.Index(item[1]).astype(str))
+        categories = categories.drop_duplicates()
+
+        def codes_of(item):
+            if item is None:
+                return None
+            codes, uniques = item
+            mapping = categories.get_indexer(pd.Index(uniques).astype(str))
+            return np.where(codes < 0, 0, mapping[codes])
+
+        left_codes, right_codes = codes_of(factorized[0]), codes_of(factorized[1])
+        if left_codes is None and right_codes is None:
+            return np.zeros(len(self.df_left), dtype='int64'), np.zeros(len(self.df_right), dtype='int64'), categories
+        if left_codes is None:
+            left_codes = np.zeros(len(self.df_left), dtype='int64')
+            left_codes[self.left_positions] = right_codes[self.right_positions]
+        if right_codes is None:
+            right_codes = np.zeros(len(self.df_right), dtype='int64')
+            right_codes[self.right_positions] = left_codes[self.left_positions]
+        return left_codes, right_codes, categories
+
+    def status_totals(self, columns=None):
+        """会計ステータスごとの 行数・不一致行数 と、金額列ごとの各出力の合計・差（不一致行数は左の会計ステータスで数える）"""
+        columns = [column for column in (columns or self.columns) if column in self.columns]
+        left_codes, right_codes, categories = self._statuses()
+        size = len(categories)
+        frame = pd.DataFrame({
+            logic.ACCOUNTING_STATUS_COLUMN_NAME: categories,
+            f'{self.labels[0]}行数': np.bincount(left_codes, minlength=size),
+            f'{self.labels[1]}行数': np.bincount(right_codes, minlength=size),
+            '不一致行数': np.bincount(left_codes[self.left_positions], weights=self.row_mismatches > 0, minlength=size).astype('int64'),
+        })
+        for column in columns:
+            left_total = np.bincount(left_codes, weights=self._values(self.df_left, column), minlength=size)
+            right_total = np.bincount(right_codes, weights=self._values(self.df_right, column), minlength=size)
+            frame[f'{column}_{self.labels[0]}'] = left_total
+            frame[f'{column}_{self.labels[1]}'] = right_total
+            frame[f'{column}_差'] = right_total - left_total
+        frame = frame[(frame[f'{self.labels[0]}行数'] > 0) | (frame[f'{self.labels[1]}行数'] > 0)]
+        return frame.sort_values(f'{self.labels[0]}行数', ascending=False, kind='stable').reset_index(drop=True)
+
+    def top_differences(self, count=DEFAULT_TOP):
+        """不一致の差の合計が大きい順に count 件（最も差の大きい列と、その列の左右の値）"""
+        candidates = np.flatnonzero(self.row_mismatches)
+        if len(candidates) > count:
+            candidates = candidates[np.argpartition(-self.row_difference[candidates], count - 1)[:count]]
+        candidates = candidates[np.argsort(-self.row_difference[candidates], kind='stable')]
+        frame = self._matched_keys(candidates)
+        frame['不一致列数'] = self.row_mismatches[candidates]
+        frame['差の合計'] = self.row_difference[candidates]
+        max_columns = np.array(self.columns, dtype=object)[self.row_max_column[candidates]] if len(candidates) else []
+        frame['最も差の大きい列'] = max_columns
+        left_values, right_values = [], []
+        for position, column in zip(candidates, max_columns):
+            left_values.append(self._values(self.df_left, column, self.left_positions[[position]])[0])
+            right_values.append(self._values(self.df_right, column, self.right_positions[[position]])[0])
+        frame[self.labels[0]] = np.array(left_values, dtype='float64')
+        frame[self.labels[1]] = np.array(right_values, dtype='float64')
+        return frame
+
+    def mismatch_details(self):
+        """不一致の明細（1行 = 1つの在庫の1つの列。キー・列・左右の値・差）"""
+        frames = []
+        for column in self.columns:
+            positions = self.mismatch_positions[column]
+            if len(positions) == 0:
+                continue
+            frame = self._matched_keys(positions)
+            left = self._values(self.df_left, column, self.left_positions[positions])
+            right = self._values(self.df_right, column, self.right_positions[positions])
+            frame['列'] = column
+            frame[self.labels[0]] = left
+            frame[self.labels[1]] = right
+            frame['差'] = right - left
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=self.key_columns + ['列', self.labels[0], self.labels[1], '差'])
+        return pd.concat(frames, ignore_index=True)
+
+    def write_reports(self, directory):
+        """各表をCSV（utf-8-sig）で directory に保存し、保存したファイルのパスを返す"""
+        os.makedirs(directory, exist_ok=True)
+        reports = {
+            'columns.csv': self.column_summary(),
+            'status_totals.csv': self.status_totals(),
+            'top_differences.csv': self.top_differences(self.mismatched_rows),
+            'mismatches.csv': self.mismatch_details(),
+            'one_sided.csv': self.one_sided_keys(),
+        }
+        paths = []
+        for name, frame in reports.items():
+            path = os.path.join(directory, name)
+            frame.to_csv(path, index=False, encoding='utf-8-sig')
+            paths.append(path)
+        return paths
+
+
+def _print_table(frame):
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200,
+                           'display.float_format', '{:,.2f}'.format):
+        print(frame.to_string(index=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="2つの簿価計算結果（Python / SQL）を在庫idごとに突き合わせ、金額列の差を集計します")
+    parser.add_argument('--left', required=True, help="1つ目の出力（CSV / Parquet / Arrow、分割出力のディレクトリも可）")
+    parser.add_argument('--right', required=True, help="2つ目の出力（SQL の英語の列名も可）")
+    parser.add_argument('--left-label', default='Python', help="1つ目の出力の表示名")
+    parser.add_argument('--right-label', default='SQL', help="2つ目の出力の表示名")
+    parser.add_argument('--tolerance', action='append', default=[], metavar='列=値',
+                        help="金額列ごとの許容誤差（複数指定可）")
+    parser.add_argument('--default-tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"--tolerance で指定しない列の許容誤差（既定: {DEFAULT_TOLERANCE}）")
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help="表示する差の大きい在庫の件数")
+    parser.add_argument('--output-dir', help="集計表と不一致の明細をCSVで保存するディレクトリ")
+    args = parser.parse_args(argv)
+    if args.left_label == args.right_label:
+        parser.error("--left-label と --right-label は別の名前にしてください")
+
+    try:
+        tolerances = parse_tolerances(args.tolerance)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start_time = time.time()
+    try:
+        df_left = read_valuation(args.left)
+        df_right = read_valuation(args.right)
+        load_seconds = time.time() - start_time
+        result = Reconciliation(df_left, df_right, tolerances, args.default_tolerance, (args.left_label, args.right_label))
+    except (OSError, ValueError) as e:
+        print(f"処理エラー: {e}")
+        return 1
+
+    print(f"{args.left_label} {len(df_left):,}行 / {args.right_label} {len(df_right):,}行 "
+          f"（キー: {', '.join(result.key_columns)}、読み込み {load_seconds:.2f}秒・比較 {time.time() - start_time - load_seconds:.2f}秒）")
+    print(f"両方にある行 {len(result.left_positions):,}行のうち不一致 {result.mismatched_rows:,}行、"
+          f"{args.left_label}にだけある行 {len(result.left_only):,}行、{args.right_label}にだけある行 {len(result.right_only):,}行")
+    if result.missing_columns:
+        print(f"片方にしか無いため比較しない列: {', '.join(result.missing_columns)}")
+    print()
+    _print_table(result.column_summary())
+    print()
+    _print_table(result.status_totals([logic.OPENING_BOOK_VALUE_COL, logic.CLOSING_BOOK_VALUE_COL]))
+    if result.mismatched_rows and args.top > 0:
+        print(f"\n差の大きい在庫（上位 {min(args.top, result.mismatched_rows)}件）")
+        _print_table(result.top_differences(args.top))
+    if args.output_dir:
+        paths = result.write_reports(args.output_dir)
+        print(f"\n保存しました: {', '.join(paths)}")
+    return 1 if result.has_differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -57,18 +57,19 @@ attribute_value_by_type AS (
 ),
 
 -- ============================================================
--- 1. 期末日付の動的計算（実行日から次の2月末/5月末/8月末/11月末を算出）
+-- 1. 期末日付の動的計算（実行日から次の2月末/5月末/8月末/11月末を算出、2月末は LAST_DAY でうるう年に対応）
+-- Python 版: tools/fiscal_calendar.py
 -- ============================================================
 quarter_ends AS (
   SELECT
     CURRENT_DATE() AS today,
     (SELECT MIN(candidate_date)
      FROM UNNEST([
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 11, 30),
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 11, 30)
@@ -77,11 +78,11 @@ quarter_ends AS (
     ) AS term1_end,
     (SELECT ARRAY_AGG(candidate_date ORDER BY candidate_date)[OFFSET(1)]
      FROM UNNEST([
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 11, 30),
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 11, 30)
@@ -90,11 +91,11 @@ quarter_ends AS (
     ) AS term2_end,
     (SELECT ARRAY_AGG(candidate_date ORDER BY candidate_date)[OFFSET(2)]
      FROM UNNEST([
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 11, 30),
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 11, 30)
@@ -103,11 +104,11 @@ quarter_ends AS (
     ) AS term3_end,
     (SELECT ARRAY_AGG(candidate_date ORDER BY candidate_date)[OFFSET(3)]
      FROM UNNEST([
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 11, 30),
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 11, 30)
@@ -49,11 +49,11 @@ quarter_ends AS (
     CURRENT_DATE() AS today,
     (SELECT MIN(candidate_date)
      FROM UNNEST([
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 11, 30),
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 11, 30)
@@ -62,11 +62,11 @@ quarter_ends AS (
     ) AS term1_end,
     (SELECT ARRAY_AGG(candidate_date ORDER BY candidate_date)[OFFSET(1)]
      FROM UNNEST([
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 11, 30),
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 11, 30)
@@ -75,11 +75,11 @@ quarter_ends AS (
     ) AS term2_end,
     (SELECT ARRAY_AGG(candidate_date ORDER BY candidate_date)[OFFSET(2)]
      FROM UNNEST([
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 11, 30),
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 11, 30)
@@ -88,11 +88,11 @@ quarter_ends AS (
     ) AS term3_end,
     (SELECT ARRAY_AGG(candidate_date ORDER BY candidate_date)[OFFSET(3)]
      FROM UNNEST([
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()), 11, 30),
-       DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 28),
+       LAST_DAY(DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 2, 1)),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 5, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 8, 31),
        DATE(EXTRACT(YEAR FROM CURRENT_DATE()) + 1, 11, 30)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+滞留在庫ダッシュボードの差分更新（前回のスナップショットとの差分）
+
+gas/Code.js の executeUpdate は更新のたびに B〜BO 列を全てクリアして全行を書き直し、
+書き込んだシートを読み直して手入力列の復元と削除履歴の作成を行っている（毎朝9時の実行で1〜3分）。
+ここでは今日の結果を前回のスナップショットと sku_id で突き合わせ、シートへの書き込みを
+  added   : 追加された行（全列）
+  removed : 無くなった sku_id（シート側で削除履歴に移してから行を削除する）
+  changed : 値が変わったセル（列ごとに sku_id と新しい値）
+だけにする。sku_id で並べた整数キーの配列を1回突き合わせ、列ごとにまとめて比較する。
+
+シートの代わりに LocalSheet（Arrow ファイル）へ差分を書き込むと、書き込んだセル数の確認と
+「差分を適用したシート = 今日の結果」の検証ができる。
+
+使用方法:
+    python dashboard_delta.py --snapshot dashboard_snapshot.arrow --output delta.json [--backend ...]
+    python dashboard_delta.py --snapshot dashboard_snapshot.arrow --current today.parquet --output delta.json \\
+        --sheet local_sheet.arrow      # 手元のシート代わりに適用して検証する
+"""
+
+import sys
+import os
+import json
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+except ImportError:
+    print("必要なパッケージをインストールしてください:")
+    print("  pip install pandas numpy pyarrow")
+    sys.exit(1)
+
+from query_cache import CachedFetcher, add_cache_arguments, cache_options_from_args
+from query_fetcher import BACKENDS, DEFAULT_BACKEND, DEFAULT_WORKERS, fetch_dataframe, make_fetcher
+
+
+KEY_COLUMN = "sku_id"
+DELETED_AT_COLUMN = "削除日時"
+# gas/Code.js の STAGNANT_STOCK_QUERY と同じ条件
+DASHBOARD_QUERY = """
+SELECT *
+FROM `clas-analytics.mart.stagnant_stock_report`
+WHERE term2_impairment_book_value_cumulative > 0
+  AND (exclusion_flag IS NULL OR exclusion_flag NOT LIKE '%除外%')
+ORDER BY sku_id ASC
+"""
+
+
+def _sorted_by_key(df, key):
+    if key not in df.columns:
+        raise ValueError(f"{key} 列がありません")
+    keys = pd.to_numeric(df[key], errors="coerce")
+    if keys.isna().any():
+        raise ValueError(f"{key} に空欄または数値でない値があります")
+    if keys.duplicated().any():
+        raise ValueError(f"{key} が重複しています: {keys[keys.duplicated()].iloc[0]}")
+    order = np.argsort(keys.to_numpy(dtype="int64"), kind="stable")
+    return df.iloc[order].reset_index(drop=True), keys.to_numpy(dtype="int64")[order]
+
+
+def _differs(before, after):
+    """値が変わったか（欠損同士は同じとみなす）"""
+    before_missing, after_missing = pd.isna(before), pd.isna(after)
+    both = ~before_missing & ~after_missing
+    unequal = np.zeros(len(before), dtype=bool)
+    if both.any():
+        unequal[both] = np.asarray(before[both] != after[both], dtype=bool)
+    return (before_missing != after_missing) | unequal
+
+
+def compute_delta(previous, current, key=KEY_COLUMN):
+    """前回の結果と今日の結果の差分
+
+    戻り値 dict:
+      key / columns : キー列と今日の列の並び
+      full_rewrite  : 列の構成が変わった（シートは全行を書き直す）
+      added         : 追加された行（DataFrame、sku_id 順）
+      removed       : 無くなった sku_id
+      changed       : 列ごとの [{"column": 列名, "keys": sku_id, "values": 新しい値}]（値が変わった列のみ）
+    """
+    current, current_keys = _sorted_by_key(current, key)
+    if previous is None or previous.empty:
+        previous_keys = np.array([], dtype="int64")
+        previous = current.iloc[:0]
+    else:
+        previous, previous_keys = _sorted_by_key(previous, key)
+
+    removed = previous_keys[~np.isin(previous_keys, current_keys, assume_unique=True)]
+    full_rewrite = len(previous_keys) > 0 and list(previous.columns) != list(current.columns)
+    if full_rewrite:
+        added_positions = np.arange(len(current))
+        changed = []
+    else:
+        # 両方にある sku_id の位置（どちらも sku_id 順なので1回の突き合わせで済む）
+        common, previous_positions, current_positions = np.intersect1d(
+            previous_keys, current_keys, assume_unique=True, return_indices=True)
+        added_positions = np.flatnonzero(~np.isin(current_keys, common, assume_unique=True))
+        changed = []
+        for col in current.columns:
+            if col == key:
+                continue
+            before = previous[col].to_numpy()[previous_positions]
+            after = current[col].to_numpy()[current_positions]
+            if before.dtype.kind != after.dtype.kind:
+                before, after = before.astype(object), after.astype(object)
+            mask = _differs(before, after)
+            if mask.any():
+                changed.append({"column": col, "keys": common[mask],
+                                "values": current[col].iloc[current_positions[mask]].reset_index(drop=True)})
+    return {
+        "key": key,
+        "columns": list(current.columns),
+        "full_rewrite": full_rewrite,
+        "added": current.iloc[added_positions].reset_index(drop=True),
+        "removed": removed,
+        "changed": changed,
+    }
+
+
+def delta_summary(delta, current_rows):
+    """差分の件数と、全件書き直しと比べた書き込みセル数"""
+    changed_cells = sum(len(change["keys"]) for change in delta["changed"])
+    added_cells = len(delta["added"]) * len(delta["columns"])
+    return {
+        "added_rows": len(delta["added"]),
+        "removed_rows": len(delta["removed"]),
+        "changed_columns": len(delta["changed"]),
+        "changed_cells": changed_cells,
+        "cells_to_write": added_cells + changed_cells,
+        "full_rewrite_cells": current_rows * len(delta["columns"]),
+    }
+
+
+def _json_values(series):
+    # JSON に書ける値にする（日付は YYYY-MM-DD / 日時は ISO 形式、欠損は null）
+    if pd.api.types.is_datetime64_any_dtype(series):
+        normalized = series.dropna()
+        text_format = "%Y-%m-%d" if (normalized == normalized.dt.normalize()).all() else "%Y-%m-%dT%H:%M:%S"
+        series = series.dt.strftime(text_format)
+    values = series.astype(object)
+    return values.where(series.notna(), None).tolist()
+
+
+def delta_to_json(delta):
+    """シート側（GAS）で読む形式。added は行の配列、changed は列ごとの sku_id と値の配列"""
+    added = delta["added"]
+    columns = [_json_values(added[col]) for col in added.columns]
+    return {
+        "key": delta["key"],
+        "columns": delta["columns"],
+        "full_rewrite": delta["full_rewrite"],
+        "added": [list(row) for row in zip(*columns)] if columns else [],
+        "removed": delta["removed"].tolist(),
+        "changed": [{"column": change["column"], "keys": change["keys"].tolist(), "values": _json_values(change["values"])}
+                    for change in delta["changed"]],
+    }
+
+
+def read_arrow(path):
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas(date_as_object=False)
+
+
+def write_arrow(df, path):
+    """Arrow IPC ファイルに書き、書き終えてから置き換える（途中で止まっても前回のファイルが残る）"""
+    path = Path(path)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    try:
+        with pa.OSFile(str(temp_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+class LocalSheet:
+    """滞留在庫レポートのシートの代わり（差分の適用を手元で確認する）
+
+    rows はシートの行（BigQuery の列 + 手入力列）、history は「削除履歴」シート。
+    apply() は GAS が行う書き込みと同じ単位でセルを書き、書き込んだセル数を cells_written に足す。
+    手入力列（manual_columns）は触らないため、sku_id が残る限りそのまま残る。
+    """
+
+    def __init__(self, rows=None, history=None, key=KEY_COLUMN, manual_columns=()):
+        self.key = key
+        self.rows = rows if rows is not None else pd.DataFrame()
+        self.history = history if history is not None else pd.DataFrame()
+        self.manual_columns = list(manual_columns)
+        self.cells_written = 0
+
+    @classmethod
+    def load(cls, path, key=KEY_COLUMN, manual_columns=()):
+        path = Path(path)
+        if not path.exists():
+            return cls(key=key, manual_columns=manual_columns)
+        rows = read_arrow(path)
+        history_path = cls.history_path(path)
+        history = read_arrow(history_path) if history_path.exists() else None
+        manual_columns = [col for col in rows.columns if col in manual_columns] or list(manual_columns)
+        return cls(rows, history, key, manual_columns)
+
+    @staticmethod
+    def history_path(path):
+        path = Path(path)
+        return path.with_name(f"{path.stem}_削除履歴{path.suffix}")
+
+    def save(self, path):
+        write_arrow(self.rows, path)
+        if not self.history.empty:
+            write_arrow(self.history, self.history_path(path))
+
+    def data(self):
+        """BigQuery の列だけ（手入力列を除く）"""
+        return self.rows.drop(columns=[col for col in self.manual_columns if col in self.rows.columns])
+
+    def apply(self, delta, deleted_at=None, current=None):
+        """差分を書き込み、書き込んだセル数を返す
+
+        シートが空で差分が全行の書き直しでない（前回のスナップショットはあるがシートが新しい）場合、
+        差分の追加行は今日の新しい SKU だけのため、current（今日の結果）から全行を書く。
+        current が無ければ ValueError。
+        """
+        written = 0
+        columns = delta["columns"]
+        if delta["full_rewrite"] or self.rows.empty:
+            if delta["full_rewrite"]:
+                rows = delta["added"][columns]
+            elif current is not None:
+                rows = _sorted_by_key(current, self.key)[0][columns]
+            else:
+                raise ValueError("シートが空のため差分だけでは全行になりません（今日の結果から全行を書いてください）")
+            # 列の構成が変わった場合は executeUpdate と同じく全行を書き直し、手入力列を sku_id で戻す
+            manual = self.rows[[self.key] + self.manual_columns] if not self.rows.empty else None
+            removed = set(delta["removed"].tolist())
+            self._move_to_history(self.rows[self.rows[self.key].isin(removed)] if not self.rows.empty else self.rows, deleted_at)
+            if manual is not None:
+                rows = rows.merge(manual, on=self.key, how="left")
+            self.rows = rows.reset_index(drop=True)
+            written = len(rows) * len(columns)
+            self.cells_written += written
+            return written
+
+        # 無くなった SKU: 行を削除履歴に移してから削除する
+        is_removed = self.rows[self.key].isin(delta["removed"])
+        self._move_to_history(self.rows[is_removed], deleted_at)
+        self.rows = self.rows[~is_removed].reset_index(drop=True)
+
+        # 値が変わったセルだけ書き換える
+        positions_by_key = pd.Index(self.rows[self.key].to_numpy(dtype="int64"))
+        for change in delta["changed"]:
+            positions = positions_by_key.get_indexer(change["keys"])
+            if (positions < 0).any():
+                raise ValueError(f"シートに無い {self.key} への書き込みがあります（列: {change['column']}）")
+            values = self.rows[change["column"]].to_numpy(dtype=object, copy=True)
+            values[positions] = change["values"].to_numpy(dtype=object)
+            self.rows[change["column"]] = pd.Series(values, index=self.rows.index).infer_objects()
+            written += len(positions)
+
+        # 追加された SKU: 末尾に追記する（手入力列は空）
+        if not delta["added"].empty:
+            self.rows = pd.concat([self.rows, delta["added"][columns]], ignore_index=True)
+            written += len(delta["added"]) * len(columns)
+        self.cells_written += written
+        return written
+
+    def _move_to_history(self, rows, deleted_at):
+        if rows.empty:
+            return
+        deleted_at = deleted_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = rows.assign(**{DELETED_AT_COLUMN: deleted_at})
+        self.history = pd.concat([self.history, rows], ignore_index=True) if not self.history.empty else rows.reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="滞留在庫ダッシュボードの前回との差分（追加 / 削除 / 変更セル）を出力します")
+    parser.add_argument("--snapshot", required=True, help="前回の結果（Arrow ファイル）。差分を出した後、今日の結果で置き換える")
+    parser.add_argument("--current", help="今日の結果のファイル（CSV / Parquet / Arrow）。省略時はクエリを実行する")
+    parser.add_argument("--output", required=True, help="差分の出力先（JSON）")
+    parser.add_argument("--sheet", help="差分を適用する手元のシート代わり（Arrow ファイル、無ければ作成）")
+    parser.add_argument("--manual-column", action="append", default=[], help="シート代わりの手入力列名（複数指定可）")
+    parser.add_argument("--keep-snapshot", action="store_true", help="スナップショットを今日の結果で置き換えない")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="クエリ結果の取得方法")
+    parser.add_argument("--page-dir", help="files バックエンドで読むページファイルのディレクトリ")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="ページを並列に取得するスレッド数")
+    add_cache_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.current:
+            path = args.current.lower()
+            current = (pd.read_parquet(args.current) if path.endswith(".parquet")
+                       else read_arrow(args.current) if path.endswith(".arrow") else pd.read_csv(args.current))
+        else:
+            fetcher = make_fetcher(args.backend, args.page_dir, args.workers)
+            cache_options = cache_options_from_args(args)
+            if cache_options is not None:
+                fetcher = CachedFetcher(fetcher, **cache_options)
+            current = fetch_dataframe(fetcher, DASHBOARD_QUERY)
+        previous = read_arrow(args.snapshot) if Path(args.snapshot).exists() else None
+        delta = compute_delta(previous, current)
+    except (OSError, ValueError, RuntimeError, pa.ArrowException) as e:
+        print(f"処理エラー: {e}")
+        return 1
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(delta_to_json(delta), f, ensure_ascii=False)
+    summary = delta_summary(delta, len(current))
+    print(f"追加 {summary['added_rows']:,} 行 / 削除 {summary['removed_rows']:,} 行 / "
+          f"変更 {summary['changed_cells']:,} セル（{summary['changed_columns']} 列）"
+          f"{' / 列の構成が変わったため全行を書き直し' if delta['full_rewrite'] else ''}")
+    print(f"書き込むセル {summary['cells_to_write']:,} / 全件書き直し {summary['full_rewrite_cells']:,}: {args.output}")
+
+    if args.sheet:
+        sheet = LocalSheet.load(args.sheet, manual_columns=args.manual_column)
+        try:
+            written = sheet.apply(delta, current=current)
+        except ValueError as e:
+            print(f"処理エラー: {e}")
+            return 1
+        # 適用後のシートが今日の結果と一致するか（差分が残らないこと）を確認してから保存する
+        remaining = delta_summary(compute_delta(sheet.data()[delta["columns"]], current), len(current))
+        if remaining["cells_to_write"] or remaining["removed_rows"]:
+            print(f"エラー: 適用後のシートが今日の結果と一致しません（残りの差分 {remaining['cells_to_write']:,} セル、シートは保存しません）")
+            return 1
+        sheet.save(args.sheet)
+        print(f"シート代わりに {written:,} セルを書き込みました: {args.sheet}")
+
+    if not args.keep_snapshot:
+        write_arrow(current, args.snapshot)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+月末パックのクエリをまとめて実行し、クエリごとのファイルに出力するツール
+
+export_to_excel.py は SQL ファイルを1つずつ実行するため、月末パック（ダッシュボード、
+term 別の2つのビュー、簿価集計サマリ）は1本ずつ結果を待つことになる。ここではマニフェスト（JSON）に並べた
+SQL を最大 --jobs 件まで同時に実行し、取得したページから順にクエリごとのファイルへ書き出す。
+終わったクエリから 行数・最初の結果が届くまでの時間・完了までの時間 を表示する。
+
+マニフェストの例（sql / output / page_dir はマニフェストからの相対パス。output の省略時は output_dir/name.形式）:
+{
+  "output_dir": "month_end_202511",
+  "format": "xlsx",
+  "queries": [
+    {"name": "dashboard", "sql": "../sql/stagnant_inventory_dashboard_v4.sql"},
+    {"name": "leftover_by_term", "sql": "../sql/stagnant_inventory_v4_leftover_by_term.sql"},
+    {"name": "products_by_term", "sql": "../sql/stagnant_inventory_v4_products_by_term.sql"},
+    {"name": "valuation_summary", "sql": "../sql/select_stock_valuation_summary.sql", "format": "csv"}
+  ]
+}
+
+出力形式: xlsx（シート名は name、行数上限でシート分割）/ csv（utf-8-sig）/ parquet / arrow
+書き終えてからファイルを置き換えるため、失敗したクエリは前回の出力が残る。
+
+BigQuery に接続できない環境では、--backend bq-cli --bq-cmd に bq の代わりのコマンド
+（標準入力の SQL を受け取り、結果の CSV を標準出力に書くスクリプト）を指定するか、
+--backend files でクエリごとのページファイル（page_dir、省略時は --page-dir/name）を読ませて動作を確認できる。
+
+使用方法:
+    python export_pack.py month_end.json [--jobs 3] [--backend bigquery|bq-cli|files] [--refresh | --no-cache]
+    python export_pack.py month_end.json --backend bq-cli --bq-cmd ./fake_bq.sh --output-dir /tmp/pack
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pa_parquet
+except ImportError:
+    print("必要なパッケージをインストールしてください:")
+    print("  pip install pandas pyarrow openpyxl")
+    sys.exit(1)
+
+from export_to_excel import export_batches_to_excel
+from query_cache import CachedFetcher, add_cache_arguments, cache_options_from_args
+from query_fetcher import BACKENDS, BQ_CMD, DEFAULT_BACKEND, DEFAULT_WORKERS, make_fetcher
+
+
+OUTPUT_FORMATS = ("xlsx", "csv", "parquet", "arrow")
+DEFAULT_FORMAT = "xlsx"
+# 同時に実行するクエリ数の既定値（1クエリの中のページ取得も --workers で並列になる）
+DEFAULT_JOBS = 3
+
+
+def load_manifest(manifest_path, output_dir=None, output_format=None):
+    """マニフェストを読み、クエリごとの {name, sql, output, format, page_dir} のリストを返す
+
+    output_dir / output_format を指定するとマニフェストの output_dir / format より優先する
+    （クエリごとの output / format の指定はそのまま）。
+    """
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or not manifest.get("queries"):
+        raise ValueError(f"マニフェストに queries がありません: {manifest_path}")
+    base = manifest_path.parent
+    default_format = output_format or manifest.get("format", DEFAULT_FORMAT)
+    output_dir = Path(output_dir) if output_dir else base / manifest.get("output_dir", ".")
+
+    queries = []
+    for entry in manifest["queries"]:
+        if "sql" not in entry:
+            raise ValueError(f"sql の指定が無いクエリがあります: {entry}")
+        sql_path = base / entry["sql"]
+        if not sql_path.exists():
+            raise ValueError(f"SQLファイルが見つかりません: {sql_path}")
+        name = entry.get("name", sql_path.stem)
+        query_format = entry.get("format", default_format)
+        if query_format not in OUTPUT_FORMATS:
+            raise ValueError(f"{name} の出力形式が不明です: {query_format}（{' / '.join(OUTPUT_FORMATS)}）")
+        queries.append({
+            "name": name,
+            "sql": sql_path,
+            "output": base / entry["output"] if "output" in entry else output_dir / f"{name}.{query_format}",
+            "format": query_format,
+            "page_dir": base / entry["page_dir"] if "page_dir" in entry else None,
+        })
+    for key in ("name", "output"):
+        values = [str(query[key]) for query in queries]
+        duplicated = sorted({value for value in values if values.count(value) > 1})
+        if duplicated:
+            raise ValueError(f"マニフェストの {key} が重複しています: {', '.join(duplicated)}")
+    return queries
+
+
+def _write_arrow_batches(batches, output_file, output_format):
+    """レコードバッチを csv / parquet / arrow に書き出して行数を返す（最初のバッチの列構成でファイルを開く）"""
+    sink = writer = schema = None
+    rows = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                schema = batch.schema
+                sink, writer = _open_arrow_writer(output_file, output_format, schema)
+            if batch.schema.equals(schema):
+                writer.write_batch(batch)
+            else:
+                # ページ間で型が異なる列（全て NULL のページなど）は最初のページの型に揃える
+                writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+            rows += batch.num_rows
+        if writer is None:
+            sink, writer = _open_arrow_writer(output_file, output_format, pa.schema([]))
+    finally:
+        for resource in (writer, sink):
+            if resource is not None:
+                resource.close()
+    return rows
+
+
+def _open_arrow_writer(output_file, output_format, schema):
+    if output_format == "parquet":
+        return None, pa_parquet.ParquetWriter(str(output_file), schema)
+    if output_format == "csv":
+        sink = open(output_file, "wb")
+        sink.write(b"\xef\xbb\xbf")  # Excel で文字化けしないよう BOM 付き
+        return sink, pa_csv.CSVWriter(sink, schema)
+    sink = pa.OSFile(str(output_file), "wb")
+    return sink, pa.ipc.new_file(sink, schema)
+
+
+def write_batches(batches, output_file, output_format, sheet_name="Sheet1"):
+    """レコードバッチを受け取った順に output_format のファイルへ書き出し、行数を返す"""
+    if output_format == "xlsx":
+        rows, _ = export_batches_to_excel(batches, str(output_file), sheet_name)
+        return rows
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不明な出力形式です: {output_format}")
+    return _write_arrow_batches(batches, output_file, output_format)
+
+
+def run_query(query, fetcher):
+    """1つのクエリを実行して出力し、結果を返す（失敗は例外にせず error に入れる）
+
+    結果: name, output, rows, first_batch_seconds（最初のページが届くまで）, seconds（書き出し完了まで）,
+    cache_hit（CachedFetcher を使った場合）, error
+    """
+    start_time = time.perf_counter()
+    result = {"name": query["name"], "output": str(query["output"]), "rows": 0,
+              "first_batch_seconds": None, "seconds": None, "cache_hit": None, "error": None}
+
+    def timed(batches):
+        for batch in batches:
+            if result["first_batch_seconds"] is None:
+                result["first_batch_seconds"] = time.perf_counter() - start_time
+            yield batch
+
+    output = Path(query["output"])
+    temp_path = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+    try:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        sql = Path(query["sql"]).read_text(encoding="utf-8")
+        result["rows"] = write_batches(timed(fetcher.fetch_batches(sql)), temp_path, query["format"], query["name"])
+        os.replace(temp_path, output)
+    except (OSError, RuntimeError, ValueError, pa.ArrowException) as e:
+        result["error"] = str(e).strip()
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+    result["seconds"] = time.perf_counter() - start_time
+    result["cache_hit"] = getattr(fetcher, "last_hit", None)
+    return result
+
+
+def run_manifest(queries, fetchers, jobs=DEFAULT_JOBS, on_complete=None):
+    """最大 jobs 件のクエリを同時に実行し、終わった順に on_complete(結果) を呼ぶ
+
+    fetchers はクエリごとの取得クラス（CachedFetcher は直前の実行の last_hit を持つため、クエリごとに別のものを渡す）。
+    戻り値は queries と同じ順の結果のリスト。
+    """
+    if jobs < 1:
+        raise ValueError(f"同時に実行するクエリ数は1以上で指定してください: {jobs}")
+    results = [None] * len(queries)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(run_query, query, fetcher): index for index, (query, fetcher) in enumerate(zip(queries, fetchers))}
+        for future in as_completed(futures):
+            result = results[futures[future]] = future.result()
+            if on_complete is not None:
+                on_complete(result)
+    return results
+
+
+def print_result(result):
+    if result["error"]:
+        print(f"[失敗] {result['name']}: {result['error']}（{result['seconds']:.1f}秒）")
+        return
+    first_batch = "-" if result["first_batch_seconds"] is None else f"{result['first_batch_seconds']:.1f}秒"
+    cache_note = "（キャッシュ）" if result["cache_hit"] else ""
+    print(f"[完了] {result['name']}: {result['rows']:,} 件  最初の結果まで {first_batch} / "
+          f"完了まで {result['seconds']:.1f}秒{cache_note} → {result['output']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="マニフェストのSQLを同時に実行し、クエリごとのファイルに出力します")
+    parser.add_argument("manifest", help="マニフェスト（JSON）")
+    parser.add_argument("--output-dir", help="出力先ディレクトリ（マニフェストの output_dir より優先）")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="出力形式（マニフェストの format より優先）")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="同時に実行するクエリ数")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="クエリ結果の取得方法")
+    parser.add_argument("--bq-cmd", default=BQ_CMD, help="bq-cli バックエンドで実行するコマンド（手元での確認用の代わりのコマンドも可）")
+    parser.add_argument("--page-dir", help="files バックエンドでページファイルを読むディレクトリ（その下の クエリ名/ を読む）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="1クエリのページを並列に取得するスレッド数")
+    add_cache_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs は1以上で指定してください")
+
+    try:
+        queries = load_manifest(args.manifest, args.output_dir, args.format)
+        cache_options = cache_options_from_args(args)
+        fetchers = []
+        for query in queries:
+            page_dir = query["page_dir"] or (Path(args.page_dir) / query["name"] if args.page_dir else None)
+            fetcher = make_fetcher(args.backend, page_dir, args.workers, bq_cmd=args.bq_cmd)
+            if cache_options is not None:
+                fetcher = CachedFetcher(fetcher, **cache_options)
+            fetchers.append(fetcher)
+    except (OSError, ValueError) as e:
+        print(f"処理エラー: {e}")
+        return 1
+
+    print(f"{len(queries)} 件のクエリを最大 {min(args.jobs, len(queries))} 件ずつ同時に実行します")
+    start_time = time.perf_counter()
+    results = run_manifest(queries, fetchers, args.jobs, print_result)
+    elapsed = time.perf_counter() - start_time
+
+    failed = [result["name"] for result in results if result["error"]]
+    total_seconds = sum(result["seconds"] for result in results)
+    print(f"全体 {elapsed:.1f}秒（各クエリの時間の合計 {total_seconds:.1f}秒）")
+    if failed:
+        print(f"失敗したクエリ: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,30 +3,37 @@
 BigQueryクエリ結果をExcelファイルに出力するツール
 
 使用方法:
-    python export_to_excel.py <SQLファイルパス> [出力ファイルパス]
+    python export_to_excel.py <SQLファイルパス> [出力ファイルパス] [--backend bigquery|bq-cli|files] [--page-dir DIR] [--refresh | --no-cache]
 
 例:
     python export_to_excel.py ../sql/select_stock_valuation_summary.sql
     python export_to_excel.py ../sql/select_stock_valuation_summary.sql output.xlsx
+    python export_to_excel.py ../sql/select_stock_valuation_summary.sql --backend files --page-dir pages/
+    python export_to_excel.py ../sql/select_stock_valuation_summary.sql --refresh   # キャッシュを使わず再実行
 """
 
 import sys
 import os
-import subprocess
-import tempfile
+import argparse
 from pathlib import Path
 from datetime import datetime
 
 try:
-    import pandas as pd
+    # Excel は streaming_xlsx で直接書き出すため openpyxl は不要（pandas / numpy / pyarrow を使う）
+    from query_cache import CachedFetcher, add_cache_arguments, cache_options_from_args
+    from query_fetcher import BACKENDS, DEFAULT_BACKEND, DEFAULT_WORKERS, batch_to_dataframe, make_fetcher
+    from streaming_xlsx import StreamingXlsxWriter, amount_column_formats
 except ImportError:
     print("必要なパッケージをインストールしてください:")
-    print("  pip install pandas openpyxl")
+    print("  pip install pandas pyarrow")
     sys.exit(1)
 
 
-def run_query_and_export(sql_file: str, output_file: str = None):
-    """SQLファイルを実行してExcelに出力"""
+def run_query_and_export(sql_file: str, output_file: str = None, fetcher=None):
+    """SQLファイルを実行してExcelに出力
+
+    fetcher: クエリ結果の取得方法（query_fetcher.make_fetcher で作成、省略時は既定のバックエンド）
+    """
 
     # SQLファイル読み込み
     sql_path = Path(sql_file)
@@ -36,48 +43,27 @@ def run_query_and_export(sql_file: str, output_file: str = None):
 
     print(f"SQLファイル: {sql_path.name}")
     print("BigQueryでクエリ実行中...")
-
-    # 一時CSVファイルを作成
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, encoding='utf-8') as tmp:
-        tmp_csv = tmp.name
-
-    try:
-        # bqコマンドでCSV出力（ファイルから読み込み、ファイルへ出力）
-        bq_cmd = r"C:\Users\User\AppData\Local\Google\Cloud SDK\google-cloud-sdk\bin\bq.cmd"
-
-        # コマンドを文字列で構築
-        cmd = f'"{bq_cmd}" query --use_legacy_sql=false --format=csv --max_rows=1000000 < "{sql_path.absolute()}" > "{tmp_csv}"'
-
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            shell=True
-        )
-
-        if result.returncode != 0:
-            print(f"エラー: bqコマンド失敗 (code={result.returncode})")
-            print(f"stderr: {result.stderr}")
-            sys.exit(1)
-
-        # CSVを読み込み
-        df = pd.read_csv(tmp_csv, encoding='utf-8')
-
-    finally:
-        # 一時ファイル削除
-        if os.path.exists(tmp_csv):
-            os.remove(tmp_csv)
-
-    print(f"取得件数: {len(df):,} 件")
+    if fetcher is None:
+        fetcher = make_fetcher()
 
     # 出力ファイル名の決定
     if output_file is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_file = f"{sql_path.stem}_{timestamp}.xlsx"
 
-    # Excelに保存
+    # 取得したページから順にExcelへ書き出す（全件をメモリに載せない）
     print(f"Excelファイル出力中: {output_file}")
-    df.to_excel(output_file, index=False, engine="openpyxl")
+    try:
+        rows, sheet_names = export_batches_to_excel(fetcher.fetch_batches(sql_path.read_text(encoding="utf-8")), output_file)
+    except (RuntimeError, ValueError) as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+
+    print(f"取得件数: {rows:,} 件")
+    if getattr(fetcher, "last_hit", False):
+        print("（キャッシュ済みの結果を使用しました。再実行するには --refresh）")
+    if len(sheet_names) > 1:
+        print(f"1シートの行数上限を超えたため {len(sheet_names)} シートに分割しました: {', '.join(sheet_names)}")
 
     abs_path = Path(output_file).absolute()
     print(f"完了: {abs_path}")
@@ -86,12 +72,34 @@ def run_query_and_export(sql_file: str, output_file: str = None):
     return str(abs_path)
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(__doc__)
-        sys.exit(1)
+def export_batches_to_excel(batches, output_file: str, sheet_name: str = "Sheet1"):
+    """レコードバッチを受け取った順に Excel に書き出し、(行数, シート名の一覧) を返す
 
-    sql_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
+    DATE 列は日付として、金額列は桁区切りで書き出す。
+    """
+    with StreamingXlsxWriter(output_file, sheet_name) as writer:
+        for batch in batches:
+            if writer.rows_written == 0:
+                writer.column_formats.update(amount_column_formats(batch.schema.names))
+            writer.write(batch_to_dataframe(batch))
+    return writer.rows_written, writer.sheet_names
 
-    run_query_and_export(sql_file, output_file)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BigQueryクエリ結果をExcelファイルに出力します")
+    parser.add_argument("sql_file", help="SQLファイルパス")
+    parser.add_argument("output_file", nargs="?", help="出力ファイルパス（省略時は SQLファイル名_日時.xlsx）")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="クエリ結果の取得方法")
+    parser.add_argument("--page-dir", help="files バックエンドで読むページファイルのディレクトリ")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="ページを並列に取得するスレッド数")
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        fetcher = make_fetcher(args.backend, args.page_dir, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    cache_options = cache_options_from_args(args)
+    if cache_options is not None:
+        fetcher = CachedFetcher(fetcher, **cache_options)
+    run_query_and_export(args.sql_file, args.output_file, fetcher)
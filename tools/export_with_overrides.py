@@ -5,6 +5,10 @@ BigQuery簿価計算結果をExcelに出力（イレギュラー修正対応版
 使用方法:
     1. overrides.json に修正内容を記載
     2. python export_with_overrides.py を実行
+       （期間とSQLが同じなら前回のクエリ結果をキャッシュから使う。再実行するには --refresh）
+
+    大量の修正は CSV / JSON の修正表でまとめて指定できる（在庫ID 列 + 上書きするカラム）:
+        python export_with_overrides.py --override-file ../data/202512_temp/sold_20260114.csv
 
 overrides.json の例:
 {
@@ -22,6 +26,11 @@ overrides.json の例:
       "在庫ID": 67890,
       "期末簿価": 50000,
       "コメント": "簿価を5万円に修正"
+    },
+    {
+      "在庫ID": 24680,
+      "除売却日": null,
+      "コメント": "売却の取り消し（null は空欄にする）"
     }
   ]
 }
@@ -36,24 +45,27 @@ overrides.json の例:
 import sys
 import os
 import json
-import subprocess
-import tempfile
+import argparse
 from pathlib import Path
 from datetime import datetime
 
 try:
+    import numpy as np
     import pandas as pd
 except ImportError:
     print("必要なパッケージをインストールしてください:")
     print("  pip install pandas openpyxl")
     sys.exit(1)
 
+from query_cache import CachedFetcher, add_cache_arguments, cache_options_from_args
+from query_fetcher import BACKENDS, DEFAULT_BACKEND, DEFAULT_WORKERS, fetch_dataframe, make_fetcher
+from streaming_xlsx import amount_column_formats, infer_date_columns, parse_date_columns, write_excel_streaming
+
 
 # 設定
 SCRIPT_DIR = Path(__file__).parent
 SQL_FILE = SCRIPT_DIR / "../sql/select_stock_valuation_summary.sql"
 OVERRIDES_FILE = SCRIPT_DIR / "overrides.json"
-BQ_CMD = r"C:\Users\User\AppData\Local\Google\Cloud SDK\google-cloud-sdk\bin\bq.cmd"
 
 
 def load_overrides():
@@ -98,72 +110,194 @@ def build_query(config):
     return sql
 
 
-def apply_overrides(df, config):
-    """修正をDataFrameに適用"""
-    overrides = config.get("修正", [])
-
-    if not overrides:
-        print("修正なし")
-        return df
-
-    print(f"修正件数: {len(overrides)} 件")
-
-    for override in overrides:
-        stock_id = override.get("在庫ID")
-        if stock_id is None:
+OVERRIDE_KEY = "在庫ID"
+OVERRIDE_SKIP_COLUMNS = ("在庫ID", "コメント")
+REPORT_SAMPLE_SIZE = 20
+# JSON の null（キーあり）は「空欄にする」修正。CSV の空欄・キーなしは上書きしないため区別する
+OVERRIDE_CLEAR = object()
+
+
+def override_records_frame(records):
+    """JSON の修正リストを DataFrame にする（null の値は OVERRIDE_CLEAR に置き換える）"""
+    return pd.DataFrame.from_records([
+        {col: OVERRIDE_CLEAR if value is None and col not in OVERRIDE_SKIP_COLUMNS else value for col, value in record.items()}
+        for record in records
+    ])
+
+
+def load_override_table(path):
+    """修正表（JSON または CSV）を DataFrame として読み込む
+
+    JSON: 修正のリスト、または overrides.json と同じ {"修正": [...]} 形式。null は空欄にする修正
+    CSV : 1行目がカラム名（在庫ID と上書きするカラム）。値は文字列のまま読み、適用時に型を揃える（空欄は上書きしない）
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        if isinstance(records, dict):
+            records = records.get("修正", [])
+        table = override_records_frame(records)
+    elif path.suffix.lower() == ".csv":
+        table = pd.read_csv(path, dtype=str, encoding="utf-8-sig")
+    else:
+        raise ValueError(f"修正表は .json か .csv を指定してください: {path}")
+
+    # 列名の前後の空白と 在庫id / 在庫ID の表記ゆれを揃える
+    table.columns = [str(col).strip() for col in table.columns]
+    table = table.rename(columns={col: OVERRIDE_KEY for col in table.columns if col.casefold() == OVERRIDE_KEY.casefold()})
+    if OVERRIDE_KEY not in table.columns:
+        raise ValueError(f"修正表に {OVERRIDE_KEY} 列がありません: {path}")
+    return table
+
+
+def coerce_override_values(values, target):
+    """修正値を上書き先カラムの型に揃える（変換できない値は欠損になる）"""
+    if pd.api.types.is_datetime64_any_dtype(target):
+        return pd.to_datetime(values, errors="coerce")
+    if pd.api.types.is_bool_dtype(target):
+        text = values.astype(str).str.strip().str.lower()
+        return text.map({"true": True, "1": True, "false": False, "0": False})
+    if pd.api.types.is_numeric_dtype(target):
+        return pd.to_numeric(values, errors="coerce")
+    return values.where(values.isna(), values.astype(str))
+
+
+def apply_override_table(df, overrides):
+    """修正表を在庫IDで突き合わせ、カラムごとに1回でまとめて上書きする
+
+    overrides: 在庫ID 列と上書きするカラムを持つ DataFrame（欠損は上書きしない。OVERRIDE_CLEAR は空欄にする）。
+    同じ在庫IDが複数行あれば、カラムごとに後の行の値（空欄にする修正を含む）を優先する。
+    戻り値: (上書き後の DataFrame, 集計レポート dict)
+    """
+    report = {
+        "overrides": len(overrides),
+        "matched_ids": 0,
+        "unmatched_ids": [],
+        "invalid_ids": [],
+        "unknown_columns": [],
+        "updated_cells": {},
+        "cleared_cells": {},
+        "invalid_values": {},
+    }
+    if overrides.empty or OVERRIDE_KEY not in overrides.columns:
+        return df, report
+
+    # 在庫IDを台帳側の型に揃え、重複は後勝ちにする
+    keys = overrides[OVERRIDE_KEY]
+    if pd.api.types.is_numeric_dtype(df[OVERRIDE_KEY]):
+        raw_keys = keys
+        keys = pd.to_numeric(keys.map(lambda value: value.strip() if isinstance(value, str) else value), errors="coerce")
+        # 数値にならない在庫ID（'12a' など）は突き合わせられないため、元の値を報告する
+        report["invalid_ids"] = raw_keys[raw_keys.notna() & keys.isna()].tolist()
+    else:
+        keys = keys.astype(str)
+    overrides = overrides.assign(**{OVERRIDE_KEY: keys}).dropna(subset=[OVERRIDE_KEY])
+    overrides = overrides.groupby(OVERRIDE_KEY, sort=False).last().reset_index()
+    if overrides.empty:
+        return df, report
+
+    # 台帳の各行が何番目の修正に当たるか（該当なしは -1）。台帳側に同じIDが複数あればすべて上書きする
+    override_index = pd.Index(overrides[OVERRIDE_KEY])
+    positions = override_index.get_indexer(df[OVERRIDE_KEY])
+    matched_rows = positions >= 0
+    matched_ids = override_index.isin(df[OVERRIDE_KEY])
+    report["matched_ids"] = int(matched_ids.sum())
+    report["unmatched_ids"] = overrides.loc[~matched_ids, OVERRIDE_KEY].tolist()
+
+    for col in overrides.columns:
+        if col in OVERRIDE_SKIP_COLUMNS:
             continue
-
-        # 該当行を検索
-        mask = df["在庫ID"] == stock_id
-        if not mask.any():
-            print(f"  警告: 在庫ID {stock_id} が見つかりません")
+        if col not in df.columns:
+            report["unknown_columns"].append(col)
             continue
+        given = overrides[col]
+        is_clear = given.map(lambda value: value is OVERRIDE_CLEAR).to_numpy(dtype=bool)
+        if is_clear.any():
+            given = given.mask(is_clear)
+        values = coerce_override_values(given, df[col])
+        invalid = given.notna() & values.isna()
+        if invalid.any():
+            report["invalid_values"][col] = int(invalid.sum())
+
+        # 台帳の行に合わせて並べ、値のある行だけ上書き・空欄にする修正の行は欠損にする
+        row_positions = np.where(matched_rows, positions, 0)
+        aligned = pd.Series(values.to_numpy()[row_positions], index=df.index)
+        update = matched_rows & aligned.notna().to_numpy()
+        clear = matched_rows & is_clear[row_positions]
+        if clear.any():
+            df[col] = df[col].mask(clear)
+            report["cleared_cells"][col] = int(clear.sum())
+        if not update.any():
+            continue
+        new_values = aligned[update]
+        if pd.api.types.is_integer_dtype(df[col]) and (new_values % 1 == 0).all():
+            # 整数のまま上書きできる場合は float に広げない
+            column = df[col].to_numpy(copy=True)
+            column[update] = new_values.to_numpy().astype(column.dtype)
+            df[col] = column
+        else:
+            df[col] = df[col].mask(update, aligned)
+        report["updated_cells"][col] = int(update.sum())
+
+    return df, report
+
+
+def print_override_report(report):
+    """apply_override_table の集計レポートを表示"""
+    print(f"修正件数: {report['overrides']:,} 件（該当 {report['matched_ids']:,} 件）")
+    for col, count in report["updated_cells"].items():
+        print(f"  {col}: {count:,} 行を上書き")
+    for col, count in report["cleared_cells"].items():
+        print(f"  {col}: {count:,} 行を空欄に")
+    if report["unmatched_ids"]:
+        sample = ", ".join(str(stock_id) for stock_id in report["unmatched_ids"][:REPORT_SAMPLE_SIZE])
+        more = " …" if len(report["unmatched_ids"]) > REPORT_SAMPLE_SIZE else ""
+        print(f"  警告: 見つからない在庫ID {len(report['unmatched_ids']):,} 件: {sample}{more}")
+    if report["invalid_ids"]:
+        sample = ", ".join(repr(stock_id) for stock_id in report["invalid_ids"][:REPORT_SAMPLE_SIZE])
+        more = " …" if len(report["invalid_ids"]) > REPORT_SAMPLE_SIZE else ""
+        print(f"  警告: 数値でない在庫ID {len(report['invalid_ids']):,} 件（無視）: {sample}{more}")
+    if report["unknown_columns"]:
+        print(f"  警告: 存在しないカラム（無視）: {', '.join(report['unknown_columns'])}")
+    for col, count in report["invalid_values"].items():
+        print(f"  警告: {col} の型に変換できない値 {count:,} 件（上書きしません）")
+
+
+def apply_overrides(df, config, override_table=None):
+    """修正をDataFrameに適用
+
+    config["修正"] と override_table（load_override_table で読み込んだ修正表）を合わせて適用する。
+    同じ在庫ID・カラムの修正があれば修正表を優先する。
+    """
+    overrides = override_records_frame(config.get("修正", []))
+    if override_table is not None:
+        overrides = pd.concat([overrides, override_table], ignore_index=True)
+
+    if overrides.empty:
+        print("修正なし")
+        return df
 
-        # 各カラムを上書き
-        for col, val in override.items():
-            if col in ["在庫ID", "コメント"]:
-                continue
-            if col in df.columns:
-                df.loc[mask, col] = val
-                print(f"  在庫ID {stock_id}: {col} = {val}")
-            else:
-                print(f"  警告: カラム '{col}' が存在しません")
-
+    df, report = apply_override_table(df, overrides)
+    print_override_report(report)
     return df
 
 
-def run_bq_query(sql):
-    """BigQueryでクエリ実行"""
-    # 一時SQLファイルを作成
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.sql', delete=False, encoding='utf-8') as tmp:
-        tmp.write(sql)
-        tmp_sql = tmp.name
-
-    # 一時CSVファイル
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, encoding='utf-8') as tmp:
-        tmp_csv = tmp.name
-
+def run_bq_query(sql, fetcher=None):
+    """BigQueryでクエリ実行（fetcher は query_fetcher.make_fetcher で作成、省略時は既定のバックエンド）"""
     try:
-        cmd = f'"{BQ_CMD}" query --use_legacy_sql=false --format=csv --max_rows=1000000 < "{tmp_sql}" > "{tmp_csv}"'
-
-        result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
-
-        if result.returncode != 0:
-            print(f"エラー: bqコマンド失敗")
-            print(result.stderr)
-            return None
-
-        # CSVを読み込み
-        df = pd.read_csv(tmp_csv, encoding='utf-8')
-        return df
-
-    finally:
-        for f in [tmp_sql, tmp_csv]:
-            if os.path.exists(f):
-                os.remove(f)
-
-
-def main():
+        if fetcher is None:
+            fetcher = make_fetcher()
+        return fetch_dataframe(fetcher, sql)
+    except (RuntimeError, ValueError) as e:
+        print(f"エラー: {e}")
+        return None
+
+
+def main(fetcher=None, cache_options=None, override_files=()):
+    """cache_options: CachedFetcher の引数（None ならキャッシュしない）
+    override_files: overrides.json に加えて適用する修正表（.json / .csv）
+    """
     print("=" * 60)
     print("簿価計算 Excel出力ツール（イレギュラー修正対応版）")
     print("=" * 60)
@@ -175,30 +309,46 @@ def main():
     period = config.get("期間", {})
     print(f"   期間: {period.get('start_date')} 〜 {period.get('end_date')}")
 
+    override_table = None
+    if override_files:
+        try:
+            override_table = pd.concat([load_override_table(path) for path in override_files], ignore_index=True)
+        except (OSError, ValueError) as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+        print(f"   修正表: {len(override_table):,} 行（{', '.join(Path(path).name for path in override_files)}）")
+
     # SQL生成
     print("\n2. SQL生成...")
     sql = build_query(config)
 
-    # BigQuery実行
+    # BigQuery実行（期間をキャッシュのキーに含める）
     print("\n3. BigQuery実行中...")
-    df = run_bq_query(sql)
+    if cache_options is not None:
+        fetcher = CachedFetcher(fetcher if fetcher is not None else make_fetcher(), params=period, **cache_options)
+    df = run_bq_query(sql, fetcher)
 
     if df is None:
         print("クエリ実行に失敗しました")
         sys.exit(1)
 
     print(f"   取得件数: {len(df):,} 件")
+    if getattr(fetcher, "last_hit", False):
+        print("   （キャッシュ済みの結果を使用しました。再実行するには --refresh）")
 
     # 修正適用
     print("\n4. 修正適用...")
-    df = apply_overrides(df, config)
+    df = apply_overrides(df, config, override_table)
 
     # Excel出力
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_file = SCRIPT_DIR / f"簿価計算_{timestamp}.xlsx"
 
     print(f"\n5. Excel出力: {output_file.name}")
-    df.to_excel(output_file, index=False, engine="openpyxl")
+    df = parse_date_columns(df, infer_date_columns(df))
+    rows, sheet_names = write_excel_streaming(df, output_file, column_formats=amount_column_formats(df.columns))
+    if len(sheet_names) > 1:
+        print(f"   1シートの行数上限を超えたため {len(sheet_names)} シートに分割しました")
 
     print(f"\n完了: {output_file}")
     print(f"ファイルサイズ: {os.path.getsize(output_file) / 1024:.1f} KB")
@@ -207,4 +357,16 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="簿価計算結果をExcelに出力します（overrides.json の修正を反映）")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="クエリ結果の取得方法")
+    parser.add_argument("--page-dir", help="files バックエンドで読むページファイルのディレクトリ")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="ページを並列に取得するスレッド数")
+    parser.add_argument("--override-file", action="append", default=[], help="まとめて適用する修正表（.json / .csv、複数指定可）")
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        fetcher = make_fetcher(args.backend, args.page_dir, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    main(fetcher, cache_options_from_args(args), args.override_file)
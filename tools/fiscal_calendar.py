@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+会計期間の期末日と、滞留在庫の減損タームの判定
+
+滞留在庫ダッシュボード v4 の SQL では、quarter_ends で四半期末の候補日（2/28, 5/31, 8/31, 11/30 の2年分）を
+4回 UNNEST して term1〜term4 の期末日を求め、stock_with_category で
+DATE_ADD(retention_start_date, INTERVAL 365 DAY) <= termN_end の CASE を並べて判定している
+（2月末は以前 2/28 の固定値で、うるう年に2月29日にならなかった）。
+
+ここでは期末日を「期末月の月末日」として日付の演算で求め（うるう年も正しい）、
+滞留開始日から1年後の日付を [基準日, term1 末, term2 末, ...] に対して1回の searchsorted で分類する。
+python_book_value_logic.py（四半期の期間）と stock_allocation.py（ダッシュボードの再計算）で共用する。
+
+使用例:
+    ends = period_ends("2025-12-15", 4)                  # 2026-02-28, 2026-05-31, 2026-08-31, 2026-11-30
+    orders = classify_terms(retention_start_dates, "2025-12-15", ends, impairment_dates)
+    labels = term_labels(orders, len(ends))              # impaired / term1 / ... / term4_after
+"""
+
+import sys
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    print("必要なパッケージをインストールしてください:")
+    print("  pip install pandas numpy")
+    sys.exit(1)
+
+
+# 四半期末の月（ダッシュボードの quarter_ends と同じ 2月・5月・8月・11月）
+DEFAULT_QUARTER_END_MONTHS = (2, 5, 8, 11)
+DEFAULT_TERM_COUNT = 4
+# 滞留開始から減損するまでの日数（DATE_ADD(retention_start_date, INTERVAL 365 DAY)）
+RETENTION_DAYS = 365
+# stock_with_category の category_order（99 = 減損済み）
+IMPAIRED_ORDER = 99
+
+
+def _as_day(value):
+    return np.datetime64(pd.Timestamp(value).normalize().to_datetime64(), "D")
+
+
+def _as_days(values):
+    """日付の列を datetime64[D] の配列にする（欠損は NaT）"""
+    return pd.to_datetime(pd.Series(values), errors="coerce").to_numpy(dtype="datetime64[D]")
+
+
+def month_ends(values):
+    """各日付の月末日（datetime64[D]、うるう年の2月は29日）"""
+    months = np.asarray(values, dtype="datetime64[D]").astype("datetime64[M]")
+    return (months + 1).astype("datetime64[D]") - 1
+
+
+def period_ends(as_of, count=DEFAULT_TERM_COUNT, end_months=DEFAULT_QUARTER_END_MONTHS):
+    """as_of より後の期末日を count 個返す（期末月の月末日。end_months は 1〜12 の月）
+
+    quarter_ends の candidate_date > CURRENT_DATE() と同じく、as_of 当日が期末日なら次の期末から数える。
+    月次の期末なら end_months=range(1, 13)。
+    """
+    end_months = sorted({int(month) for month in end_months})
+    if not end_months or end_months[0] < 1 or end_months[-1] > 12:
+        raise ValueError(f"期末月は 1〜12 の月で指定してください: {end_months}")
+    if count <= 0:
+        return pd.DatetimeIndex([])
+    as_of = _as_day(as_of)
+    # as_of の月から、期末月が count 回現れるまでの月を並べる
+    first_month = as_of.astype("datetime64[M]")
+    months = first_month + np.arange(12 * (count // len(end_months) + 2))
+    months = months[np.isin(months.astype("int64") % 12 + 1, end_months)]
+    ends = month_ends(months.astype("datetime64[D]"))
+    return pd.DatetimeIndex(ends[ends > as_of][:count])
+
+
+def period_ranges(as_of, count=DEFAULT_TERM_COUNT, end_months=DEFAULT_QUARTER_END_MONTHS):
+    """period_ends の各期末日までの期間 (期首日, 期末日) のリスト（期首日は前の期末日の翌日）"""
+    ends = period_ends(as_of, count, end_months)
+    if len(ends) == 0:
+        return []
+    # 最初の期の期首日は、その前の期末日の翌日
+    previous_end = period_ends(ends[0] - pd.DateOffset(years=1), 12, end_months)
+    previous_end = previous_end[previous_end < ends[0]][-1]
+    starts = [previous_end + pd.Timedelta(days=1)] + [end + pd.Timedelta(days=1) for end in ends[:-1]]
+    return list(zip(starts, ends))
+
+
+def classify_terms(retention_start_dates, as_of, term_ends, impairment_dates=None, retention_days=RETENTION_DAYS):
+    """滞留開始日から減損タームの category_order（99 = 減損済み, 1〜len(term_ends)）を求める
+
+    stock_with_category の CASE と同じ:
+      減損損失日 <= as_of、または 滞留開始日 + retention_days <= as_of → 99
+      滞留開始日 + retention_days <= termN 末 → N（最後のタームは それ以降 をすべて含む: term4_after）
+    滞留開始日が欠損の在庫は（SQL の NULL 比較と同じく）最後のタームになる。
+    """
+    term_ends = np.asarray(pd.DatetimeIndex(term_ends), dtype="datetime64[D]")
+    if len(term_ends) == 0:
+        raise ValueError("期末日を1つ以上指定してください")
+    as_of = _as_day(as_of)
+    if np.any(np.diff(term_ends) <= np.timedelta64(0, "D")) or term_ends[0] <= as_of:
+        raise ValueError("期末日は基準日より後の昇順で指定してください")
+
+    due_dates = _as_days(retention_start_dates) + np.timedelta64(retention_days, "D")
+    # [as_of, term1 末, ..., term(N-1) 末] の中で 減損日 以上になる最初の境界の位置 = category_order（0 は減損済み）
+    boundaries = np.concatenate([[as_of], term_ends[:-1]])
+    orders = np.searchsorted(boundaries, due_dates, side="left")
+    orders = np.where(np.isnat(due_dates), len(term_ends), orders)
+    impaired = orders == 0
+    if impairment_dates is not None:
+        impairment_dates = _as_days(impairment_dates)
+        impaired |= ~np.isnat(impairment_dates) & (impairment_dates <= as_of)
+    return np.where(impaired, IMPAIRED_ORDER, orders).astype("int64")
+
+
+def term_labels(category_orders, term_count=DEFAULT_TERM_COUNT):
+    """category_order を stock_with_category の category 名（impaired / term1 / ... / termN_after）にする"""
+    names = np.array(["impaired"] + [f"term{n}" for n in range(1, term_count)] + [f"term{term_count}_after"], dtype=object)
+    orders = np.asarray(category_orders)
+    return names[np.where(orders == IMPAIRED_ORDER, 0, orders)]
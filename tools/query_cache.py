@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+クエリ結果のローカルキャッシュ
+
+期間が同じで overrides.json だけを直して再出力する場合など、同じクエリを何度も実行しないよう、
+取得した結果を Arrow IPC ファイルとして保存し、次回はそこから読み込む。
+
+- キーは 正規化したSQL（コメント・空白の違いを無視）＋ パラメータ ＋ 取得元 から決まる
+- 保存から ttl_seconds を過ぎた結果は使わない（次回の取得で置き換わる）
+- 合計サイズが max_bytes を超えたら、最終利用日時の古いものから削除する
+
+使用例:
+    fetcher = CachedFetcher(make_fetcher(), params={"start_date": "2025-03-01"})
+    for batch in fetcher.fetch_batches(sql):
+        ...
+    print("キャッシュを使用" if fetcher.last_hit else "クエリを実行")
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+import pyarrow as pa
+
+
+CACHE_SCHEMA_VERSION = 1
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "stock_valuation_queries"
+DEFAULT_TTL_SECONDS = 12 * 3600
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+CACHE_FILE_SUFFIX = ".arrow"
+
+# 文字列リテラル・識別子（そのまま残す） / コメントと空白の連続
+_SQL_TOKEN_PATTERN = re.compile(
+    r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)|((?:--[^\n]*|\#[^\n]*|/\*.*?\*/|\s)+)""",
+    re.DOTALL,
+)
+
+
+def normalize_sql(sql):
+    """コメントを除き、連続する空白を1つにしたSQL（文字列リテラル内は変えない）"""
+    def replace(match):
+        return match.group(1) if match.group(1) is not None else " "
+    return _SQL_TOKEN_PATTERN.sub(replace, sql).strip()
+
+
+def query_cache_key(sql, params=None, source=""):
+    """キャッシュのキー（正規化したSQL・パラメータ・取得元・キャッシュ形式から決まる）"""
+    settings = json.dumps({
+        "schema_version": CACHE_SCHEMA_VERSION,
+        "sql": normalize_sql(sql),
+        "params": params or {},
+        "source": source,
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+
+
+def _cached_at(cache_path):
+    """キャッシュファイルに記録した保存日時（UNIX時間）"""
+    with pa.memory_map(str(cache_path)) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return float(metadata.get(b"cached_at", 0))
+
+
+def evict_query_cache(cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS, keep=()):
+    """期限切れのキャッシュを削除し、合計サイズが max_bytes 以下になるまで最終利用日時の古いものから削除する"""
+    now = time.time()
+    entries = []
+    for path in Path(cache_dir).glob(f"*{CACHE_FILE_SUFFIX}"):
+        if path in keep:
+            continue
+        try:
+            if now - _cached_at(path) > ttl_seconds:
+                path.unlink()
+                continue
+            stat = path.stat()
+        except (OSError, pa.ArrowException):
+            continue  # 他プロセスが書き込み・削除中など
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total_bytes = sum(size for _, size, _ in entries) + sum(path.stat().st_size for path in keep if path.exists())
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            path.unlink()
+            total_bytes -= size
+        except OSError:
+            pass
+
+
+class CachedFetcher:
+    """query_fetcher の取得クラスを包み、結果をキャッシュする
+
+    params: SQLに埋め込んだパラメータ（期間など）。キーの一部になる。
+    refresh: True ならキャッシュを使わずにクエリを実行し、結果を保存し直す。
+    last_hit: 直前の fetch_batches でキャッシュを使ったか（未実行なら None）。
+    """
+
+    def __init__(self, fetcher, cache_dir=DEFAULT_CACHE_DIR, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_bytes=DEFAULT_CACHE_MAX_BYTES, params=None, refresh=False):
+        self.fetcher = fetcher
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.params = params or {}
+        self.refresh = refresh
+        self.last_hit = None
+
+    def _source(self):
+        # 取得元の違い（bigquery / files のディレクトリ等）で結果が変わるためキーに含める
+        return f"{type(self.fetcher).__name__}:{getattr(self.fetcher, 'page_dir', '')}"
+
+    def cache_path(self, sql):
+        return self.cache_dir / (query_cache_key(sql, self.params, self._source()) + CACHE_FILE_SUFFIX)
+
+    def _read_cached(self, cache_path):
+        """有効なキャッシュがあれば Arrow テーブルを返す（無い・期限切れ・壊れている場合は None）"""
+        if self.refresh or not cache_path.exists():
+            return None
+        try:
+            with pa.memory_map(str(cache_path)) as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (OSError, pa.ArrowException) as e:
+            print(f"キャッシュ読み込みエラー（クエリを実行します）: {e}")
+            return None
+        if time.time() - float((table.schema.metadata or {}).get(b"cached_at", 0)) > self.ttl_seconds:
+            return None
+        os.utime(cache_path)  # 最終利用日時を更新（古いものから削除するため）
+        return table
+
+    def fetch_batches(self, sql):
+        cache_path = self.cache_path(sql)
+        table = self._read_cached(cache_path)
+        if table is not None:
+            self.last_hit = True
+            yield from table.to_batches()
+            return
+
+        # 取得しながら一時ファイルに書き、最後まで取得できたら置き換える（途中で止まった結果は保存しない）
+        self.last_hit = False
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        sink = writer = None
+        cacheable = True
+        try:
+            for batch in self.fetcher.fetch_batches(sql):
+                if cacheable:
+                    try:
+                        if writer is None:
+                            schema = batch.schema.with_metadata({**(batch.schema.metadata or {}), b"cached_at": str(time.time()).encode()})
+                            sink = pa.OSFile(str(temp_path), "wb")
+                            writer = pa.ipc.new_file(sink, schema)
+                        writer.write_batch(batch)
+                    except (OSError, pa.ArrowException) as e:
+                        # ページ間で列の型が異なる等。結果はそのまま返し、保存だけ諦める
+                        print(f"キャッシュ書き込みエラー: {e}")
+                        cacheable = False
+                yield batch
+            if cacheable and writer is not None:
+                writer.close()
+                sink.close()
+                writer = sink = None
+                os.replace(temp_path, cache_path)
+                evict_query_cache(self.cache_dir, self.max_bytes, self.ttl_seconds, keep=(cache_path,))
+        finally:
+            for resource in (writer, sink):
+                if resource is not None:
+                    try:
+                        resource.close()
+                    except (OSError, pa.ArrowException):
+                        pass
+            if temp_path.exists():
+                temp_path.unlink()
+
+
+def add_cache_arguments(parser):
+    """キャッシュ関連のコマンドライン引数を追加する"""
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="クエリ結果のキャッシュを置くディレクトリ")
+    parser.add_argument("--cache-ttl-hours", type=float, default=DEFAULT_TTL_SECONDS / 3600, help="キャッシュの有効期間（時間）")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_CACHE_MAX_BYTES / 1024 ** 2, help="キャッシュの合計サイズ上限（MB）")
+    parser.add_argument("--refresh", action="store_true", help="キャッシュを使わずにクエリを実行し、結果を保存し直す")
+    parser.add_argument("--no-cache", action="store_true", help="キャッシュを読み書きしない")
+
+
+def cache_options_from_args(args):
+    """add_cache_arguments の引数から CachedFetcher の引数を作る（--no-cache なら None）"""
+    if args.no_cache:
+        return None
+    return {
+        "cache_dir": args.cache_dir,
+        "ttl_seconds": args.cache_ttl_hours * 3600,
+        "max_bytes": int(args.cache_max_mb * 1024 ** 2),
+        "refresh": args.refresh,
+    }
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+クエリ結果の取得（Arrow のレコードバッチをページ単位で返す）
+
+bq コマンドで CSV に書き出して pd.read_csv で読み直すと、数値・日付がすべて文字列を経由し、
+全件がディスクとメモリに1回ずつ載る。ここではクエリ結果をページ（行の連続範囲）ごとに
+Arrow のレコードバッチとして取得し、DataFrame や Excel 出力へそのまま渡す。
+
+取得方法（バックエンド）:
+    bigquery : google-cloud-bigquery でクエリを実行し、結果テーブルのページを並列に取得する
+    bq-cli   : 従来どおり bq コマンドで CSV に書き出し、pyarrow で型付きで読み込む
+    files    : ディレクトリ内のページファイル（.arrow / .parquet / .csv）を名前順に返す
+               （BigQuery に接続できない環境での動作確認用。record_pages で実際の結果を保存できる）
+
+使用例:
+    fetcher = make_fetcher("files", page_dir="pages/")
+    for batch in fetcher.fetch_batches(sql):
+        writer.write(batch_to_dataframe(batch))
+"""
+
+import collections
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pa_parquet
+except ImportError:
+    print("必要なパッケージをインストールしてください:")
+    print("  pip install pandas pyarrow")
+    sys.exit(1)
+
+try:
+    from google.cloud import bigquery
+except ImportError:  # 無い場合は bq-cli / files のみ使用可能
+    bigquery = None
+
+
+BQ_CMD = r"C:\Users\User\AppData\Local\Google\Cloud SDK\google-cloud-sdk\bin\bq.cmd"
+DEFAULT_PAGE_ROWS = 100_000
+DEFAULT_WORKERS = 4
+PAGE_FILE_SUFFIXES = (".arrow", ".parquet", ".csv")
+BACKENDS = ("bigquery", "bq-cli", "files")
+DEFAULT_BACKEND = "bigquery" if bigquery is not None else "bq-cli"
+
+
+def _ordered_parallel(load, keys, workers):
+    """keys の順に load(key) の結果を返す（スレッドで並列に取得し、先読みは workers * 2 件まで）"""
+    keys = iter(keys)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque(executor.submit(load, key) for key in itertools.islice(keys, workers * 2))
+        while pending:
+            result = pending.popleft().result()
+            for key in itertools.islice(keys, 1):
+                pending.append(executor.submit(load, key))
+            yield result
+
+
+class BigQueryFetcher:
+    """google-cloud-bigquery でクエリを実行し、結果テーブルを page_rows 行ずつ並列に取得する"""
+
+    def __init__(self, project=None, page_rows=DEFAULT_PAGE_ROWS, workers=DEFAULT_WORKERS):
+        if bigquery is None:
+            raise ValueError("bigquery バックエンドには google-cloud-bigquery が必要です（pip install google-cloud-bigquery）")
+        self.client = bigquery.Client(project=project)
+        self.page_rows = page_rows
+        self.workers = workers
+
+    def fetch_batches(self, sql):
+        job = self.client.query(sql)
+        job.result()
+        table = self.client.get_table(job.destination)
+        total_rows = table.num_rows
+
+        def load_page(start_index):
+            rows = self.client.list_rows(table, start_index=start_index, max_results=self.page_rows, page_size=self.page_rows)
+            return rows.to_arrow(create_bqstorage_client=False)
+
+        # 0件でも列構成を返すため、最低1ページは取得する
+        starts = range(0, max(total_rows, 1), self.page_rows)
+        for page in _ordered_parallel(load_page, starts, self.workers):
+            yield from page.to_batches()
+
+
+class BqCliFetcher:
+    """bq コマンドで CSV に書き出し、pyarrow で型付きで読み込む（google-cloud-bigquery が無い環境向け）"""
+
+    def __init__(self, bq_cmd=BQ_CMD, max_rows=1_000_000):
+        self.bq_cmd = bq_cmd
+        self.max_rows = max_rows
+
+    def fetch_batches(self, sql):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".sql", delete=False, encoding="utf-8") as tmp:
+            tmp.write(sql)
+            tmp_sql = tmp.name
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".csv", delete=False, encoding="utf-8") as tmp:
+            tmp_csv = tmp.name
+        try:
+            cmd = f'"{self.bq_cmd}" query --use_legacy_sql=false --format=csv --max_rows={self.max_rows} < "{tmp_sql}" > "{tmp_csv}"'
+            result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"bqコマンド失敗 (code={result.returncode}): {result.stderr}")
+            table = pa_csv.read_csv(tmp_csv)
+        finally:
+            for path in (tmp_sql, tmp_csv):
+                if os.path.exists(path):
+                    os.remove(path)
+        yield from table.to_batches(max_chunksize=DEFAULT_PAGE_ROWS)
+
+
+class FileFetcher:
+    """page_dir 内のページファイルを名前順に返す（SQL は実行しない）"""
+
+    def __init__(self, page_dir, workers=DEFAULT_WORKERS):
+        self.page_dir = Path(page_dir)
+        self.workers = workers
+
+    def page_files(self):
+        if not self.page_dir.is_dir():
+            raise ValueError(f"ページファイルのディレクトリが見つかりません: {self.page_dir}")
+        files = sorted(path for path in self.page_dir.iterdir() if path.suffix.lower() in PAGE_FILE_SUFFIXES)
+        if not files:
+            raise ValueError(f"ページファイル（{' / '.join(PAGE_FILE_SUFFIXES)}）がありません: {self.page_dir}")
+        return files
+
+    @staticmethod
+    def read_page(path):
+        suffix = path.suffix.lower()
+        if suffix == ".parquet":
+            return pa_parquet.read_table(path)
+        if suffix == ".csv":
+            return pa_csv.read_csv(path)
+        with pa.memory_map(str(path)) as source:
+            try:
+                return pa.ipc.open_file(source).read_all()
+            except pa.ArrowInvalid:
+                source.seek(0)
+                return pa.ipc.open_stream(source).read_all()
+
+    def fetch_batches(self, sql=None):
+        for page in _ordered_parallel(self.read_page, self.page_files(), self.workers):
+            yield from page.to_batches()
+
+
+def make_fetcher(backend=DEFAULT_BACKEND, page_dir=None, workers=DEFAULT_WORKERS, page_rows=DEFAULT_PAGE_ROWS, bq_cmd=BQ_CMD):
+    """バックエンド名から取得クラスを作る（bq_cmd は bq-cli で実行するコマンド。手元での確認用の代わりのコマンドも可）"""
+    if backend == "bigquery":
+        return BigQueryFetcher(page_rows=page_rows, workers=workers)
+    if backend == "bq-cli":
+        return BqCliFetcher(bq_cmd)
+    if backend == "files":
+        if page_dir is None:
+            raise ValueError("files バックエンドにはページファイルのディレクトリを指定してください")
+        return FileFetcher(page_dir, workers=workers)
+    raise ValueError(f"不明なバックエンドです: {backend}")
+
+
+def batch_to_dataframe(batch):
+    """レコードバッチを DataFrame にする（DATE 列は datetime64、文字列を経由しない）"""
+    return batch.to_pandas(date_as_object=False)
+
+
+def fetch_dataframe(fetcher, sql):
+    """全ページを1つの DataFrame にまとめて返す（ページ間で型が異なる列は広い型に揃える）"""
+    tables = [pa.Table.from_batches([batch]) for batch in fetcher.fetch_batches(sql)]
+    if not tables:
+        return pd.DataFrame()
+    return pa.concat_tables(tables, promote_options="permissive").to_pandas(date_as_object=False)
+
+
+def record_pages(batches, page_dir):
+    """レコードバッチを page_dir に page-00000.arrow … として保存する（files バックエンドでの再生用）"""
+    page_dir = Path(page_dir)
+    page_dir.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for count, batch in enumerate(batches, start=1):
+        with pa.OSFile(str(page_dir / f"page-{count - 1:05d}.arrow"), "wb") as sink, pa.ipc.new_file(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+    return count
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+日次のダッシュボード・簿価計算結果のスナップショット保存と過去時点の参照
+
+これまで履歴は「削除履歴」シート（消えたSKUだけ）にしか残らず、
+「このSKUの 期末1減損予定簿価 はいつ変わったか」「2026-01-06 時点の term1 の簿価はいくらだったか」は
+古いSQLを実行し直さないと分からなかった。
+ここでは日ごとの結果を日付で分けた Parquet に保存する。
+  - 全件のスナップショットは full_snapshot_days ごと（既定30日）に1回だけ保存する
+  - その間の日は前日との差分（追加・値が変わった行と、無くなったキー）だけを保存する
+  - どのファイルもキー順に並べ、辞書符号化・ランレングス・zstd で圧縮する
+参照:
+  as_of   : 指定日時点（その日以前で最新）の結果。直前の全件に差分を順に重ねる
+  history : SKU / 在庫ごとの値が変わった時点の一覧（行グループの最小・最大キーで読む範囲を絞る）
+  changes : 1つの列の値が変わった日と変更前の値
+
+保存先:
+    <store>/<データセット>/date=YYYY-MM-DD/full.parquet                  （全件）
+    <store>/<データセット>/date=YYYY-MM-DD/changes.parquet, removed.parquet（差分）
+    データセットとキー: dashboard = sku_id（stagnant_stock_report）, valuation = 在庫id（簿価計算の出力）
+
+使用方法:
+    python snapshot_store.py add --store snapshots --dataset dashboard --date 2026-01-06 --input dashboard.parquet
+    python snapshot_store.py history --store snapshots --dataset dashboard --key 12345 --columns term1_impairment_book_value
+    python snapshot_store.py changes --store snapshots --dataset dashboard --key 12345 --column term1_impairment_book_value
+    python snapshot_store.py as-of --store snapshots --dataset dashboard --date 2026-01-06 --output 20260106.csv
+"""
+
+import sys
+import os
+import shutil
+import argparse
+from pathlib import Path
+
+try:
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    print("必要なパッケージをインストールしてください:")
+    print("  pip install pandas numpy pyarrow")
+    sys.exit(1)
+
+from dashboard_delta import compute_delta
+
+
+DATASET_KEYS = {
+    "dashboard": "sku_id",
+    "valuation": "在庫id",
+}
+PARTITION_PREFIX = "date="
+FULL_FILE_NAME = "full.parquet"
+CHANGES_FILE_NAME = "changes.parquet"
+REMOVED_FILE_NAME = "removed.parquet"
+SNAPSHOT_DATE_COLUMN = "snapshot_date"
+REMOVED_COLUMN = "removed"
+DEFAULT_FULL_SNAPSHOT_DAYS = 30
+# 1つの SKU / 在庫を引くときに読む単位。小さいほど1件の参照は速く、ファイルは少し大きくなる
+DEFAULT_ROW_GROUP_ROWS = 8192
+PARQUET_COMPRESSION = "zstd"
+
+
+def _partition_name(date):
+    return f"{PARTITION_PREFIX}{pd.Timestamp(date).strftime('%Y-%m-%d')}"
+
+
+def _unchanged_from_previous(df, key, columns):
+    # キーごとに日付順に並んだ行が、直前の行と全ての列で同じか（欠損同士は同じ）
+    unchanged = df[key].eq(df[key].shift())
+    for col in columns:
+        values, previous = df[col], df[col].shift()
+        unchanged &= (values == previous).fillna(False).astype(bool) | (values.isna() & previous.isna())
+    return unchanged
+
+
+class SnapshotStore:
+    """1データセット分のスナップショット（日付ごとの Parquet、全件 + 差分）
+
+    開いた Parquet ファイルと行グループごとのキー範囲はインスタンス内に保持し、
+    同じインスタンスで続けて参照する場合はファイルのメタデータを読み直さない。
+    """
+
+    def __init__(self, root, dataset, key=None, full_snapshot_days=DEFAULT_FULL_SNAPSHOT_DAYS,
+                 row_group_rows=DEFAULT_ROW_GROUP_ROWS):
+        if key is None:
+            if dataset not in DATASET_KEYS:
+                raise ValueError(f"データセット {dataset} のキー列を指定してください（既定: {', '.join(DATASET_KEYS)}）")
+            key = DATASET_KEYS[dataset]
+        self.directory = Path(root) / dataset
+        self.key = key
+        self.full_snapshot_days = full_snapshot_days
+        self.row_group_rows = row_group_rows
+        self._partitions = {}
+        self._catalog = None
+
+    def catalog(self):
+        """保存済みの日付ごとに、全件（True）か差分（False）か"""
+        if self._catalog is None:
+            entries = {}
+            if self.directory.exists():
+                for path in self.directory.glob(f"{PARTITION_PREFIX}*/*.parquet"):
+                    if path.name in (FULL_FILE_NAME, CHANGES_FILE_NAME):
+                        entries[pd.Timestamp(path.parent.name[len(PARTITION_PREFIX):])] = path.name == FULL_FILE_NAME
+            self._catalog = pd.Series(entries, dtype=bool).sort_index()
+        return self._catalog
+
+    def dates(self):
+        """保存済みの日付（昇順）"""
+        return pd.DatetimeIndex(self.catalog().index)
+
+    def partition_path(self, date, file_name):
+        return self.directory / _partition_name(date) / file_name
+
+    def _write(self, df, path):
+        # キー順に並べて書き、書き終えてから置き換える
+        df = df.iloc[np.argsort(df[self.key].to_numpy(), kind="stable")]
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            pq.write_table(table, temp_path, row_group_size=self.row_group_rows, compression=PARQUET_COMPRESSION,
+                           use_dictionary=True, write_statistics=[self.key])
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def add(self, df, date, overwrite=False, full=None):
+        """date の結果を保存する（最新の日付より後のみ。overwrite なら最新の日付を置き換える）
+
+        full=None なら、前回の全件から full_snapshot_days 日以上経った日・列の構成が変わった日に全件を保存し、
+        それ以外は前回の結果との差分だけを保存する。戻り値は保存した行数（差分なら追加・変更の行数）。
+        """
+        if self.key not in df.columns:
+            raise ValueError(f"{self.key} 列がありません")
+        keys = pd.to_numeric(df[self.key], errors="coerce")
+        if keys.isna().any():
+            raise ValueError(f"{self.key} に空欄または数値でない値があります")
+        if keys.duplicated().any():
+            raise ValueError(f"{self.key} が重複しています: {keys[keys.duplicated()].iloc[0]}")
+        df = df.assign(**{self.key: keys.astype("int64")})
+        date = pd.Timestamp(date).normalize()
+
+        catalog = self.catalog()
+        if len(catalog) and date <= catalog.index[-1]:
+            if date < catalog.index[-1] or not overwrite:
+                raise ValueError(f"{date:%Y-%m-%d} は追加できません（最新は {catalog.index[-1]:%Y-%m-%d}、"
+                                 "同じ日付を置き換えるには overwrite）")
+            shutil.rmtree(self.directory / _partition_name(date))
+            self._forget(date)
+            catalog = self.catalog()
+
+        full_dates = catalog.index[catalog.to_numpy()]
+        if full is None:
+            full = len(full_dates) == 0 or (date - full_dates[-1]).days >= self.full_snapshot_days
+        if not full:
+            previous = self.as_of(catalog.index[-1]).drop(columns=[SNAPSHOT_DATE_COLUMN])
+            delta = compute_delta(previous, df, self.key)
+            full = delta["full_rewrite"]
+
+        partition = self.directory / _partition_name(date)
+        partition.mkdir(parents=True, exist_ok=True)
+        if full:
+            self._write(df, partition / FULL_FILE_NAME)
+            stored = len(df)
+        else:
+            changed_keys = np.concatenate([delta["added"][self.key].to_numpy(dtype="int64")]
+                                          + [change["keys"] for change in delta["changed"]])
+            changes = df[df[self.key].isin(changed_keys)]
+            if len(delta["removed"]):
+                self._write(pd.DataFrame({self.key: delta["removed"]}), partition / REMOVED_FILE_NAME)
+            self._write(changes, partition / CHANGES_FILE_NAME)
+            stored = len(changes)
+        self._forget(date)
+        return stored
+
+    def _forget(self, date):
+        self._catalog = None
+        for file_name in (FULL_FILE_NAME, CHANGES_FILE_NAME, REMOVED_FILE_NAME):
+            self._partitions.pop(self.partition_path(date, file_name), None)
+
+    def _partition(self, path):
+        # (ParquetFile, 行グループごとの最小キー, 最大キー)。空の行グループは範囲が空になるようにする
+        if path not in self._partitions:
+            parquet_file = pq.ParquetFile(path)
+            metadata = parquet_file.metadata
+            key_index = parquet_file.schema_arrow.get_field_index(self.key)
+            statistics = [metadata.row_group(i).column(key_index).statistics for i in range(metadata.num_row_groups)]
+            has_range = [stats is not None and stats.has_min_max for stats in statistics]
+            self._partitions[path] = (
+                parquet_file,
+                np.array([stats.min if ok else 0 for stats, ok in zip(statistics, has_range)], dtype="int64"),
+                np.array([stats.max if ok else -1 for stats, ok in zip(statistics, has_range)], dtype="int64"),
+            )
+        return self._partitions[path]
+
+    def _read(self, path, columns=None, keys=None):
+        """1つのファイルを読む。keys を指定すると、そのキーを含む行グループだけを読んで該当行を返す"""
+        parquet_file, first_keys, last_keys = self._partition(path)
+        read_columns = None if columns is None else [self.key] + [col for col in columns if col != self.key]
+        if keys is None:
+            return parquet_file.read(columns=read_columns).to_pandas(date_as_object=False)
+        groups = np.searchsorted(first_keys, keys, side="right") - 1
+        found = (groups >= 0) & (keys <= last_keys[np.maximum(groups, 0)])
+        tables = []
+        for group in np.unique(groups[found]):
+            table = parquet_file.read_row_group(int(group), columns=read_columns)
+            group_keys = table.column(self.key).to_numpy()
+            wanted = keys[groups == group]
+            positions = np.minimum(np.searchsorted(group_keys, wanted), len(group_keys) - 1)
+            tables.append(table.take(positions[group_keys[positions] == wanted]))
+        if not tables:
+            schema = parquet_file.schema_arrow
+            if read_columns is not None:
+                schema = pa.schema([schema.field(col) for col in read_columns])
+            return schema.empty_table().to_pandas()
+        return pa.concat_tables(tables).to_pandas(date_as_object=False)
+
+    def _events(self, date, columns, keys):
+        # その日に保存した行（全件 / 追加・変更）と、無くなったキー（全件の日は None）
+        if self.catalog()[date]:
+            return self._read(self.partition_path(date, FULL_FILE_NAME), columns, keys), None
+        removed_path = self.partition_path(date, REMOVED_FILE_NAME)
+        removed = (self._read(removed_path, [self.key], keys)[self.key].to_numpy(dtype="int64")
+                   if removed_path.exists() else np.array([], dtype="int64"))
+        return self._read(self.partition_path(date, CHANGES_FILE_NAME), columns, keys), removed
+
+    def snapshot_date_as_of(self, date):
+        """date 以前で最新のスナップショットの日付（無ければ None）"""
+        dates = self.dates()
+        dates = dates[dates <= pd.Timestamp(date)]
+        return dates[-1] if len(dates) else None
+
+    def as_of(self, date, columns=None, keys=None):
+        """date 時点（date 以前で最新）の結果。keys を指定するとその行だけ読む"""
+        snapshot_date = self.snapshot_date_as_of(date)
+        if snapshot_date is None:
+            raise ValueError(f"{pd.Timestamp(date):%Y-%m-%d} 以前のスナップショットがありません")
+        if keys is not None:
+            keys = np.unique(np.atleast_1d(np.asarray(keys, dtype="int64")))
+        catalog = self.catalog()[:snapshot_date]
+        base_date = catalog.index[catalog.to_numpy()][-1]
+
+        # 直前の全件に、その後の差分（追加・変更の行で置き換え、無くなったキーを除く）を順に重ねる
+        df = self._read(self.partition_path(base_date, FULL_FILE_NAME), columns, keys)
+        for delta_date in catalog.index[catalog.index > base_date]:
+            changes, removed = self._events(delta_date, columns, keys)
+            replaced = df[self.key].isin(np.concatenate([changes[self.key].to_numpy(dtype="int64"), removed]))
+            df = pd.concat([df[~replaced], changes], ignore_index=True) if not changes.empty else df[~replaced]
+        df = df.iloc[np.argsort(df[self.key].to_numpy(), kind="stable")].reset_index(drop=True)
+        df.insert(0, SNAPSHOT_DATE_COLUMN, snapshot_date)
+        return df
+
+    def history(self, keys, columns=None, start=None, end=None):
+        """keys（SKU / 在庫）の値が変わった時点の一覧
+
+        start 時点の値を最初の行とし、その後に値が変わった日・無くなった日（removed=True）の行を返す。
+        columns を指定すると、その列の値が変わった日だけになる。
+        """
+        keys = np.unique(np.atleast_1d(np.asarray(keys, dtype="int64")))
+        catalog = self.catalog()
+        if end is not None:
+            catalog = catalog[:pd.Timestamp(end)]
+        frames = []
+        present = np.array([], dtype="int64")  # 直前の日に存在した keys（全件の日に無くなったキーを求めるため）
+        first_date = self.snapshot_date_as_of(start) if start is not None else None
+        if first_date is not None:
+            first = self.as_of(first_date, columns, keys)
+            frames.append(first.assign(**{REMOVED_COLUMN: False}))
+            present = first[self.key].to_numpy(dtype="int64")
+            catalog = catalog[catalog.index > first_date]
+        for date in catalog.index:
+            stored, removed = self._events(date, columns, keys)
+            stored_keys = stored[self.key].to_numpy(dtype="int64")
+            if removed is None:
+                # 全件の日は removed を保存していないため、直前にあって全件に無いキーを無くなったものとする
+                removed = np.setdiff1d(present, stored_keys)
+                present = stored_keys
+            else:
+                present = np.union1d(np.setdiff1d(present, removed), stored_keys)
+            frames.append(stored.assign(**{SNAPSHOT_DATE_COLUMN: date, REMOVED_COLUMN: False}))
+            if len(removed):
+                frames.append(pd.DataFrame({self.key: removed, SNAPSHOT_DATE_COLUMN: date, REMOVED_COLUMN: True}))
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=[SNAPSHOT_DATE_COLUMN, self.key, REMOVED_COLUMN] + list(columns or []))
+
+        history = pd.concat(frames, ignore_index=True)
+        history = history.sort_values([self.key, SNAPSHOT_DATE_COLUMN], kind="stable").reset_index(drop=True)
+        value_columns = [col for col in history.columns if col not in (SNAPSHOT_DATE_COLUMN, self.key, REMOVED_COLUMN)]
+        history = history[~_unchanged_from_previous(history, self.key, value_columns + [REMOVED_COLUMN])]
+        return history[[SNAPSHOT_DATE_COLUMN, self.key, REMOVED_COLUMN] + value_columns].reset_index(drop=True)
+
+    def changes(self, keys, column, start=None, end=None):
+        """column の値が変わった日と変更前の値（最初の行は start 時点、または最初に現れた日）"""
+        history = self.history(keys, [column], start, end)
+        same_key = history[self.key].eq(history[self.key].shift())
+        history[f"previous_{column}"] = history[column].shift().where(same_key)
+        return history
+
+    def disk_usage(self):
+        """保存済みファイルの合計バイト数"""
+        return sum(path.stat().st_size for path in self.directory.glob(f"{PARTITION_PREFIX}*/*.parquet"))
+
+
+def read_table(path):
+    """CSV / Parquet / Arrow を読み込む"""
+    lower = str(path).lower()
+    if lower.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if lower.endswith(".arrow"):
+        with pa.memory_map(str(path)) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas(date_as_object=False)
+    return pd.read_csv(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="日次のダッシュボード・簿価計算結果のスナップショットを保存・参照します")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(subparser):
+        subparser.add_argument("--store", required=True, help="スナップショットの保存先ディレクトリ")
+        subparser.add_argument("--dataset", required=True, help=f"データセット名（{' / '.join(DATASET_KEYS)} など）")
+        subparser.add_argument("--key-column", help="キー列（dashboard / valuation 以外のデータセットで指定）")
+        return subparser
+
+    add_parser = add_common(subparsers.add_parser("add", help="1日分の結果を保存する"))
+    add_parser.add_argument("--date", required=True, help="スナップショットの日付（YYYY-MM-DD）")
+    add_parser.add_argument("--input", required=True, help="その日の結果（CSV / Parquet / Arrow）")
+    add_parser.add_argument("--overwrite", action="store_true", help="最新の日付のスナップショットを置き換える")
+    add_parser.add_argument("--full", action="store_true", help="差分ではなく全件を保存する")
+
+    history_parser = add_common(subparsers.add_parser("history", help="SKU / 在庫ごとの値が変わった時点"))
+    changes_parser = add_common(subparsers.add_parser("changes", help="1つの列の値が変わった日と変更前の値"))
+    for subparser in (history_parser, changes_parser):
+        subparser.add_argument("--key", type=int, action="append", required=True, help="SKU ID / 在庫id（複数指定可）")
+        subparser.add_argument("--start", help="期間の開始日")
+        subparser.add_argument("--end", help="期間の終了日")
+    history_parser.add_argument("--columns", nargs="+", help="表示する列（省略時は全列）")
+    changes_parser.add_argument("--column", required=True, help="変化を調べる列")
+
+    as_of_parser = add_common(subparsers.add_parser("as-of", help="指定日時点のスナップショット"))
+    as_of_parser.add_argument("--date", required=True, help="基準日（その日以前で最新のスナップショット）")
+    as_of_parser.add_argument("--columns", nargs="+", help="出力する列（省略時は全列）")
+    as_of_parser.add_argument("--output", help="出力先CSV（省略時は行数だけ表示）")
+    args = parser.parse_args(argv)
+
+    try:
+        store = SnapshotStore(args.store, args.dataset, args.key_column)
+        if args.command == "add":
+            stored = store.add(read_table(args.input), args.date, args.overwrite, True if args.full else None)
+            kind = "全件" if store.catalog().iloc[-1] else "差分"
+            print(f"{args.date} を保存しました（{kind} {stored:,} 行、合計 {len(store.dates())} 日分 "
+                  f"{store.disk_usage() / 1024 ** 2:.1f} MB）")
+        elif args.command == "history":
+            print(store.history(args.key, args.columns, args.start, args.end).to_string(index=False))
+        elif args.command == "changes":
+            print(store.changes(args.key, args.column, args.start, args.end).to_string(index=False))
+        else:
+            df = store.as_of(args.date, args.columns)
+            if args.output:
+                df.to_csv(args.output, index=False, encoding="utf-8")
+            print(f"{df[SNAPSHOT_DATE_COLUMN].iloc[0]:%Y-%m-%d} のスナップショット {len(df):,} 行"
+                  f"{': ' + args.output if args.output else ''}")
+    except (OSError, ValueError, pa.ArrowException) as e:
+        print(f"処理エラー: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+"""
+滞留在庫ダッシュボード v4 の排他的在庫割り当て（Python版）
+
+sql/stagnant_inventory_dashboard_v4.sql（と stagnant_inventory_v4_*_by_term.sql）の
+「7. パーツ×エリア別在庫集計」〜「13. 余りパーツの計算」と同じ割り当てを行う。
+SQL は組み上げ可能数の分だけユニットを GENERATE_ARRAY で展開してからウィンドウ関数と
+範囲結合で在庫を割り当てるため、行数が組み上げ可能数 × パーツ数に膨らむ。
+ここでは (パーツ, エリア) ごとに在庫を減損が近い順に並べ、SKU を優先順位の順に
+消費量のカウンタで割り当てる。ユニットは展開せず、在庫の順位から何番目のユニットかを求める。
+
+割り当ての手順（SQL と同じ）:
+  Pass1: 各SKUの組み上げ可能数 = 各パーツの floor(在庫数 / 必要数) の最小値。
+         優先順位の高いSKUから、組み上げ可能数 × 必要数 を (パーツ, エリア) の在庫から予約する
+         （予約しきれない場合は残りで組める数まで減らす）
+  Pass2: 全パーツで予約できた数（最小値）を確定し、優先順位の順に在庫の若い順から割り当てる
+
+入力（BigQuery の各CTEをCSVなどに書き出したもの）:
+  sku_part_detail : sku_id, sku_hash, product_id, part_id, quantity
+  sku_priority    : sku_id, sku_priority（sku_with_priority）
+  stocks          : stock_id, part_id, business_area, warehouse_name, category, category_order, book_value
+                    （stock_ordered。business_area が空の在庫は割り当て対象外）
+                    category_order が無く retention_start_date がある場合は、--as-of の日付で
+                    fiscal_calendar により減損タームを判定する（stock_with_category と同じ）。
+                    簿価は book_value が無ければ book_value_term1〜4 / book_value_latest / cost から選ぶ
+
+使用方法:
+    python stock_allocation.py --sku-parts sku_part_detail.csv --sku-priority sku_with_priority.csv \\
+        --stocks stock_ordered.csv --output allocation_summary.csv [--assignment-output assignment.csv] [--workers 4]
+    # SQL の出力と突き合わせる（差異があれば終了コード1）
+    python stock_allocation.py ... --expected-summary dashboard_v4.csv --expected-assignment unit_stock_assignment.csv
+    # what-if: SKU を最優先にした場合・在庫が売れた場合の 割り当て / 余り の増減を表示する
+    python stock_allocation.py ... --promote 123 --sold-stocks sold_stock_ids.csv
+"""
+
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    print("必要なパッケージをインストールしてください:")
+    print("  pip install pandas numpy")
+    sys.exit(1)
+
+import fiscal_calendar
+
+
+# stock_with_category の category_order（99 = 減損済み）
+IMPAIRED_ORDER = fiscal_calendar.IMPAIRED_ORDER
+TERM_ORDERS = (1, 2, 3, 4)
+SKU_KEY_COLS = ["sku_id", "sku_hash", "product_id"]
+ASSIGNMENT_COLUMNS = [
+    "sku_id", "sku_hash", "product_id", "business_area", "unit_no", "part_id",
+    "stock_id", "category", "category_order", "warehouse_name", "book_value",
+]
+PRODUCT_COUNT_COLUMNS = ["product_cnt", "impaired_product_cnt"] + [f"term{n}_product_cnt" for n in TERM_ORDERS]
+PRODUCT_BOOK_VALUE_COLUMNS = ["product_book_value", "impaired_book_value"] + [f"term{n}_book_value" for n in TERM_ORDERS]
+LEFTOVER_COUNT_COLUMNS = ["leftover_cnt", "leftover_impaired_cnt"] + [f"leftover_term{n}_cnt" for n in TERM_ORDERS]
+SUMMARY_COLUMNS = ["sku_hash"] + PRODUCT_COUNT_COLUMNS + LEFTOVER_COUNT_COLUMNS + ["total_cnt"] + PRODUCT_BOOK_VALUE_COLUMNS + ["leftover_book_value"]
+DEFAULT_WORKERS = 1
+
+
+def categorize_stocks(stocks, as_of, term_ends=None):
+    """滞留開始日から category / category_order / book_value を付ける（stock_with_category と同じ）
+
+    term_ends を省略すると as_of より後の四半期末4つ（fiscal_calendar.period_ends）。
+    簿価: 減損済みは最新の簿価、termN は termN 末の簿価（無ければ最新の簿価、それも無ければ取得原価）。
+    """
+    if term_ends is None:
+        term_ends = fiscal_calendar.period_ends(as_of, len(TERM_ORDERS))
+    impairment_dates = stocks["impairment_date"] if "impairment_date" in stocks.columns else None
+    orders = fiscal_calendar.classify_terms(stocks["retention_start_date"], as_of, term_ends, impairment_dates)
+    stocks = stocks.assign(category=fiscal_calendar.term_labels(orders, len(term_ends)), category_order=orders)
+    if "book_value" in stocks.columns:
+        return stocks
+
+    def coalesce(*columns):
+        values = pd.Series(np.nan, index=stocks.index)
+        for col in columns:
+            if col in stocks.columns:
+                values = values.fillna(stocks[col])
+        return values
+
+    latest = coalesce("book_value_latest", "cost")
+    book_value = latest.copy()
+    for n in range(1, len(term_ends) + 1):
+        is_term = orders == n
+        book_value[is_term] = coalesce(f"book_value_term{n}", "book_value_latest", "cost")[is_term]
+    return stocks.assign(book_value=book_value)
+
+
+def read_stocks(path, as_of):
+    """在庫を読み込み、減損タームが無ければ as_of で判定する"""
+    stocks = read_table(path)
+    if "category_order" not in stocks.columns:
+        if "retention_start_date" not in stocks.columns:
+            raise ValueError(f"{path} に category_order も retention_start_date もありません")
+        stocks = categorize_stocks(stocks, as_of)
+    return stocks
+
+
+def rank_stocks(stocks):
+    """(パーツ, エリア) ごとに 減損が近い順 > stock_id で並べ、stock_rank（1始まり）を付ける（stock_ordered と同じ）"""
+    stocks = stocks[stocks["business_area"].notna()]
+    stocks = stocks.sort_values(["part_id", "business_area", "category_order", "stock_id"], kind="stable").reset_index(drop=True)
+    stocks["stock_rank"] = stocks.groupby(["part_id", "business_area"], sort=False).cumcount() + 1
+    return stocks
+
+
+def _sku_parts_with_priority(sku_parts, sku_priority):
+    # SKUの優先順位を付け、(優先順位, sku_id) の順に並べる
+    priority = sku_priority[["sku_id", "sku_priority"]].drop_duplicates("sku_id")
+    sku_parts = sku_parts.merge(priority, on="sku_id", how="inner")
+    return sku_parts.sort_values(["sku_priority", "sku_id"], kind="stable").reset_index(drop=True)
+
+
+class AreaAllocation:
+    """1エリア分の割り当てと、その途中結果（what-if の再計算で使う）
+
+    stocks は rank_stocks 済みで同じ business_area の在庫のみ、sku_parts は _sku_parts_with_priority の結果。
+    max_assemblable: SKUごとの組み上げ可能数（Pass1 の希望数）
+    demand         : SKU×パーツごとの予約できる数（sku_part_allocatable）
+    final          : SKUごとの確定ユニット数（sku_final_assemblable）
+    assignment     : 在庫の割り当て（unit_stock_assignment）
+    途中結果は置き換えるだけで書き換えないため、copy() は浅いコピーでよい。
+    """
+
+    def __init__(self, stocks, sku_parts):
+        self.area = stocks["business_area"].iloc[0]
+        self.stocks = stocks.reset_index(drop=True)
+        self.sku_parts = sku_parts
+        self.stock_count = self.stocks.groupby("part_id").size()
+        self.max_assemblable = self._max_assemblable(sku_parts)
+        self.demand = self._pass1(self.max_assemblable)
+        self.final = self._final_units(self.demand)
+        self.assignment = self._pass2(self.final, self.stocks)
+
+    def copy(self):
+        clone = object.__new__(AreaAllocation)
+        clone.__dict__.update(self.__dict__)
+        return clone
+
+    def _hash_parts(self, parts=None):
+        # SQL と同じく構成パーツは sku_hash で結合する
+        hash_parts = self.sku_parts[["sku_hash", "part_id", "quantity"]]
+        return hash_parts if parts is None else hash_parts[hash_parts["part_id"].isin(parts)]
+
+    def _parts_of(self, sku_ids):
+        hashes = self.sku_parts.loc[self.sku_parts["sku_id"].isin(sku_ids), "sku_hash"]
+        return set(self.sku_parts.loc[self.sku_parts["sku_hash"].isin(hashes), "part_id"])
+
+    def _max_assemblable(self, sku_rows):
+        # 組み上げ可能数（sku_area_max_assemblable）= 各パーツの floor(在庫数 / 必要数) の最小値
+        rows = sku_rows.assign(stock_count=sku_rows["part_id"].map(self.stock_count).fillna(0).astype("int64"))
+        rows["max_units_from_part"] = rows["stock_count"] // rows["quantity"]
+        max_assemblable = rows.groupby(SKU_KEY_COLS + ["sku_priority"], sort=False)["max_units_from_part"].min()
+        return max_assemblable[max_assemblable > 0].rename("max_assemblable").reset_index()
+
+    def _pass1(self, max_assemblable, parts=None):
+        # 累積消費量（sku_cumulative_consumption）: パーツごとに優先順位の順で 組み上げ可能数 × 必要数 を積み上げ、
+        # 予約できる数（sku_part_allocatable）を求める
+        demand = max_assemblable.merge(self._hash_parts(parts), on="sku_hash")
+        demand = demand.sort_values(["sku_priority", "sku_id"], kind="stable")
+        required = demand["max_assemblable"] * demand["quantity"]
+        cumulative_required = required.groupby(demand["part_id"], sort=False).cumsum()
+        available = demand["part_id"].map(self.stock_count).fillna(0).astype("int64")
+        consumed_before = cumulative_required - required
+        demand["allocatable_units"] = np.select(
+            [cumulative_required <= available, consumed_before < available],
+            [demand["max_assemblable"], (available - consumed_before) // demand["quantity"]],
+            0,
+        )
+        return demand
+
+    @staticmethod
+    def _final_units(demand):
+        # 全パーツで予約できた数の最小値（sku_final_assemblable）
+        final = demand.groupby(SKU_KEY_COLS + ["sku_priority"], sort=False)["allocatable_units"].min()
+        return final[final > 0].rename("final_units").reset_index()
+
+    def _pass2(self, final, stocks, parts=None):
+        # 確定したユニット数を優先順位の順に割り当てる。
+        # パーツごとに各SKUは在庫順位の連続した範囲 (offset, offset + 確定数 × 必要数] を使う
+        if final.empty or stocks.empty:
+            return pd.DataFrame(columns=ASSIGNMENT_COLUMNS)
+        blocks = final.merge(self._hash_parts(parts), on="sku_hash")
+        blocks = blocks.sort_values(["sku_priority", "sku_id"], kind="stable")
+        blocks["used"] = blocks["final_units"] * blocks["quantity"]
+        blocks["offset"] = blocks.groupby("part_id", sort=False)["used"].cumsum() - blocks["used"]
+
+        # 在庫とブロックを (パーツの通し位置) で突き合わせる（ブロックは パーツ内で offset 順に隙間なく並ぶ）
+        part_codes, part_values = pd.factorize(stocks["part_id"], sort=True)
+        part_start = pd.Series(np.searchsorted(part_codes, np.arange(len(part_values))), index=part_values)
+        blocks = blocks[blocks["part_id"].isin(part_values)]
+        if blocks.empty:
+            # 再計算する在庫のパーツを使うSKUが無い（組み上げに使われないパーツの在庫だけを除外した場合など）
+            return pd.DataFrame(columns=ASSIGNMENT_COLUMNS)
+        block_start = (blocks["part_id"].map(part_start) + blocks["offset"]).to_numpy()
+        order = np.argsort(block_start, kind="stable")
+        blocks = blocks.iloc[order].reset_index(drop=True)
+        block_start = block_start[order]
+        block_end = block_start + blocks["used"].to_numpy()
+
+        stock_position = part_start.to_numpy()[part_codes] + stocks["stock_rank"].to_numpy() - 1
+        block_index = np.searchsorted(block_start, stock_position, side="right") - 1
+        assigned = (block_index >= 0) & (stock_position < block_end[np.maximum(block_index, 0)])
+        block_index = block_index[assigned]
+
+        assigned_stocks = stocks[assigned].reset_index(drop=True)
+        block_rows = blocks.iloc[block_index].reset_index(drop=True)
+        assigned_stocks["sku_id"] = block_rows["sku_id"].to_numpy()
+        assigned_stocks["sku_hash"] = block_rows["sku_hash"].to_numpy()
+        assigned_stocks["product_id"] = block_rows["product_id"].to_numpy()
+        rank_in_block = assigned_stocks["stock_rank"].to_numpy() - 1 - block_rows["offset"].to_numpy()
+        assigned_stocks["unit_no"] = rank_in_block // block_rows["quantity"].to_numpy() + 1
+        assigned_stocks["business_area"] = self.area
+        return assigned_stocks[ASSIGNMENT_COLUMNS]
+
+    def recompute(self, sku_parts, changed_sku_ids=(), removed_stock_ids=()):
+        """優先順位の変更・在庫の除外を反映し、影響する (パーツ) だけを再計算する
+
+        sku_parts: 変更後の優先順位を付けた _sku_parts_with_priority の結果
+        changed_sku_ids: 優先順位が変わったSKU
+        影響範囲:
+          在庫を除外したパーツ Q → そのパーツを使うSKUの組み上げ可能数が変わる（S0）
+          S0・優先順位が変わったSKU の構成パーツ P → Pass1 の累積消費量を再計算
+          P を使うSKU（S1）→ 確定ユニット数を再計算
+          S0・S1・優先順位が変わったSKU の構成パーツと Q → Pass2 の割り当てを再計算
+        """
+        self.sku_parts = sku_parts
+        removed = self.stocks["stock_id"].isin(removed_stock_ids)
+        removed_parts = set(self.stocks.loc[removed, "part_id"])
+        if removed.any():
+            # 並び順は変わらないため、順位だけ付け直す
+            self.stocks = self.stocks[~removed].reset_index(drop=True)
+            self.stocks["stock_rank"] = self.stocks.groupby("part_id", sort=False).cumcount() + 1
+            self.stock_count = self.stocks.groupby("part_id").size()
+
+        changed_sku_ids = set(changed_sku_ids)
+        count_changed = set(sku_parts.loc[sku_parts["part_id"].isin(removed_parts), "sku_id"])
+        if not changed_sku_ids and not count_changed and not removed_parts:
+            return
+
+        # 組み上げ可能数: 在庫数が変わったSKUは計算し直し、優先順位が変わったSKUは優先順位だけ更新する
+        max_assemblable = self.max_assemblable[~self.max_assemblable["sku_id"].isin(count_changed)]
+        priority = sku_parts.drop_duplicates("sku_id").set_index("sku_id")["sku_priority"]
+        max_assemblable = max_assemblable.assign(sku_priority=max_assemblable["sku_id"].map(priority).to_numpy())
+        recomputed = self._max_assemblable(sku_parts[sku_parts["sku_id"].isin(count_changed)])
+        self.max_assemblable = pd.concat([max_assemblable, recomputed], ignore_index=True)
+
+        pass1_parts = self._parts_of(changed_sku_ids | count_changed) | removed_parts
+        demand = self._pass1(self.max_assemblable, pass1_parts)
+        self.demand = pd.concat([self.demand[~self.demand["part_id"].isin(pass1_parts)], demand], ignore_index=True)
+
+        final_skus = set(demand["sku_id"]) | count_changed | changed_sku_ids
+        final = self._final_units(self.demand[self.demand["sku_id"].isin(final_skus)])
+        self.final = pd.concat([self.final[~self.final["sku_id"].isin(final_skus)], final], ignore_index=True)
+
+        pass2_parts = self._parts_of(final_skus) | removed_parts
+        assignment = self._pass2(self.final, self.stocks[self.stocks["part_id"].isin(pass2_parts)], pass2_parts)
+        kept = self.assignment[~self.assignment["part_id"].isin(pass2_parts)]
+        self.assignment = pd.concat([kept, assignment], ignore_index=True) if not assignment.empty else kept
+
+
+def allocate_area(stocks, sku_parts):
+    """1エリア分の割り当て。戻り値は (SKUごとの確定ユニット数, 在庫の割り当て)"""
+    allocation = AreaAllocation(stocks, sku_parts)
+    return allocation.final, allocation.assignment
+
+
+def _allocate_areas(stocks, sku_parts, workers):
+    # エリアごとに独立しているため workers > 1 ならプロセスで並列に計算する
+    groups = [area_stocks for _, area_stocks in stocks.groupby("business_area", sort=True)]
+    if workers > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(groups))) as executor:
+            return list(executor.map(AreaAllocation, groups, [sku_parts] * len(groups)))
+    return [AreaAllocation(area_stocks, sku_parts) for area_stocks in groups]
+
+
+def _combine_areas(areas):
+    finals = [area.final.assign(business_area=area.area) for area in areas if not area.final.empty]
+    assignments = [area.assignment for area in areas if not area.assignment.empty]
+    final_units = pd.concat(finals, ignore_index=True) if finals else pd.DataFrame(columns=SKU_KEY_COLS + ["sku_priority", "final_units", "business_area"])
+    assignment = pd.concat(assignments, ignore_index=True) if assignments else pd.DataFrame(columns=ASSIGNMENT_COLUMNS)
+    return final_units, assignment
+
+
+def allocate(sku_parts, sku_priority, stocks, workers=DEFAULT_WORKERS):
+    """全エリアの割り当て
+
+    戻り値は (エリア×SKUごとの確定ユニット数, 在庫の割り当て（unit_stock_assignment と同じ列）, 順位付きの在庫)。
+    """
+    stocks = rank_stocks(stocks)
+    areas = _allocate_areas(stocks, _sku_parts_with_priority(sku_parts, sku_priority), workers)
+    final_units, assignment = _combine_areas(areas)
+    return final_units, assignment, stocks
+
+
+def _term_label(category_order):
+    # category_order から集計列の接尾辞を決める（SQL の category 名は版により term4 / term4_after と異なるため）
+    return np.where(category_order == IMPAIRED_ORDER, "impaired", "term" + category_order.astype(str))
+
+
+def summarize(sku_parts, assignment, stocks):
+    """SKUごとの商品数・余りパーツ数・簿価（sku_product_summary と sku_leftover_summary を sku_hash で並べたもの）"""
+    sku_hashes = pd.Index(sku_parts["sku_hash"].drop_duplicates(), name="sku_hash")
+    summary = pd.DataFrame(index=sku_hashes)
+
+    # 商品（ユニット）ごとのカテゴリ: 減損済みを除いた最も早い減損カテゴリ、全パーツ減損済みなら impaired
+    if not assignment.empty:
+        order = assignment["category_order"].where(assignment["category_order"] != IMPAIRED_ORDER)
+        products = assignment.assign(earliest_order=order).groupby(
+            ["sku_id", "sku_hash", "product_id", "business_area", "unit_no"], sort=False).agg(
+            earliest_order=("earliest_order", "min"), total_book_value=("book_value", "sum")).reset_index()
+        products["category"] = _term_label(products["earliest_order"].fillna(IMPAIRED_ORDER).astype("int64"))
+        counts = products.pivot_table(index="sku_hash", columns="category", values="unit_no", aggfunc="count", fill_value=0)
+        values = products.pivot_table(index="sku_hash", columns="category", values="total_book_value", aggfunc="sum", fill_value=0)
+        summary["product_cnt"] = counts.sum(axis=1)
+        summary["product_book_value"] = values.sum(axis=1)
+        for label in ["impaired"] + [f"term{n}" for n in TERM_ORDERS]:
+            summary[f"{label}_product_cnt"] = counts[label] if label in counts else 0
+            summary[f"{label}_book_value"] = values[label] if label in values else 0
+
+    # 余りパーツ: 割り当てられなかった在庫を、そのパーツを使う全SKUに数える（SQL と同じく排他的ではない）
+    leftover = stocks[~stocks["stock_id"].isin(assignment["stock_id"])]
+    if not leftover.empty:
+        leftover = leftover.assign(category=_term_label(leftover["category_order"].astype("int64")))
+        by_part = leftover.groupby(["part_id", "category"]).agg(cnt=("stock_id", "size"), book_value=("book_value", "sum")).reset_index()
+        by_sku = sku_parts[["sku_hash", "part_id"]].merge(by_part, on="part_id")
+        counts = by_sku.pivot_table(index="sku_hash", columns="category", values="cnt", aggfunc="sum", fill_value=0)
+        summary["leftover_cnt"] = counts.sum(axis=1)
+        summary["leftover_book_value"] = by_sku.groupby("sku_hash")["book_value"].sum()
+        for label in ["impaired"] + [f"term{n}" for n in TERM_ORDERS]:
+            summary[f"leftover_{label}_cnt"] = counts[label] if label in counts else 0
+
+    summary = summary.reindex(columns=[col for col in SUMMARY_COLUMNS if col not in ("sku_hash", "total_cnt")])
+    summary = summary.fillna(0)
+    summary["total_cnt"] = summary["product_cnt"] + summary["leftover_cnt"]
+    count_columns = PRODUCT_COUNT_COLUMNS + LEFTOVER_COUNT_COLUMNS + ["total_cnt"]
+    summary[count_columns] = summary[count_columns].astype("int64")
+    return summary.reset_index()[SUMMARY_COLUMNS]
+
+
+# --- what-if（優先順位の変更・在庫の除外による割り当ての変化） ---
+TERM_LABELS = ["impaired"] + [f"term{n}" for n in TERM_ORDERS]
+BY_TERM_COLUMNS = ["assigned_cnt", "assigned_book_value", "leftover_cnt", "leftover_book_value"]
+
+
+def _term_deltas(stocks, assigned_delta, leftover_delta):
+    # 状態が変わった在庫だけから、減損カテゴリごとの 割り当て / 余り の件数・簿価の増減を集計する
+    rows = pd.DataFrame({
+        "term": _term_label(stocks["category_order"].astype("int64")),
+        "assigned_cnt": assigned_delta,
+        "assigned_book_value": assigned_delta * stocks["book_value"].to_numpy(),
+        "leftover_cnt": leftover_delta,
+        "leftover_book_value": leftover_delta * stocks["book_value"].to_numpy(),
+    })
+    by_term = rows.groupby("term")[BY_TERM_COLUMNS].sum()
+    return by_term.reindex(pd.Index(TERM_LABELS, name="term"), fill_value=0).astype("int64")
+
+
+class AllocationState:
+    """読み込んだ割り当て結果を保持し、what-if（優先順位の変更・在庫の除外）の差分を返す
+
+    使用例:
+        state = AllocationState(sku_parts, sku_priority, stocks)
+        delta = state.what_if(priority_changes={123: 0})    # SKU 123 を最優先にした場合
+        delta = state.what_if(removed_stock_ids=sold_ids)   # これらの在庫が売れた場合
+        print(delta["by_term"])                             # 減損カテゴリ別の 割り当て / 余り の増減
+    影響する (パーツ, エリア) だけを再計算するため、全件の再割り当てより速い。
+    commit=True で変更後の状態を保持し、続けて別の what-if を重ねられる。
+    """
+
+    def __init__(self, sku_parts, sku_priority, stocks, workers=DEFAULT_WORKERS):
+        self.sku_parts = _sku_parts_with_priority(sku_parts, sku_priority)
+        self.areas = {area.area: area for area in _allocate_areas(rank_stocks(stocks), self.sku_parts, workers)}
+
+    @property
+    def final_units(self):
+        return _combine_areas(self.areas.values())[0]
+
+    @property
+    def assignment(self):
+        return _combine_areas(self.areas.values())[1]
+
+    @property
+    def stocks(self):
+        return pd.concat([area.stocks for area in self.areas.values()], ignore_index=True)
+
+    def what_if(self, priority_changes=None, removed_stock_ids=(), commit=False):
+        """優先順位の変更（{sku_id: 新しい優先順位}、小さいほど優先）・在庫の除外を適用した場合の差分を返す
+
+        戻り値 dict:
+          by_term        : 減損カテゴリ別の 割り当て / 余り 在庫の件数・簿価の増減（除外した在庫は変更前の側から減る）
+          newly_assigned : 新たに割り当てられた在庫id
+          released       : 割り当てから外れて余りになった在庫id
+          removed        : 除外した在庫id（割り当て対象の在庫に存在したもの）
+          sku_units      : 確定ユニット数が変わった (エリア, SKU) の 変更前 / 変更後
+        """
+        priority_changes = dict(priority_changes or {})
+        removed_stock_ids = set(removed_stock_ids)
+        sku_parts = self.sku_parts
+        if priority_changes:
+            priority = sku_parts["sku_id"].map(priority_changes)
+            sku_parts = sku_parts.assign(sku_priority=priority.fillna(sku_parts["sku_priority"]))
+            sku_parts = sku_parts.sort_values(["sku_priority", "sku_id"], kind="stable").reset_index(drop=True)
+
+        # 除外する在庫が無く、優先順位も変わらないエリアは再計算しない
+        pairs = []
+        new_areas = dict(self.areas)
+        for name, area in self.areas.items():
+            has_removed = bool(removed_stock_ids) and area.stocks["stock_id"].isin(removed_stock_ids).any()
+            if not has_removed and not priority_changes:
+                continue
+            changed = area.copy()
+            changed.recompute(sku_parts, priority_changes.keys(), removed_stock_ids if has_removed else ())
+            pairs.append((area, changed))
+            new_areas[name] = changed
+
+        delta = self._delta(pairs)
+        if commit:
+            self.sku_parts = sku_parts
+            self.areas = new_areas
+        return delta
+
+    @staticmethod
+    def _delta(pairs):
+        by_term, newly_assigned, released, removed, sku_units = [], [], [], [], []
+        for before, after in pairs:
+            assigned_before = before.assignment["stock_id"].to_numpy()
+            assigned_after = after.assignment["stock_id"].to_numpy()
+            # 在庫idは一意のため assume_unique で並べ替えを省く
+            removed_ids = np.setdiff1d(before.stocks["stock_id"], after.stocks["stock_id"], assume_unique=True)
+            newly_ids = np.setdiff1d(assigned_after, assigned_before, assume_unique=True)
+            released_ids = np.setdiff1d(np.setdiff1d(assigned_before, assigned_after, assume_unique=True), removed_ids, assume_unique=True)
+
+            # 状態が変わった在庫: 新たに割り当て（余り → 割り当て）/ 解放（割り当て → 余り）/ 除外（どちらかから減る）
+            touched = before.stocks[before.stocks["stock_id"].isin(np.concatenate([newly_ids, released_ids, removed_ids]))]
+            ids = touched["stock_id"]
+            was_removed_assigned = ids.isin(removed_ids) & ids.isin(assigned_before)
+            was_removed_leftover = ids.isin(removed_ids) & ~ids.isin(assigned_before)
+            assigned_delta = ids.isin(newly_ids).astype("int64") - ids.isin(released_ids) - was_removed_assigned
+            leftover_delta = ids.isin(released_ids).astype("int64") - ids.isin(newly_ids) - was_removed_leftover
+            by_term.append(_term_deltas(touched, assigned_delta.to_numpy(), leftover_delta.to_numpy()))
+
+            units = before.final[["sku_id", "final_units"]].merge(
+                after.final[["sku_id", "final_units"]], on="sku_id", how="outer", suffixes=("_before", "_after")).fillna(0)
+            units = units[units["final_units_before"] != units["final_units_after"]]
+            sku_units.append(units.assign(business_area=after.area))
+            newly_assigned.append(newly_ids)
+            released.append(released_ids)
+            removed.append(removed_ids)
+
+        units = pd.concat(sku_units, ignore_index=True) if sku_units else pd.DataFrame(columns=["sku_id", "final_units_before", "final_units_after", "business_area"])
+        return {
+            "by_term": sum(by_term) if by_term else _term_deltas(pd.DataFrame(columns=["category_order", "book_value"]), 0, 0),
+            "newly_assigned": np.concatenate(newly_assigned) if newly_assigned else np.array([], dtype="int64"),
+            "released": np.concatenate(released) if released else np.array([], dtype="int64"),
+            "removed": np.concatenate(removed) if removed else np.array([], dtype="int64"),
+            "sku_units": units[["business_area", "sku_id", "final_units_before", "final_units_after"]].astype(
+                {"final_units_before": "int64", "final_units_after": "int64"}),
+        }
+
+
+def compare_frames(actual, expected, key_cols, label):
+    """key_cols で突き合わせ、共通の列の値が一致しない行を返す（SQL の出力との照合用）
+
+    expected に無い列は比較しない。片方にしか無い行も差異として返す。
+    """
+    columns = [col for col in actual.columns if col in expected.columns and col not in key_cols]
+    merged = actual[key_cols + columns].merge(
+        expected[key_cols + columns], on=key_cols, how="outer", suffixes=("", "_expected"), indicator=True)
+    mismatch = merged["_merge"] != "both"
+    for col in columns:
+        left = pd.to_numeric(merged[col], errors="coerce") if actual[col].dtype.kind in "iuf" else merged[col].astype(str)
+        right = pd.to_numeric(merged[f"{col}_expected"], errors="coerce") if actual[col].dtype.kind in "iuf" else merged[f"{col}_expected"].astype(str)
+        if actual[col].dtype.kind in "iuf":
+            differs = ~np.isclose(left.fillna(0), right.fillna(0))
+        else:
+            differs = left != right
+        mismatch |= differs
+    diff = merged[mismatch]
+    print(f"{label}: {len(merged):,} 行中 {len(diff):,} 行が不一致（比較列: {', '.join(columns)}）")
+    return diff
+
+
+def read_table(path):
+    """CSV / Parquet を読み込む"""
+    if str(path).lower().endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def print_what_if(args, stocks):
+    """--promote / --sold-stocks の what-if の結果を表示する"""
+    state = AllocationState(read_table(args.sku_parts), read_table(args.sku_priority), stocks, args.workers)
+    sold_ids = read_table(args.sold_stocks)["stock_id"] if args.sold_stocks else ()
+    # 指定した順に、既存の最優先SKUより前に並べる
+    top = state.sku_parts["sku_priority"].min() if not state.sku_parts.empty else 0
+    promotions = {sku_id: top - len(args.promote) + i for i, sku_id in enumerate(args.promote)}
+    delta = state.what_if(promotions, sold_ids)
+
+    print("減損カテゴリ別の増減（割り当て / 余り）:")
+    print(delta["by_term"].to_string())
+    print(f"新たに割り当て {len(delta['newly_assigned']):,} 件 / 割り当てから解放 {len(delta['released']):,} 件 / "
+          f"除外 {len(delta['removed']):,} 件")
+    if not delta["sku_units"].empty:
+        print("確定ユニット数が変わったSKU:")
+        print(delta["sku_units"].to_string(index=False))
+    delta["by_term"].reset_index().to_csv(args.output, index=False, encoding="utf-8")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="滞留在庫ダッシュボード v4 と同じ排他的在庫割り当てを計算します")
+    parser.add_argument("--sku-parts", required=True, help="sku_part_detail の書き出し（CSV / Parquet）")
+    parser.add_argument("--sku-priority", required=True, help="sku_with_priority の書き出し")
+    parser.add_argument("--stocks", required=True, help="stock_ordered（または stock_with_category）の書き出し")
+    parser.add_argument("--output", required=True, help="SKUごとの集計の出力先CSV（what-if では減損カテゴリ別の増減）")
+    parser.add_argument("--assignment-output", help="在庫ごとの割り当て（unit_stock_assignment と同じ列）の出力先CSV")
+    parser.add_argument("--as-of", default=pd.Timestamp.today().strftime("%Y-%m-%d"), metavar="YYYY-MM-DD",
+                        help="減損タームの基準日（在庫に category_order が無い場合、既定は今日）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="エリアごとの計算に使うプロセス数")
+    parser.add_argument("--expected-summary", help="照合: SQL の最終出力（sku_hash と集計列）")
+    parser.add_argument("--expected-assignment", help="照合: SQL の unit_stock_assignment の書き出し")
+    parser.add_argument("--promote", type=int, action="append", default=[], metavar="SKU_ID",
+                        help="what-if: 指定したSKUを最優先にした場合の増減を表示（複数指定可）")
+    parser.add_argument("--sold-stocks", metavar="CSV", help="what-if: stock_id 列の在庫が売れた（割り当てから除外した）場合の増減を表示")
+    args = parser.parse_args(argv)
+
+    try:
+        stocks = read_stocks(args.stocks, args.as_of)
+    except ValueError as e:
+        print(f"処理エラー: {e}")
+        return 1
+    if args.promote or args.sold_stocks:
+        return print_what_if(args, stocks)
+
+    sku_parts = read_table(args.sku_parts)
+    final_units, assignment, stocks = allocate(sku_parts, read_table(args.sku_priority), stocks, args.workers)
+    summary = summarize(sku_parts, assignment, stocks)
+    summary.to_csv(args.output, index=False, encoding="utf-8")
+    if args.assignment_output:
+        assignment.to_csv(args.assignment_output, index=False, encoding="utf-8")
+    print(f"組み上げ商品 {final_units['final_units'].sum():,} 件 / 割り当て在庫 {len(assignment):,} 件 / "
+          f"余り在庫 {len(stocks) - len(assignment):,} 件: {args.output}")
+
+    mismatches = 0
+    if args.expected_summary:
+        expected = read_table(args.expected_summary).dropna(subset=["sku_hash"])
+        mismatches += len(compare_frames(summary, expected, ["sku_hash"], "SKU集計"))
+    if args.expected_assignment:
+        mismatches += len(compare_frames(assignment, read_table(args.expected_assignment), ["stock_id"], "在庫の割り当て"))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
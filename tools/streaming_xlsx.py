@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+大量行のExcel(xlsx)ストリーミング出力
+
+df.to_excel(engine="openpyxl") はブック全体をセル単位のオブジェクトとしてメモリに持つため、
+数十万行を超えると非常に遅くなる。ここでは DataFrame を受け取った順にシートのXMLへ直接書き出し、
+同時に保持するのは書き出し中の1ブロック分のみとする。
+
+- セルのXMLは列単位にまとめて生成する（セルごとの Python 処理を行わない）
+- 1シートの行数上限（Excel は 1,048,576 行）に達したら「シート名_2」「シート名_3」… に分割する
+- 書式は列単位で指定する（日付列は yyyy/mm/dd、金額列は #,##0 など）
+
+使用例:
+    with StreamingXlsxWriter("output.xlsx", column_formats={"期末簿価": AMOUNT_FORMAT}) as writer:
+        for chunk in pd.read_csv("result.csv", chunksize=100_000):
+            writer.write(chunk)
+"""
+
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+
+EXCEL_MAX_ROWS = 1_048_576  # 1シートの最大行数（見出し行を含む）
+WRITE_BLOCK_ROWS = 50_000   # 1回にXMLへ変換する行数
+DATE_FORMAT = "yyyy/mm/dd"
+DATETIME_FORMAT = "yyyy/mm/dd hh:mm:ss"
+AMOUNT_FORMAT = "#,##0"
+# 列名にこれらを含む数値列は金額として AMOUNT_FORMAT で表示する
+AMOUNT_COLUMN_KEYWORDS = ("簿価", "原価", "償却費", "損失", "累計額", "金額")
+
+_EXCEL_EPOCH = np.datetime64("1899-12-30")
+_ISO_DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+# XML 1.0 で使えない制御文字（タブ・改行以外）
+_ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def amount_column_formats(columns):
+    """列名から金額列を判定し、{列名: AMOUNT_FORMAT} を返す"""
+    return {col: AMOUNT_FORMAT for col in columns if any(keyword in str(col) for keyword in AMOUNT_COLUMN_KEYWORDS)}
+
+
+def infer_date_columns(df):
+    """値がすべて YYYY-MM-DD 形式の文字列列（bq の CSV 出力の DATE 列）を返す"""
+    date_columns = []
+    for col in df.columns:
+        values = df[col].dropna()
+        if df[col].dtype.kind in "OT" and len(values) > 0 and values.astype(str).str.match(_ISO_DATE_PATTERN).all():
+            date_columns.append(col)
+    return date_columns
+
+
+def parse_date_columns(df, date_columns):
+    """date_columns を datetime64 に変換した DataFrame を返す（日付として読めない値がある列は文字列のまま）"""
+    converted = {}
+    for col in date_columns:
+        if col not in df.columns:
+            continue
+        parsed = pd.to_datetime(df[col], format="%Y-%m-%d", errors="coerce")
+        if parsed.notna().sum() == df[col].notna().sum():
+            converted[col] = parsed
+    return df.assign(**converted) if converted else df
+
+
+def _column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+class StreamingXlsxWriter:
+    """DataFrame を受け取った順に xlsx へ書き出す（同時に保持するのは1ブロック分のXMLのみ）
+
+    column_formats: {列名: Excel の表示形式}。日付列は指定が無くても DATE_FORMAT
+    （時刻を含む場合は DATETIME_FORMAT）で書き出す。
+    max_rows_per_sheet: 1シートの行数上限（見出し行を含む）。超えた分は番号付きの新しいシートに書く。
+    """
+
+    def __init__(self, output_file, sheet_name="Sheet1", max_rows_per_sheet=EXCEL_MAX_ROWS, column_formats=None):
+        if not 2 <= max_rows_per_sheet <= EXCEL_MAX_ROWS:
+            raise ValueError(f"1シートの行数上限は 2〜{EXCEL_MAX_ROWS:,} の範囲で指定してください: {max_rows_per_sheet}")
+        self.output_file = output_file
+        self.sheet_name = sheet_name
+        self.max_rows_per_sheet = max_rows_per_sheet
+        self.column_formats = dict(column_formats or {})
+        self.rows_written = 0
+        self.sheet_names = []
+        self._columns = None
+        self._zip = zipfile.ZipFile(output_file, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+        self._sheet = None
+        self._sheet_rows = 0
+        # 表示形式 → セル書式番号（0 は標準、1 は見出し）
+        self._format_styles = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, df):
+        """DataFrame の行を追記する（列は最初に書いた DataFrame と同じであること）"""
+        if self._columns is None:
+            self._columns = list(df.columns)
+        elif list(df.columns) != self._columns:
+            raise ValueError("列構成が最初に書き出したデータと異なります")
+        position = 0
+        while position < len(df) or self._sheet is None:
+            if self._sheet is None or self._sheet_rows >= self.max_rows_per_sheet:
+                self._open_sheet()
+            take = min(self.max_rows_per_sheet - self._sheet_rows, WRITE_BLOCK_ROWS, len(df) - position)
+            if take > 0:
+                self._write_block(df.iloc[position:position + take])
+                position += take
+
+    def close(self):
+        """シートを閉じ、ブックの構成ファイルを書き出す"""
+        if self._zip is None:
+            return
+        if self._sheet is None:
+            self._open_sheet()
+        self._close_sheet()
+        self._write_package_parts()
+        self._zip.close()
+        self._zip = None
+
+    # --- シート ---
+    def _open_sheet(self):
+        self._close_sheet()
+        number = len(self.sheet_names) + 1
+        suffix = "" if number == 1 else f"_{number}"
+        # シート名は31文字まで
+        self.sheet_names.append(self.sheet_name[:31 - len(suffix)] + suffix)
+        self._sheet = self._zip.open(f"xl/worksheets/sheet{number}.xml", "w", force_zip64=True)
+        self._sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            b'<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+            b'</sheetView></sheetViews><sheetData>'
+        )
+        header = "".join(
+            f'<c r="{_column_letter(i)}1" t="inlineStr" s="1"><is><t xml:space="preserve">{self._clean_text(col)}</t></is></c>'
+            for i, col in enumerate(self._columns or [])
+        )
+        self._sheet.write(f'<row r="1">{header}</row>'.encode("utf-8"))
+        self._sheet_rows = 1
+
+    def _close_sheet(self):
+        if self._sheet is not None:
+            self._sheet.write(b"</sheetData></worksheet>")
+            self._sheet.close()
+            self._sheet = None
+
+    def _write_block(self, block):
+        row_numbers = np.arange(self._sheet_rows + 1, self._sheet_rows + len(block) + 1).astype(str).astype(object)
+        xml = "<row r=\"" + row_numbers + "\">"
+        for i, col in enumerate(self._columns):
+            xml = xml + self._cell_xml(block[col], _column_letter(i), row_numbers, col)
+        self._sheet.write(("</row>".join(xml) + "</row>").encode("utf-8"))
+        self._sheet_rows += len(block)
+        self.rows_written += len(block)
+
+    # --- セル ---
+    @staticmethod
+    def _clean_text(value):
+        return escape(_ILLEGAL_XML_CHARS.sub("", str(value)))
+
+    def _style_for(self, number_format):
+        if number_format is None:
+            return ""
+        if number_format not in self._format_styles:
+            self._format_styles[number_format] = len(self._format_styles) + 2
+        return f' s="{self._format_styles[number_format]}"'
+
+    def _cell_xml(self, series, letter, row_numbers, col):
+        """1列分のセルXML（行ごとの文字列の配列、空セルは空文字）を返す"""
+        values = series.to_numpy()
+        kind = series.dtype.kind
+        if kind == "M":
+            if getattr(series.dtype, "tz", None) is not None:
+                values = series.dt.tz_localize(None).to_numpy()
+            missing = np.isnat(values)
+            serial = (values - _EXCEL_EPOCH) / np.timedelta64(1, "D")
+            has_time = (serial[~missing] % 1 != 0).any()
+            default_format = DATETIME_FORMAT if has_time else DATE_FORMAT
+            style = self._style_for(self.column_formats.get(col, default_format))
+            text = serial.astype(str).astype(object)
+            cells = f'<c r="{letter}' + row_numbers + f'"{style}><v>' + text + "</v></c>"
+        elif kind == "b":
+            # 欠損を含む boolean 列（pd.BooleanDtype）は欠損を空セルにする
+            missing = series.isna().to_numpy()
+            values = series.to_numpy(dtype=bool, na_value=False)
+            cells = f'<c r="{letter}' + row_numbers + f'" t="b"><v>' + values.astype(np.int8).astype(str).astype(object) + "</v></c>"
+        elif kind in "iuf":
+            if kind == "f":
+                values = series.to_numpy(dtype="float64", na_value=np.nan)
+                missing = ~np.isfinite(values)
+                # 整数値の float（欠損を含む整数列など）は ".0" を付けない
+                with np.errstate(invalid="ignore"):
+                    integral = ~missing & (np.abs(values) < 2 ** 53) & (values % 1 == 0)
+                text = np.where(integral, np.where(integral, values, 0).astype(np.int64).astype(str), values.astype(str))
+            else:
+                # 欠損を含む整数列（Int64 など）は欠損を空セルにし、値は整数のまま書く
+                missing = series.isna().to_numpy()
+                numpy_dtype = getattr(series.dtype, "numpy_dtype", series.dtype)
+                text = series.to_numpy(dtype=numpy_dtype, na_value=0).astype(str)
+            style = self._style_for(self.column_formats.get(col))
+            cells = f'<c r="{letter}' + row_numbers + f'"{style}><v>' + text.astype(object) + "</v></c>"
+        else:
+            missing = series.isna().to_numpy()
+            text = series.astype(str).fillna("").str.replace(_ILLEGAL_XML_CHARS, "", regex=True)
+            text = text.str.replace("&", "&amp;", regex=False).str.replace("<", "&lt;", regex=False).str.replace(">", "&gt;", regex=False)
+            style = self._style_for(self.column_formats.get(col))
+            cells = (f'<c r="{letter}' + row_numbers + f'" t="inlineStr"{style}><is><t xml:space="preserve">'
+                     + text.to_numpy(dtype=object) + "</t></is></c>")
+        return np.where(missing, "", cells).astype(object)
+
+    # --- ブックの構成ファイル ---
+    def _write_package_parts(self):
+        sheet_count = len(self.sheet_names)
+        sheets_xml = "".join(
+            f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>' for i, name in enumerate(self.sheet_names, start=1)
+        )
+        self._zip.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + "".join(
+                f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for i in range(1, sheet_count + 1))
+            + "</Types>"))
+        self._zip.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>"))
+        self._zip.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f"<sheets>{sheets_xml}</sheets></workbook>"))
+        self._zip.writestr("xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(
+                f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{i}.xml"/>' for i in range(1, sheet_count + 1))
+            + f'<Relationship Id="rId{sheet_count + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/></Relationships>'))
+        self._zip.writestr("xl/styles.xml", self._styles_xml())
+
+    def _styles_xml(self):
+        # 表示形式は ID 164 以降がユーザー定義
+        formats = sorted(self._format_styles.items(), key=lambda item: item[1])
+        num_fmts = "".join(f'<numFmt numFmtId="{164 + i}" formatCode="{escape(fmt, {chr(34): "&quot;"})}"/>' for i, (fmt, _) in enumerate(formats))
+        format_xfs = "".join(
+            f'<xf numFmtId="{164 + i}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>' for i in range(len(formats))
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            + (f'<numFmts count="{len(formats)}">{num_fmts}</numFmts>' if formats else "")
+            + '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+            '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+            '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            f'<cellXfs count="{2 + len(formats)}">'
+            '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+            '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+            f"{format_xfs}</cellXfs>"
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+            "</styleSheet>"
+        )
+
+
+def write_excel_streaming(chunks, output_file, sheet_name="Sheet1", max_rows_per_sheet=EXCEL_MAX_ROWS, column_formats=None):
+    """DataFrame（またはその反復子）を xlsx に書き出し、(書き出した行数, シート名の一覧) を返す"""
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    with StreamingXlsxWriter(output_file, sheet_name, max_rows_per_sheet, column_formats) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.rows_written, writer.sheet_names